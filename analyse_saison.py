@@ -0,0 +1,239 @@
+"""
+Analyse de saison : comparaison des joueurs et des rotations sur de nombreux
+matchs archivés (fichiers de journal SQLite, voir journal_sqlite.py).
+
+Les événements utiles (POINT et STAT) sont lus directement en colonnes par
+SQLite (json_extract) puis rangés dans des DataFrames pandas : aucune boucle
+Python par événement. Le déroulé des rallyes (équipe au service, rotation
+VEEC, vainqueur) est reconstruit par des cumuls vectoriels par match, en
+suivant les règles du réducteur (match_engine.reduce_event) :
+  - un rallye se termine par un POINT ou par une stat gagnante (KILL, ACE, GAIN),
+    qui vaut un point VEEC (match_engine.gagnant_du_rallye),
+  - le vainqueur d'un rallye sert le suivant ; VEEC tourne quand il gagne un
+    rallye en réception (side-out),
+  - le service et la rotation se poursuivent d'un set à l'autre.
+
+Indicateurs (groupby vectoriels), par joueur et par rotation :
+  - efficacité d'attaque : (kills - fautes) / attaques,
+  - side-out % : rallyes gagnés par VEEC quand l'adversaire sert
+    (par joueur : rallyes où le joueur a une réception enregistrée),
+  - pression au service : % d'aces, % de fautes et % de rallyes gagnés
+    (break) sur les services du joueur / de la rotation.
+
+La rotation est notée R1 à R6 : R1 est la formation de départ, chaque
+side-out fait passer à la suivante.
+
+Usage :
+    python analyse_saison.py <journal.db | dossier> [...] [--csv dossier_sortie]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from codec import loads as charger_valeur
+from match_engine import NB_POSITIONS, POINT, RESULTATS_GAGNANTS, STAT
+
+_REQUETE_EVENEMENTS = """
+    SELECT e.match_id, e.seq, e.type, e.set_num AS "set",
+           json_extract(e.data, '$.gagnant') AS gagnant,
+           json_extract(e.data, '$.numero') AS numero,
+           json_extract(e.data, '$.nom') AS nom,
+           json_extract(e.data, '$.action_code') AS action_code,
+           json_extract(e.data, '$.resultat') AS resultat
+    FROM events e
+    WHERE e.type IN (?, ?)
+    ORDER BY e.match_id, e.seq
+"""
+
+
+# --- CHARGEMENT ---
+
+def _fichiers_journal(sources):
+    for source in sources:
+        if os.path.isdir(source):
+            for nom in sorted(os.listdir(source)):
+                if nom.endswith('.db'):
+                    yield os.path.join(source, nom)
+        else:
+            yield source
+
+
+def _charger_fichier(path):
+    conn = sqlite3.connect(path)
+    try:
+        events = pd.read_sql_query(_REQUETE_EVENEMENTS, conn, params=(POINT, STAT))
+        services = {match_id: charger_valeur(etat).get('service_actuel', 'VEEC')
+                    for match_id, etat in conn.execute("SELECT match_id, initial_state FROM matches")}
+    finally:
+        conn.close()
+    return events, services
+
+
+def charger_saison(sources):
+    """
+    Charge les POINT et STAT de tous les matchs des fichiers (ou dossiers) de
+    journal donnés. Retourne un DataFrame trié par match puis par seq ; la
+    colonne 'match' identifie le match de façon unique entre fichiers.
+    """
+    frames = []
+    for path in _fichiers_journal(sources):
+        events, services = _charger_fichier(path)
+        events['service_initial'] = events['match_id'].map(services).fillna('VEEC')
+        events['match'] = os.path.basename(path) + ':' + events['match_id']
+        frames.append(events)
+    if not frames:
+        raise ValueError("Aucun fichier de journal trouvé")
+    events = pd.concat(frames, ignore_index=True)
+    for col in ('type', 'action_code', 'resultat', 'gagnant', 'match', 'service_initial'):
+        events[col] = events[col].astype('category')
+    events['numero'] = events['numero'].astype('Int16')
+    return events
+
+
+# --- RALLYES ---
+
+def rallyes(events):
+    """
+    Un rallye par ligne : match, set, équipe au service, rotation VEEC (1 à 6),
+    vainqueur et indice du rallye dans le match. Calculé sans boucle par
+    rallye : les états (service, rotation) sont des cumuls décalés par match.
+    """
+    is_point = (events['type'] == POINT).to_numpy()
+    is_gagnante = ((events['type'] == STAT) & events['resultat'].isin(RESULTATS_GAGNANTS)).to_numpy()
+    fin = is_point | is_gagnante
+    r = events.loc[fin, ['match', 'set', 'service_initial']].reset_index(drop=True)
+    r_point = is_point[fin]
+    r['vainqueur'] = np.where(r_point, events.loc[fin, 'gagnant'].astype(object), 'VEEC')
+
+    # Service pendant le rallye = vainqueur du rallye précédent (ou service initial)
+    serveur = pd.Series(r['vainqueur'], dtype=object).groupby(r['match'], observed=True, sort=False).shift(1)
+    r['serveur'] = serveur.fillna(r['service_initial'].astype(object)).to_numpy()
+
+    # Rotation VEEC : nombre de side-outs VEEC (rallye gagné par VEEC en réception) avant le rallye
+    side_out_veec = (r['vainqueur'].to_numpy() == 'VEEC') & (r['serveur'].to_numpy() == 'ADVERSAIRE')
+    avant = pd.Series(side_out_veec.astype(np.int32)).groupby(r['match'], observed=True, sort=False).cumsum() - side_out_veec
+    r['rotation'] = (avant.to_numpy() % NB_POSITIONS + 1).astype(np.int8)
+    r['rallye'] = r.groupby('match', observed=True, sort=False).cumcount().to_numpy()
+    r['gagne'] = r['vainqueur'] == 'VEEC'
+    return r.drop(columns='service_initial')
+
+
+def stats_par_rallye(events, table_rallyes=None):
+    """
+    Stats (une ligne par STAT) enrichies du rallye auquel elles appartiennent :
+    équipe au service, rotation, vainqueur. Une stat gagnante clôt son propre
+    rallye ; les stats d'un rallye non terminé ont un vainqueur manquant.
+    """
+    if table_rallyes is None:
+        table_rallyes = rallyes(events)
+    is_point = (events['type'] == POINT).to_numpy()
+    is_stat = (events['type'] == STAT).to_numpy()
+    fin = is_point | (is_stat & events['resultat'].isin(RESULTATS_GAGNANTS).to_numpy())
+    # Indice de rallye : nombre de fins de rallye strictement avant l'événement (dans le match)
+    fins_avant = pd.Series(fin.astype(np.int32)).groupby(events['match'].to_numpy(), sort=False).cumsum().to_numpy() - fin
+    stats = events.loc[is_stat, ['match', 'set', 'numero', 'nom', 'action_code', 'resultat']].copy()
+    stats['rallye'] = fins_avant[is_stat]
+    return stats.merge(table_rallyes[['match', 'rallye', 'serveur', 'rotation', 'vainqueur', 'gagne']],
+                       on=['match', 'rallye'], how='left')
+
+
+# --- INDICATEURS ---
+
+def _indicateurs(stats, cles):
+    """Indicateurs groupés par `cles` (colonnes de stats), tous calculés par groupby."""
+    code, res = stats['action_code'].astype(object), stats['resultat'].astype(object)
+    atk, svc, rec = code == 'ATK', code == 'SVC', code == 'REC'
+    conclu = stats['vainqueur'].notna()
+    gagne = stats['gagne'].fillna(False).astype(bool)
+    colonnes = pd.DataFrame({
+        'attaques': atk, 'kills': atk & (res == 'KILL'), 'fautes_attaque': atk & (res == 'FAUTE'),
+        'services': svc, 'aces': svc & (res == 'ACE'), 'fautes_service': svc & (res == 'FAUTE'),
+        'services_conclus': svc & conclu, 'services_gagnes': svc & gagne,
+        'receptions': rec, 'receptions_parfaites': rec & (res == 'PERF'),
+        'receptions_conclues': rec & conclu, 'side_outs': rec & gagne,
+    }).astype(np.int32)
+    for cle in cles:
+        colonnes[cle] = stats[cle].to_numpy()
+    t = colonnes.groupby(list(cles), observed=True).sum()
+
+    def pct(n, d):
+        return (100 * t[n] / t[d].where(t[d] > 0)).round(1)
+
+    t['kill_eff_pct'] = (100 * (t['kills'] - t['fautes_attaque']) / t['attaques'].where(t['attaques'] > 0)).round(1)
+    t['kill_pct'] = pct('kills', 'attaques')
+    t['ace_pct'] = pct('aces', 'services')
+    t['faute_service_pct'] = pct('fautes_service', 'services')
+    t['break_service_pct'] = pct('services_gagnes', 'services_conclus')
+    t['reception_parfaite_pct'] = pct('receptions_parfaites', 'receptions')
+    t['side_out_pct'] = pct('side_outs', 'receptions_conclues')
+    return t
+
+
+def par_joueur(events, stats=None):
+    """Indicateurs par joueur (numéro de maillot), tous matchs confondus."""
+    if stats is None:
+        stats = stats_par_rallye(events)
+    t = _indicateurs(stats, ('numero',))
+    noms = stats.dropna(subset=['numero']).groupby('numero', observed=True)['nom'].last()
+    t.insert(0, 'nom', noms.reindex(t.index))
+    t.insert(1, 'matchs', stats.groupby('numero', observed=True)['match'].nunique().reindex(t.index))
+    return t
+
+
+def par_rotation(events, table_rallyes=None, stats=None):
+    """
+    Indicateurs par rotation VEEC : side-out % et break % sur tous les rallyes
+    (pas seulement ceux avec une stat), plus les indicateurs issus des stats.
+    """
+    if table_rallyes is None:
+        table_rallyes = rallyes(events)
+    if stats is None:
+        stats = stats_par_rallye(events, table_rallyes)
+    reception = table_rallyes['serveur'] == 'ADVERSAIRE'
+    base = pd.DataFrame({
+        'rotation': table_rallyes['rotation'],
+        'rallyes': 1,
+        'rallyes_reception': reception.astype(np.int32),
+        'side_outs_rallye': (reception & table_rallyes['gagne']).astype(np.int32),
+        'rallyes_service': (~reception).astype(np.int32),
+        'breaks': (~reception & table_rallyes['gagne']).astype(np.int32),
+    }).groupby('rotation').sum()
+    base['side_out_pct'] = (100 * base['side_outs_rallye'] / base['rallyes_reception'].where(base['rallyes_reception'] > 0)).round(1)
+    base['break_pct'] = (100 * base['breaks'] / base['rallyes_service'].where(base['rallyes_service'] > 0)).round(1)
+    t = _indicateurs(stats, ('rotation',)).drop(columns=['side_out_pct'])
+    t = t.rename(columns={'break_service_pct': 'break_service_stat_pct'})
+    t = base.join(t, how='left')
+    t.index = 'R' + t.index.astype(str)
+    return t
+
+
+def analyser(sources):
+    """Charge une saison et retourne (indicateurs par joueur, indicateurs par rotation)."""
+    events = charger_saison(sources)
+    table_rallyes = rallyes(events)
+    stats = stats_par_rallye(events, table_rallyes)
+    return par_joueur(events, stats), par_rotation(events, table_rallyes, stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse de saison VEEC (joueurs et rotations).")
+    parser.add_argument('sources', nargs='+', help="Fichiers de journal (.db) ou dossiers de journaux")
+    parser.add_argument('--csv', help="Dossier où écrire joueurs.csv et rotations.csv")
+    args = parser.parse_args(argv)
+
+    joueurs, rotations = analyser(args.sources)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(joueurs[['nom', 'matchs', 'kill_eff_pct', 'side_out_pct', 'ace_pct', 'faute_service_pct', 'break_service_pct']])
+        print(rotations[['rallyes', 'side_out_pct', 'break_pct', 'kill_eff_pct', 'ace_pct']])
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+        joueurs.to_csv(os.path.join(args.csv, 'joueurs.csv'))
+        rotations.to_csv(os.path.join(args.csv, 'rotations.csv'))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
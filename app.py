@@ -2,14 +2,38 @@ import dash
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State, ALL
 import plotly.graph_objects as go
-import pandas as pd
+from plotly.io.json import to_json_plotly
 from datetime import datetime
+import io
 import json
+import math
+import os
 import re
-import copy
+import tempfile
 import time
+import zipfile
+import zlib
+from urllib.parse import parse_qs
 import sys # Import manquant pour sys.argv
 
+import export
+import match_engine as engine
+from match_engine import (
+    LIBERO_POSITIONS_AUTORISEES, MAX_SUBS_PER_SET,
+    TIMEOUT_DURATION_SECONDS, SHORT_BREAK_DURATION_SECONDS, LONG_BREAK_DURATION_SECONDS,
+    handle_libero_out, swap_liberos_on_bench, verifier_libero_in, verifier_point, verifier_substitution, verifier_timeout,
+)
+from match_store import MatchStore
+from etat_partage import backend_depuis_url
+from journal_sqlite import SQLiteJournal
+from figure_cache import LRUCache
+from metriques import MetriquesCallbacks
+from diffusion import DiffusionMatchs
+from effectifs import RegistreEffectifs
+from hors_ligne import SynchroHorsLigne
+from historique import HISTORIQUE_COLUMNS, HISTORIQUE_PAGE_SIZE
+from stats_joueurs import STATS_COLUMNS
+
 # --- CONFIGURATION & CONSTANTES ---
 
 URL_IMAGE_TERRAIN = "https://github.com/takerusumida-lgtm/agent-stats-volley-veec/raw/d2e3108b9553552d0847008ecdea2c1b83987ab8/terrain_volleyball.jpg"
@@ -29,6 +53,8 @@ ADVERSE_POSITIONS_COORDS = {
     4: {"x": 63, "y": 29, "name": "P4 Adv"},
 }
 
+# Effectifs intégrés, utilisés sans fichier VEEC_EFFECTIFS (une équipe 'veec' ou 'adversaire'
+# définie dans un fichier les remplace, voir EFFECTIFS)
 LISTE_JOUEURS_PREDEFINIE = [
     {"numero": 1, "nom": "Nelson DE OLIVIEIRA"}, {"numero": 3, "nom": "Florian ROCHE"},
     {"numero": 6, "nom": "Hugo BARTHELMEBS"}, {"numero": 8, "nom": "Maxime CUGNOD"},
@@ -38,336 +64,182 @@ LISTE_JOUEURS_PREDEFINIE = [
     {"numero": 7, "nom": "Mathis VARIN"}
 ]
 
-# Conversion de votre liste en un dictionnaire
-JOUERS_VEEC_DICT = {
-    joueur["numero"]: joueur for joueur in LISTE_JOUEURS_PREDEFINIE
-}
-
-# Assurez-vous d'avoir bien défini cette liste en constante dans votre code.
-
-FORMATION_INITIALE = {}
-for i, pos_num in enumerate(VEEC_POSITIONS_COORDS.keys()):
-    FORMATION_INITIALE[pos_num] = LISTE_JOUEURS_PREDEFINIE[i].copy()
-
-JOUEURS_BANC_INITIAL = {}
-for i in range(6, len(LISTE_JOUEURS_PREDEFINIE)):
-    JOUEURS_BANC_INITIAL[LISTE_JOUEURS_PREDEFINIE[i]["numero"]] = LISTE_JOUEURS_PREDEFINIE[i].copy()
-
-FORMATION_ADVERSE_INITIALE = {}
-adverse_keys_sorted = sorted(list(ADVERSE_POSITIONS_COORDS.keys()))
-for i, pos_num in enumerate(adverse_keys_sorted):
-    joueur_adverse = {"numero": i + 1, "nom": f"Adv {i + 1}"}
-    FORMATION_ADVERSE_INITIALE[pos_num] = joueur_adverse
-BANC_ADVERSE_INITIAL = {}
+LISTE_ADVERSES_PREDEFINIE = [{"numero": i + 1, "nom": f"Adv {i + 1}"} for i in range(len(ADVERSE_POSITIONS_COORDS))]
+LIBERO_ADVERSE_NUM = 1
 
 # Constantes Libero
 LIBERO_PRINCIPAL_NUM = 7  # Basé sur A. Libero
 LIBERO_RESERVE_NUM = 9    # Basé sur B. Libero 2
-LIBERO_POSITIONS_AUTORISEES = [1, 5, 6] # Positions arrière où le Libero peut entrer
-
-MAX_TIMEOUTS_PER_SET = 2
-MAX_SUBS_PER_SET = 6
-TIMEOUT_DURATION_SECONDS = 30
-SHORT_BREAK_DURATION_SECONDS = 3 * 60
-LONG_BREAK_DURATION_SECONDS = 5 * 60
+# Les règles (temps morts, substitutions, pauses, positions Libero) sont dans match_engine.py
 
 VEEC_COLOR = "#007bff"
 ADVERSE_COLOR = "#dc3545"
 
 # --- UTILITIES & LOGIQUE DE ROTATION ---
 
-def clean_formations(state):
-    if 'formation_actuelle' in state and state['formation_actuelle']:
-        state['formation_actuelle'] = { int(k): v for k, v in state['formation_actuelle'].items() }
-    if 'formation_adverse_actuelle' in state and state['formation_adverse_actuelle']:
-        state['formation_adverse_actuelle'] = { int(k): v for k, v in state['formation_adverse_actuelle'].items() }
-    if 'joueurs_banc' in state and state['joueurs_banc']:
-        state['joueurs_banc'] = { int(k): v for k, v in state['joueurs_banc'].items() }
-    return state
-
-def appliquer_rotation_veec(formation):
-    new_formation = {}
-    new_formation[1] = formation[2].copy()
-    new_formation[2] = formation[3].copy()
-    new_formation[3] = formation[4].copy()
-    new_formation[4] = formation[5].copy()
-    new_formation[5] = formation[6].copy()
-    new_formation[6] = formation[1].copy()
-    return new_formation
-
-def swap_liberos_on_bench(current_state):
+def create_historique_table():
     """
-    Gère l'échange du statut de Libero Actif (N°8) avec le Libero de Réserve (N°9)
-    lorsque les deux sont sur le banc.
-    Si le N°9 est activé, le N°8 ne peut plus jouer du set/match.
+    Crée le Dash DataTable de l'historique. Pagination, tri et filtrage sont
+    faits côté serveur (voir update_historique_page) : seule la page affichée transite.
     """
-    new_state = copy.deepcopy(current_state)
-    liberos_status = new_state['liberos_veec']
-    
-    L8_num = liberos_status['actif_numero']  # 8
-    L9_num = liberos_status['reserve_numero'] # 9
-    
-    # Condition de sécurité : La substitution n'est possible que si AUCUN Libero n'est sur le terrain.
-    if liberos_status['is_on_court']:
-        # Le Libero (N°8 ou N°9) est sur le terrain, l'échange est impossible.
-        # Vous devez ajouter un feedback à l'utilisateur ici (via un Div ou un store Dash)
-        return new_state, "Échange Libero-Libero impossible : Un Libero est sur le terrain."
-
-    # L'échange de statut Libero n'est possible qu'une seule fois dans le set/match selon les règles standard
-    # et a des implications majeures : si L9 entre, L8 est définitivement out.
-    if liberos_status['is_reserve_used']:
-        return new_state, "Le Libero de réserve a déjà été utilisé. L'échange est terminé."
-
-    # ----------------------------------------------------
-    # LOGIQUE D'ÉCHANGE L8 <-> L9
-    # ----------------------------------------------------
-    
-    # 1. Mise à jour des numéros actif/réserve
-    liberos_status['actif_numero'] = L9_num  # 9 devient l'Actif
-    liberos_status['reserve_numero'] = L8_num # 8 devient le Libero de réserve (out)
-    
-    # 2. Flag le N°8 comme étant remplacé
-    liberos_status['is_reserve_used'] = True 
-    
-    # 3. Mise à jour des joueurs sur le banc (leurs numéros de maillot/roles restent les mêmes,
-    # mais il faut loguer l'échange et potentiellement l'afficher différemment)
-    
-    # 4. Enregistrement dans l'historique
-    log_entry = {
-        'timestamp': time.time(), 
-        'set': new_state['current_set'], 
-        'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-        'position': 'BANC', 
-        'joueur_nom': f"L{L8_num} OUT (Règle)", 
-        'action_code': 'LIBERO_SWAP_RESERVE', 
-        'resultat': f"L{L9_num} devient ACTIF"
-    }
-    new_state['historique_stats'].insert(0, log_entry)
-
-    new_state['liberos_veec'] = liberos_status
-    return new_state, f"L{L9_num} est désormais le Libero ACTIF. L{L8_num} ne peut plus rejouer."
+    return dash_table.DataTable(
+        id='datatable-historique',
+        columns=[{"name": col.capitalize(), "id": col} for col in HISTORIQUE_COLUMNS],
+        data=[],
+        page_action='custom', page_current=0, page_size=HISTORIQUE_PAGE_SIZE, page_count=1,
+        sort_action='custom', sort_mode='multi', sort_by=[],
+        filter_action='custom', filter_query='', filter_options={'case': 'insensitive'},
+        fixed_rows={'headers': True},
+        style_table={'overflowX': 'auto', 'marginTop': '10px', 'maxHeight': '400px', 'overflowY': 'auto'},
+        style_header={'backgroundColor': 'lightgrey', 'fontWeight': 'bold'},
+        style_data_conditional=[
+            {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'}
+        ]
+    )
 
-def handle_libero_out(current_state):
+def create_stats_table():
     """
-    Gère la sortie (OUT) du Libero Actif (N°8 ou N°9) par son joueur titulaire initial.
+    Crée le tableau des statistiques par joueur. Les lignes viennent des
+    compteurs tenus à jour à chaque stat (voir update_stats_joueurs).
     """
-    new_state = copy.deepcopy(current_state)
-    liberos_status = new_state['liberos_veec']
-    
-    # ----------------------------------------------------
-    # VÉRIFICATIONS PRÉ-ÉCHANGE
-    # ----------------------------------------------------
-    
-    # 1. Vérifier si un Libero est sur le terrain
-    if not liberos_status['is_on_court']:
-        return new_state, "Échec: Aucun Libero n'est sur le terrain."
-
-    # 2. Récupérer le numéro du joueur qui doit entrer (le titulaire initial)
-    starter_num_to_enter = liberos_status['starter_numero_replaced']
-    if starter_num_to_enter is None:
-        # Erreur si l'état est incohérent, car le Libero doit toujours avoir un titulaire à remplacer.
-        return new_state, "Erreur d'état: Le titulaire que le Libero remplaçait est inconnu."
-
-    # 3. Le Libero qui sort et sa position
-    libero_num_to_out = liberos_status['actif_numero']
-    pos_sortie = liberos_status['current_pos_on_court'] # La position où le Libero se trouve
-    
-    # 4. Le titulaire (joueur entrant) doit être sur le banc
-    joueur_titulaire = new_state['joueurs_banc'].get(starter_num_to_enter)
-    if not joueur_titulaire:
-        return new_state, f"Échec: Le titulaire N°{starter_num_to_enter} n'est pas disponible sur le banc."
-
-    # ----------------------------------------------------
-    # EFFECTUER L'ÉCHANGE LIBERO OUT
-    # ----------------------------------------------------
-    
-    # 1. Mettre le titulaire (joueur entrant) sur le terrain à la place du Libero
-    new_state['formation_actuelle'][pos_sortie] = joueur_titulaire
-    
-    # 2. Mettre le Libero (qui sort) sur le banc
-    # On utilise le Libero ACTIF (N°8 ou N°9) pour le remettre sur le banc
-    # On le récupère du dictionnaire des joueurs sur le banc (où il était avant d'entrer)
-    libero_on_bench = current_state['joueurs_banc'].get(libero_num_to_out)
-    
-    # Si l'objet Libero a été supprimé du banc lors de l'entrée, on le recrée/met à jour ici.
-    # Dans notre modèle, on le remet sur le banc avec son rôle initial (si besoin, on peut complexifier)
-    new_state['joueurs_banc'][libero_num_to_out] = {
-        'numero': libero_num_to_out, 
-        'nom': f"Libero L{libero_num_to_out}", 
-        'role': 'LIBERO', 
-        'statut': 'BANC'
-    }
-    
-    # 3. Retirer le titulaire du banc (il est maintenant sur le terrain)
-    del new_state['joueurs_banc'][starter_num_to_enter]
-    
-    # 4. Mettre à jour l'état du Libero (OUT)
-    liberos_status['is_on_court'] = False
-    liberos_status['current_pos_on_court'] = None
-    
-    # 5. Enregistrement dans l'historique
-    log_entry = {
-        'timestamp': time.time(), 
-        'set': new_state['current_set'], 
-        'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-        'action_code': 'LIBERO_OUT', 
-        'details': f"L{libero_num_to_out} OUT P{pos_sortie} pour N°{starter_num_to_enter} (Titulaire)"
-    }
-    new_state['historique_stats'].insert(0, log_entry)
-
-    new_state['liberos_veec'] = liberos_status
-    
-    return new_state, f"Libero N°{libero_num_to_out} sorti. Titulaire N°{starter_num_to_enter} entré en P{pos_sortie}."
-
-def appliquer_rotation_adverse(formation):
-    new_formation = {}
-    new_formation[1] = formation[2].copy()
-    new_formation[2] = formation[3].copy()
-    new_formation[3] = formation[4].copy()
-    new_formation[4] = formation[5].copy()
-    new_formation[5] = formation[6].copy()
-    new_formation[6] = formation[1].copy()
-    return new_formation
-    
-def create_historique_table(historique_stats):
-    """Crée et retourne le Dash DataTable à partir de l'historique."""
-    if not historique_stats:
-        return html.Div("L'historique des actions est vide pour le moment.", style={'padding': '10px', 'color': '#666'})
-        
-    df_historique = pd.DataFrame(historique_stats)
-    columns_config = [{"name": i.capitalize(), "id": i} for i in df_historique.columns]
-
     return dash_table.DataTable(
-        id='datatable-historique',
-        columns=columns_config,
-        data=df_historique.head(50).to_dict('records'),
+        id='datatable-stats-joueurs',
+        columns=[{"name": nom, "id": col} for col, nom in STATS_COLUMNS],
+        data=[],
+        sort_action='native',
         style_table={'overflowX': 'auto', 'marginTop': '10px'},
         style_header={'backgroundColor': 'lightgrey', 'fontWeight': 'bold'},
+        style_cell={'textAlign': 'center', 'minWidth': '60px'},
         style_data_conditional=[
             {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'}
         ]
     )
 
-def create_court_figure(formation_equipe, formation_adverse, service_actuel, liberos_veec):
-    
-    # Note: On suppose qu'un seul Libero adverse est géré, et qu'il a le numéro 1
-    # Si l'adversaire a des Libéros dynamiques, il faudra ajuster.
-    libero_adverse_num = 1 # Supposons que le Libero adverse est le N°1
-    libero_adverse_is_on_court = True # On suppose qu'il est toujours sur le terrain pour la couleur (simplification)
+# Indices des traces du terrain (ordre d'ajout dans create_court_figure)
+COURT_TRACE_INDEX = {'veec': 0, 'adverse': 1, 'service': 2}
 
-    fig = go.Figure()
-    layout_config = {'modeBarButtonsToRemove': ['zoom', 'pan', 'select', 'lasso2d', 'autoscale', 'zoomIn', 'zoomOut', 'resetscale'], 'scrollZoom': False}
+# Nombre maximal de configurations du terrain gardées en mémoire (tous matchs confondus)
+COURT_FIGURE_CACHE_SIZE = 512
+COURT_FIGURE_CACHE = LRUCache(maxsize=COURT_FIGURE_CACHE_SIZE)
 
-    fig.add_layout_image(
-        dict(source=URL_IMAGE_TERRAIN, xref="x", yref="y", x=0, y=100, sizex=100, sizey=100,
-             sizing="stretch", opacity=1.0, layer="below"))
+COURT_CONFIG = {'modeBarButtonsToRemove': ['zoom', 'pan', 'select', 'lasso2d', 'autoscale', 'zoomIn', 'zoomOut', 'resetscale'], 'scrollZoom': False}
+
+
+def court_trace_props(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num=None):
+    """
+    Propriétés variables des traces du terrain (textes, couleurs, position du ballon de service),
+    indexées par trace puis par chemin de propriété Plotly ('marker.color', ...).
+    Tout le reste de la figure (image, coordonnées, axes) est fixe.
+    Les formations donnent des numéros ; `noms` ({numéro: nom}) et le Libero adverse
+    viennent du registre des équipes.
+    """
+    # Note: un seul Libero adverse est géré (celui de l'effectif adverse)
+    libero_adverse_is_on_court = True # On suppose qu'il est toujours sur le terrain pour la couleur (simplification)
 
-    veec_positions_list = sorted(list(VEEC_POSITIONS_COORDS.keys())) 
-    veec_x = [VEEC_POSITIONS_COORDS[pos]["x"] for pos in veec_positions_list]
-    veec_y = [VEEC_POSITIONS_COORDS[pos]["y"] for pos in veec_positions_list]
-    veec_text = [str(formation_equipe.get(pos, {}).get('numero', '?')) for pos in veec_positions_list]
-    veec_customdata = [pos for pos in veec_positions_list]
-    veec_hovertext = [f"P{pos} - {formation_equipe.get(pos, {}).get('nom', 'N/A')}" for pos in veec_positions_list]
+    veec_positions_list = sorted(VEEC_POSITIONS_COORDS.keys())
+    adverse_positions_list = sorted(ADVERSE_POSITIONS_COORDS.keys())
 
     # ----------------------------------------------------
-    # LOGIQUE LIBERO CENTRALISÉE (Début de la fonction)
+    # LOGIQUE LIBERO CENTRALISÉE
     # ----------------------------------------------------
-    # L'argument liberos_veec est le dictionnaire de statut Libero
     libero_actif_num = liberos_veec.get('actif_numero')
-    libero_reserve_num = liberos_veec.get('reserve_numero') 
+    libero_reserve_num = liberos_veec.get('reserve_numero')
     is_libero_on_court_status = liberos_veec.get('is_on_court')
-    # ----------------------------------------------------
-    
-    veec_colors = []
-    veec_line_colors = []
-    veec_line_widths = [] # <--- NOUVELLE LISTE À AJOUTER
 
-    # Suppression de la ligne précédente qui utilisait 'libero_numero' obsolète
-    # et des initialisations redondantes.
-    
+    veec_colors = []
+    veec_line_widths = []
     for pos in veec_positions_list:
-        # 1. Récupérer les données du joueur à la position actuelle (P[pos])
-     player_data = formation_equipe.get(pos, {})
-     player_on_court_numero = player_data.get('numero') 
-     # 2. VÉRIFICATION : Est-ce que le joueur actuel est le Libero ACTIF ou RESERVE ?
-     is_libero_in_pos = is_libero_on_court_status and \
-                             (player_on_court_numero == libero_actif_num or player_on_court_numero == libero_reserve_num)
-     if is_libero_in_pos:
-        # Style Libero : Bleu (Remplissage), Bleu (Bordure), Épais (3)
-        veec_colors.append('#ADD8E6')        
-        veec_line_colors.append('white')      # Bordue/contrastée
-        veec_line_widths.append(3)          # Bordure épaisse pour l'identification
-        # Si vous utilisez veec_text_colors, ajoutez 'black' ici.
-     else:
-        # Style standard VEEC
-        veec_colors.append(VEEC_COLOR)
-        veec_line_colors.append('white')    # Bordure par défaut
-        veec_line_widths.append(1)          # Bordure fine
-            
-    # Le reste de la fonction (fig.add_trace, etc.) reste inchangé.
-
-    fig.add_trace(go.Scatter(
-        x=veec_x, y=veec_y, hoveron='points', connectgaps=False, mode="markers+text", name="VEEC",
-        # MODIFIÉ: Utiliser les listes de couleurs calculées
-        marker=dict(size=85, color=veec_colors, symbol="circle", line=dict(width=veec_line_widths, color=veec_line_colors)),
-        text=veec_text, textposition="middle center",
-        textfont=dict(color="white", size=18, weight="bold"),
-        customdata=veec_customdata, hoverinfo='text',
-        hovertext=veec_hovertext))
-
-    adverse_positions_list = sorted(list(ADVERSE_POSITIONS_COORDS.keys())) 
-    adverse_x = [ADVERSE_POSITIONS_COORDS[pos]["x"] for pos in adverse_positions_list]
-    adverse_y = [ADVERSE_POSITIONS_COORDS[pos]["y"] for pos in adverse_positions_list]
-    adverse_text = [str(formation_adverse.get(pos, {}).get('numero', '?')) for pos in adverse_positions_list]
-
-    adverse_colors = []      # <--- NOUVEAU
-    adverse_line_colors = [] # <--- NOUVEAU
-    adverse_line_widths = [] # <--- NOUVEAU
+        player_on_court_numero = formation_equipe.get(pos)
+        # Est-ce que le joueur actuel est le Libero ACTIF ou RESERVE ?
+        is_libero_in_pos = is_libero_on_court_status and \
+                                (player_on_court_numero == libero_actif_num or player_on_court_numero == libero_reserve_num)
+        if is_libero_in_pos:
+            # Style Libero : Bleu clair, bordure épaisse pour l'identification
+            veec_colors.append('#ADD8E6')
+            veec_line_widths.append(3)
+        else:
+            # Style standard VEEC
+            veec_colors.append(VEEC_COLOR)
+            veec_line_widths.append(1)
 
-    # ----------------------------------------------------
-    # NOUVELLE LOGIQUE LIBERO ADVERSE
-    # ----------------------------------------------------
+    adverse_colors = []
+    adverse_line_widths = []
     for pos in adverse_positions_list:
-        player_data = formation_adverse.get(pos, {})
-        player_on_court_numero = player_data.get('numero') 
-
-        # VÉRIFICATION : Est-ce que le joueur actuel est le Libero Adverse ?
-        is_libero_in_pos = player_on_court_numero == libero_adverse_num
-        
-        if is_libero_in_pos and libero_adverse_is_on_court:
-            # Style Libero Adverse : Rouge, Bordure Rouge Épaisse
+        player_on_court_numero = formation_adverse.get(pos)
+        if player_on_court_numero == libero_adverse_num and libero_adverse_is_on_court:
+            # Style Libero Adverse : Rouge clair, bordure épaisse
             adverse_colors.append('#F08080')
-            adverse_line_colors.append('white')
             adverse_line_widths.append(3)
         else:
             # Style standard Adverse
             adverse_colors.append(ADVERSE_COLOR)
-            adverse_line_colors.append('white')
             adverse_line_widths.append(1)
 
+    # Ballon de service : la trace existe toujours (indice stable), masquée si aucun service
+    if service_actuel == 'VEEC':
+        service_x, service_y = VEEC_POSITIONS_COORDS[1]["x"] - 8, VEEC_POSITIONS_COORDS[1]["y"] - 8
+    elif service_actuel == 'ADVERSAIRE':
+        service_x, service_y = ADVERSE_POSITIONS_COORDS[1]["x"] + 8, ADVERSE_POSITIONS_COORDS[1]["y"] + 8
+    else:
+        service_x, service_y = None, None
+
+    return {
+        'veec': {
+            'text': [str(formation_equipe.get(pos, '?')) for pos in veec_positions_list],
+            'hovertext': [f"P{pos} - {noms.get(formation_equipe.get(pos), 'N/A')}" for pos in veec_positions_list],
+            'marker.color': veec_colors,
+            'marker.line.width': veec_line_widths,
+        },
+        'adverse': {
+            'text': [str(formation_adverse.get(pos, '?')) for pos in adverse_positions_list],
+            'marker.color': adverse_colors,
+            'marker.line.width': adverse_line_widths,
+        },
+        'service': {
+            'x': [service_x],
+            'y': [service_y],
+            'visible': service_x is not None,
+        },
+    }
+
+
+def create_court_figure(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num=None):
+    props = court_trace_props(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num)
+    veec, adverse, service = props['veec'], props['adverse'], props['service']
+
+    fig = go.Figure()
+
+    fig.add_layout_image(
+        dict(source=URL_IMAGE_TERRAIN, xref="x", yref="y", x=0, y=100, sizex=100, sizey=100,
+             sizing="stretch", opacity=1.0, layer="below"))
+
+    veec_positions_list = sorted(VEEC_POSITIONS_COORDS.keys())
+    fig.add_trace(go.Scatter(
+        x=[VEEC_POSITIONS_COORDS[pos]["x"] for pos in veec_positions_list],
+        y=[VEEC_POSITIONS_COORDS[pos]["y"] for pos in veec_positions_list],
+        hoveron='points', connectgaps=False, mode="markers+text", name="VEEC",
+        marker=dict(size=85, color=veec['marker.color'], symbol="circle", line=dict(width=veec['marker.line.width'], color='white')),
+        text=veec['text'], textposition="middle center",
+        textfont=dict(color="white", size=18, weight="bold"),
+        customdata=veec_positions_list, hoverinfo='text',
+        hovertext=veec['hovertext']))
+
+    adverse_positions_list = sorted(ADVERSE_POSITIONS_COORDS.keys())
     fig.add_trace(go.Scatter(
-        x=adverse_x, y=adverse_y, mode="markers+text", name="Adversaire",
-        marker=dict(size=85, color=adverse_colors, symbol="circle", line=dict(width=adverse_line_widths, color=adverse_line_colors)),
-        text=adverse_text, textposition="middle center",
+        x=[ADVERSE_POSITIONS_COORDS[pos]["x"] for pos in adverse_positions_list],
+        y=[ADVERSE_POSITIONS_COORDS[pos]["y"] for pos in adverse_positions_list],
+        mode="markers+text", name="Adversaire",
+        marker=dict(size=85, color=adverse['marker.color'], symbol="circle", line=dict(width=adverse['marker.line.width'], color='white')),
+        text=adverse['text'], textposition="middle center",
         textfont=dict(color="white", size=18, weight="bold"), hoverinfo='none',
     ))
 
-    service_coords = {}
-    if service_actuel == 'VEEC':
-        service_coords = VEEC_POSITIONS_COORDS[1]
-        x_offset, y_offset = -8, -8 
-    elif service_actuel == 'ADVERSAIRE':
-        service_coords = ADVERSE_POSITIONS_COORDS[1]
-        x_offset, y_offset = 8, 8 
-    
-    if service_coords:
-        fig.add_trace(go.Scatter(
-            x=[service_coords["x"] + x_offset],
-            y=[service_coords["y"] + y_offset], 
-            mode="text", name="Service Ball",
-            text=["🏐"], textposition="middle center",
-            textfont=dict(size=53), hoverinfo='none',
-        ))
+    fig.add_trace(go.Scatter(
+        x=service['x'], y=service['y'], visible=service['visible'],
+        mode="text", name="Service Ball",
+        text=["🏐"], textposition="middle center",
+        textfont=dict(size=53), hoverinfo='none',
+    ))
 
     fig.update_layout(
         xaxis=dict(range=[0, 100], showgrid=False, zeroline=False, visible=False, fixedrange=True),
@@ -377,7 +249,61 @@ def create_court_figure(formation_equipe, formation_adverse, service_actuel, lib
         plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', dragmode=False,
         clickmode='event')
     
-    return fig, layout_config
+    return fig, COURT_CONFIG
+
+
+def court_props_signature(props):
+    """Empreinte compacte (une par propriété) conservée par le navigateur dans 'court-figure-signature'."""
+    return {f"{trace}|{path}": zlib.crc32(json.dumps(value).encode())
+            for trace, trace_props in props.items() for path, value in trace_props.items()}
+
+
+def court_figure_key(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num=None):
+    """Clé canonique d'une configuration du terrain : tout ce qui influe sur la figure, et rien d'autre."""
+    return (
+        tuple((formation_equipe.get(pos), noms.get(formation_equipe.get(pos))) for pos in sorted(VEEC_POSITIONS_COORDS)),
+        tuple(formation_adverse.get(pos) for pos in sorted(ADVERSE_POSITIONS_COORDS)),
+        service_actuel,
+        bool(liberos_veec.get('is_on_court')),
+        liberos_veec.get('actif_numero'),
+        liberos_veec.get('reserve_numero'),
+        libero_adverse_num,
+    )
+
+
+def get_court_figure(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num=None):
+    """
+    Figure du terrain sérialisée, ses propriétés variables et leur empreinte,
+    mémorisées par configuration dans COURT_FIGURE_CACHE (LRU).
+    """
+    def build():
+        props = court_trace_props(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num)
+        fig, _ = create_court_figure(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num)
+        return {'figure': fig.to_dict(), 'props': props, 'signature': court_props_signature(props)}
+
+    key = court_figure_key(formation_equipe, formation_adverse, service_actuel, liberos_veec, noms, libero_adverse_num)
+    return COURT_FIGURE_CACHE.get_or_build(key, build)
+
+
+def create_court_figure_patch(court_entry, signature):
+    """
+    Patch partiel de la figure du terrain : seules les propriétés dont l'empreinte
+    a changé par rapport à 'signature' sont envoyées. Retourne None si rien n'a changé.
+    """
+    props = court_entry['props']
+    patch = dash.Patch()
+    changed = False
+    for key, crc in court_entry['signature'].items():
+        if signature.get(key) == crc:
+            continue
+        trace, path = key.split('|')
+        target = patch['data'][COURT_TRACE_INDEX[trace]]
+        *parents, leaf = path.split('.')
+        for part in parents:
+            target = target[part]
+        target[leaf] = props[trace][path]
+        changed = True
+    return patch if changed else None
 
 def create_player_card(player_data, is_selected=False, is_assigned=False):
     """Génère un bouton/carte pour un joueur disponible ou assigné."""
@@ -496,7 +422,8 @@ def create_pre_match_setup_modal(current_state):
     """Génère la modal de configuration pré-match. Filtre les joueurs assignés."""
     
     VEEC_COLOR = '#007bff' # Remplacez par votre couleur réelle
-    ROSTER_VEEC = current_state.get('JOUERS_VEEC', {})
+    effectif = EFFECTIFS.du_match(current_state)
+    ROSTER_VEEC = effectif.fiches
     
     # --- 1. GESTION DES TYPES ET DES NUMÉROS ASSIGNÉS ---
     
@@ -512,7 +439,7 @@ def create_pre_match_setup_modal(current_state):
     temp_formation = current_state.get('temp_setup_formation_veec', {})
     
     # 🚨 CORRECTION : On récupère les numéros assignés (convertis en chaîne)
-    assigned_nums_str = {str(p['numero']) for p in temp_formation.values()}
+    assigned_nums_str = {str(num) for num in temp_formation.values()}
     
     # Récupération du joueur actuellement sélectionné (laissé en INT pour la comparaison facile)
     selected_num = current_state.get('temp_setup_selected_player_num')
@@ -525,7 +452,9 @@ def create_pre_match_setup_modal(current_state):
     # Tri par numéro (en forçant la conversion en int pour un tri correct 1, 2, 10 au lieu de 1, 10, 2)
     sorted_roster = sorted(ROSTER_VEEC.items(), key=lambda item: int(item[0]))
     
-    for num_str, data in sorted_roster:
+    for num, data in sorted_roster:
+        # L'état reste côté serveur : les clés du roster peuvent être des entiers.
+        num_str = str(num)
         
         is_assigned = num_str in assigned_nums_str # Vérifie si le joueur est sur le terrain
         is_libero = num_str in liberos_num_str     # Vérifie si c'est un libéro
@@ -547,7 +476,7 @@ def create_pre_match_setup_modal(current_state):
     position_list_components = [
         create_position_card(
             pos, 
-            assigned_player_data=temp_formation.get(pos),
+            assigned_player_data=effectif.fiche(temp_formation.get(pos)),
             selected_player_num=selected_num # Passe l'INT pour la comparaison avec l'index de position (1, 2, etc.)
         )
         for pos in range(1, 7)
@@ -595,62 +524,167 @@ VIEWPORT_META = [
 ]
 
 app = dash.Dash(__name__, suppress_callback_exceptions=True, meta_tags=VIEWPORT_META)
-
-initial_state = {
-    'formation_actuelle': FORMATION_INITIALE,
-    'joueurs_banc': JOUEURS_BANC_INITIAL,
-    'formation_adverse_actuelle': FORMATION_ADVERSE_INITIALE,
-    'joueurs_banc_adverse': BANC_ADVERSE_INITIAL,
-    # 🚨 VÉRIFIEZ BIEN CES DEUX CLÉS
-    'match_setup_completed': False, 
-    'temp_setup_formation_veec': {}, 
-    'temp_setup_selected_player_num': None,
-    # Utilisez le dictionnaire converti
-    'JOUERS_VEEC': JOUERS_VEEC_DICT,
-    'service_actuel': 'VEEC', 
-    'score_veec': 0, 'score_adverse': 0, 
-    'sets_veec': 0, 'sets_adverse': 0,
-    'current_set': 1,
-    'match_ended': False,  # <-- NOUVEAU : Indicateur global de fin de match
-    'match_winner': None,  # <-- NOUVEAU : Stocke le gagnant ('VEEC' ou 'ADVERSE')
-    'timeouts_veec': 0, 'timeouts_adverse': 0,
-    'sub_veec': 0, 'sub_adverse': 0,
-    'rotation_count': 0, 
-    'service_choisi': True, 
-    'historique_stats': [],
-    'start_time': time.time(),
-    'timer_end_time': 0, 
-    'timer_type': None,
-    'sub_en_cours_team': None,
-    # CORRECTION : Le feedback est maintenant DANS l'état temporaire
-    'temp_sub_state': {'entrant': None, 'sortant_pos': None, 'feedback': ""},
-    'liberos_veec': {
-        # Statut du Libero Actif (N°8)
-        'actif_numero': LIBERO_PRINCIPAL_NUM,      # Utilise la constante
-        'is_on_court': False,                  
-        'starter_numero_replaced': None,       
-        'current_pos_on_court': None,          
-
-        # Statut du Libero Remplaçant (N°9)
-        'reserve_numero': LIBERO_RESERVE_NUM,     # Utilise la constante
-        'is_reserve_used': False,              
-        'reserve_can_swap_in': False,          
+server = app.server # Point d'entrée WSGI (gunicorn app:server)
+
+# Préchauffage du sérialiseur JSON de Dash : à la première sérialisation d'un composant imbriqué,
+# orjson importe numpy ; deux requêtes simultanées y échouaient (module partiellement initialisé).
+to_json_plotly(html.Div(html.Div()))
+
+# --- ÉQUIPES PAR MATCH ---
+# Chaque match (/match/<id>) choisit son effectif VEEC et son adversaire :
+# /match/<id>?effectif=<nom>&adversaire=<nom>.
+# VEEC_EFFECTIFS : fichier ou répertoire de fichiers YAML, CSV ou JSON (voir effectifs.py), ex. :
+#   u18:
+#     joueurs: [{numero: 1, nom: "..."}, ...]
+#     libero: 7
+#     libero_reserve: 9
+#     libero_titulaire: 6
+# Les 6 premiers joueurs forment la formation de départ proposée, les suivants le banc.
+# Registre partagé par tous les matchs (effectifs.py) : l'état d'un match ne garde que les
+# numéros et les références (effectif, version). Les fichiers modifiés ou ajoutés sont
+# relus sans redémarrage (au plus une vérification par seconde).
+EFFECTIF_PAR_DEFAUT = 'veec'
+ADVERSAIRE_PAR_DEFAUT = 'adversaire'
+EFFECTIFS = RegistreEffectifs(EFFECTIF_PAR_DEFAUT, ADVERSAIRE_PAR_DEFAUT, chemin=os.environ.get('VEEC_EFFECTIFS') or None)
+EFFECTIFS.enregistrer(EFFECTIF_PAR_DEFAUT, {'joueurs': LISTE_JOUEURS_PREDEFINIE, 'libero': LIBERO_PRINCIPAL_NUM,
+                                            'libero_reserve': LIBERO_RESERVE_NUM, 'libero_titulaire': 6})
+EFFECTIFS.enregistrer(ADVERSAIRE_PAR_DEFAUT, {'joueurs': LISTE_ADVERSES_PREDEFINIE, 'libero': LIBERO_ADVERSE_NUM})
+EFFECTIFS.rafraichir(forcer=True)
+
+def etat_initial(effectif, adversaire=None):
+    """État de départ d'un match entre deux équipes du registre (effectifs.Effectif)."""
+    adversaire = adversaire or EFFECTIFS.get(ADVERSAIRE_PAR_DEFAUT)
+    numeros, numeros_adverses = effectif.numeros, adversaire.numeros
+    return {
+        **effectif.reference(),
+        **adversaire.reference('_adverse'),
+        'formation_actuelle': {pos: numeros[i] for i, pos in enumerate(VEEC_POSITIONS_COORDS)},
+        'joueurs_banc': numeros[6:],
+        'formation_adverse_actuelle': {pos: numeros_adverses[i] for i, pos in enumerate(sorted(ADVERSE_POSITIONS_COORDS))},
+        'joueurs_banc_adverse': numeros_adverses[6:],
+        # 🚨 VÉRIFIEZ BIEN CES DEUX CLÉS
+        'match_setup_completed': False, 
+        'temp_setup_formation_veec': {}, 
+        'temp_setup_selected_player_num': None,
+        'service_actuel': 'VEEC', 
+        'score_veec': 0, 'score_adverse': 0, 
+        'sets_veec': 0, 'sets_adverse': 0,
+        'current_set': 1,
+        'match_ended': False,  # <-- NOUVEAU : Indicateur global de fin de match
+        'match_winner': None,  # <-- NOUVEAU : Stocke le gagnant ('VEEC' ou 'ADVERSE')
+        'timeouts_veec': 0, 'timeouts_adverse': 0,
+        'sub_veec': 0, 'sub_adverse': 0,
+        'rotation_count': 0, 
+        'service_choisi': True, 
+        'start_time': time.time(),
+        'timer_end_time': 0, 
+        'timer_type': None,
+        'sub_en_cours_team': None,
+        # CORRECTION : Le feedback est maintenant DANS l'état temporaire
+        'temp_sub_state': {'entrant': None, 'sortant_pos': None, 'feedback': ""},
+        'liberos_veec': {
+            # Statut du Libero Actif (N°8)
+            'actif_numero': effectif.libero,
+            'is_on_court': False,                  
+            'starter_numero_replaced': None,       
+            'current_pos_on_court': None,          
+
+            # Statut du Libero Remplaçant (N°9)
+            'reserve_numero': effectif.libero_reserve,
+            'is_reserve_used': False,              
+            'reserve_can_swap_in': False,          
         
-        # Le titulaire que le Libero remplace (N°6 M. Central)
-        'libero_spot_starter_numero': 6,       
-    },
-}
+            # Le titulaire que le Libero remplace (N°6 M. Central)
+            'libero_spot_starter_numero': effectif.libero_titulaire,       
+        },
+    }
+
+initial_state = etat_initial(EFFECTIFS.get(EFFECTIF_PAR_DEFAUT), EFFECTIFS.get(ADVERSAIRE_PAR_DEFAUT))
+
+# --- STOCKAGE SERVEUR DE L'ÉTAT ---
+# Le dcc.Store 'match-state' ne contient que {'match_id', 'version'} :
+# l'état complet reste côté serveur. Les actions de match sont enregistrées
+# comme événements (match_engine.py) ; les sélections des modales sont un
+# simple état d'interface.
+#
+# Journal durable : chaque action est aussi ajoutée (par lots, en arrière-plan)
+# à une base SQLite locale, pour reprendre un match après un crash ou un
+# rechargement. VEEC_JOURNAL_DB="" désactive la persistance.
+
+JOURNAL_DB_PATH = os.environ.get('VEEC_JOURNAL_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'veec_matches.db'))
+JOURNAL_DURABLE = SQLiteJournal(JOURNAL_DB_PATH) if JOURNAL_DB_PATH else None
+
+# Plusieurs matchs par processus (un par terrain, /match/<id>) : avec le journal durable,
+# au plus VEEC_MAX_MATCHS matchs restent en mémoire et un match inactif depuis
+# VEEC_INACTIVITE_MAX secondes est évincé (rechargé depuis le journal au prochain accès).
+MAX_MATCHS_EN_MEMOIRE = int(os.environ.get('VEEC_MAX_MATCHS', 50))
+INACTIVITE_MAX_SECONDES = float(os.environ.get('VEEC_INACTIVITE_MAX', 2 * 3600))
+
+# Backend d'état (etat_partage.py) : 'memoire' pour un seul processus ; avec plusieurs
+# workers (gunicorn -w 4 app:server), un backend partagé, ex.
+# VEEC_STATE_BACKEND=sqlite:///veec_etat.db ou redis://localhost:6379/0.
+STATE_BACKEND = backend_depuis_url(os.environ.get('VEEC_STATE_BACKEND', 'memoire'))
+
+MATCH_STORE = MatchStore(journal_durable=JOURNAL_DURABLE, max_matchs=MAX_MATCHS_EN_MEMOIRE,
+                         inactivite_max=INACTIVITE_MAX_SECONDES, backend=STATE_BACKEND)
+
+# Instrumentation des callbacks (latence, tailles, déclencheur) : GET /metrics.
+# VEEC_METRICS=1 l'active au démarrage ; POST /metrics/activer|desactiver à chaud.
+# Journal tournant : VEEC_METRICS_LOG (chaîne vide pour ne pas écrire de fichier).
+METRICS_LOG_PATH = os.environ.get('VEEC_METRICS_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'veec_metrics.log'))
+METRIQUES = MetriquesCallbacks(actif=os.environ.get('VEEC_METRICS') == '1', log_path=METRICS_LOG_PATH or None)
+METRIQUES.installer(app)
+
+# Direct spectateurs (lecture seule, sans Dash) : page /spectateur/<match_id>, flux SSE /direct/<match_id>
+DIFFUSION = DiffusionMatchs(MATCH_STORE)
+DIFFUSION.installer(server)
+
+# Mode hors ligne du marqueur : points mis en file dans le navigateur, synchronisés par lots (POST /sync/<match_id>)
+SYNCHRO_HORS_LIGNE = SynchroHorsLigne(MATCH_STORE)
+SYNCHRO_HORS_LIGNE.installer(server)
+
+# Match par défaut (racine /) : identifiant fixe, le même dans tous les workers et après un redémarrage
+MATCH_PAR_DEFAUT = os.environ.get('VEEC_MATCH_PAR_DEFAUT', 'principal')
+MATCH_REF_INITIALE = MATCH_STORE.ouvrir(MATCH_PAR_DEFAUT, initial_state)
+
+def load_match_state(match_ref):
+    """Charge l'état complet du match référencé par le dcc.Store."""
+    return MATCH_STORE.load(match_ref['match_id'])
+
+def dispatch_match_event(match_ref, event_type, data=None, undoable=True, **ui_changes):
+    """Enregistre une action de match et retourne la nouvelle référence pour le dcc.Store."""
+    return MATCH_STORE.dispatch(match_ref['match_id'], event_type, data, undoable=undoable, **ui_changes)
+
+def update_match_ui(match_ref, **ui_changes):
+    """Met à jour l'état d'interface (modales) et retourne la nouvelle référence pour le dcc.Store."""
+    return MATCH_STORE.update_ui(match_ref['match_id'], **ui_changes)
+
 
 # --- MISE EN PAGE (LAYOUT) ---
 
 app.layout = html.Div(
     [
-        dcc.Store(id='match-state', data=initial_state),
+        # /match/<id> : un match par terrain ; la racine sert le match par défaut
+        dcc.Location(id='url', refresh=False),
+        dcc.Store(id='match-state', data=MATCH_REF_INITIALE),
         dcc.Store(id='joueur-selectionne', data=None),
         dcc.Store(id='setup-refresh-trigger'), # 🚨 AJOUTEZ CETTE LIGNE
         dcc.Store(id='current-set', data=1), 
+        dcc.Store(id='court-figure-signature', data=None), # Empreinte de la figure du terrain affichée (mises à jour partielles)
+        # Tick purement client : seuls des callbacks clientside l'écoutent (aucune requête serveur par seconde)
         dcc.Interval(id='interval-component', interval=1000, n_intervals=0), 
+        dcc.Store(id='timer-state', data=None),
+        dcc.Store(id='timer-clock-offset', data=0),
+        dcc.Store(id='timer-expired', data=None),
         dcc.Store(id='close-modal-trigger', data=0), 
+        # Mode hors ligne : file de points du navigateur (localStorage) et dernier état reçu du serveur
+        dcc.Store(id='file-hors-ligne', storage_type='local'),
+        dcc.Store(id='etat-hors-ligne', data=None),
+        # Point affiché avant la réponse du serveur (affichage à rétablir si le point n'est pas confirmé)
+        dcc.Store(id='point-optimiste', data=None),
+        dcc.Store(id='point-refuse', data=None),
+        # Reprise des matchs non terminés trouvés dans le journal durable (au chargement de la page)
+        html.Div(id='resume-panel-container'),
         # 🚨 NOUVEAU : Conteneur de la modal de configuration (sera affiché ou masqué)
         html.Div(id='pre-match-setup-container'),
         html.Div(id='service-modal-container'), 
@@ -686,7 +720,7 @@ app.layout = html.Div(
                  ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'width': '30%', 'border': '2px solid #ddd', 'borderRadius': '10px', 'padding': '10px 0', 'boxShadow': '0 2px 5px rgba(0,0,0,0.1)'}),
         
                  html.Div([
-                 html.Span("ADVERSAIRE", style={'fontSize': '1.8em', 'fontWeight': 'bold', 'fontFamily': 'sans-serif', 'color': '#333'}),
+                 html.Span("ADVERSAIRE", id='nom-equipe-adverse', style={'fontSize': '1.8em', 'fontWeight': 'bold', 'fontFamily': 'sans-serif', 'color': '#333'}),
                  html.Div(style={'height': '35px', 'width': '35px', 'backgroundColor': ADVERSE_COLOR, 'borderRadius': '5px', 'marginLeft': '10px'}),
                  ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'flex-start', 'width': '35%', 'paddingLeft': '20px'}),
         
@@ -698,7 +732,9 @@ app.layout = html.Div(
 
         dcc.Graph(
             id='terrain-graph-statique', 
-            figure=create_court_figure(FORMATION_INITIALE, FORMATION_ADVERSE_INITIALE, initial_state['service_actuel'], initial_state['liberos_veec'])[0], 
+            figure=create_court_figure(initial_state['formation_actuelle'], initial_state['formation_adverse_actuelle'], initial_state['service_actuel'],
+                                       initial_state['liberos_veec'], EFFECTIFS.du_match(initial_state).noms,
+                                       EFFECTIFS.adverse_du_match(initial_state).libero)[0], 
             config={'displayModeBar': False, 'scrollZoom': False, 'doubleClick': False,
                     'modeBarButtonsToRemove': [
             'zoom2d', 'pan2d', 'select2d', 'lasso2d', 'autoscale', 
@@ -740,6 +776,22 @@ app.layout = html.Div(
             'fontWeight': 'bold'}),
         ], style={'textAlign': 'center', 'marginBottom': '20px', 'marginTop': '10px'}),
 
+        # Mode hors ligne : les points sont comptés localement puis envoyés en un seul lot au retour du réseau
+        html.Div([
+            dcc.Checklist(id='mode-hors-ligne', options=[{'label': ' Mode hors ligne (réseau instable)', 'value': 'on'}],
+                          value=[], persistence=True, persistence_type='local', inputStyle={'marginRight': '5px'}),
+            html.Div(id='statut-hors-ligne', style={'color': '#666', 'marginTop': '5px'}),
+        ], style={'textAlign': 'center', 'marginBottom': '10px'}),
+
+        # Annuler / Rétablir la dernière action (point, stat, substitution, Libero...)
+        html.Div([
+            html.Button("↶ Annuler", id='btn-undo', n_clicks=0,
+                        style={'marginRight': '10px', 'padding': '8px 20px', 'backgroundColor': '#6c757d', 'color': 'white', 'border': 'none', 'borderRadius': '5px'}),
+            html.Button("↷ Rétablir", id='btn-redo', n_clicks=0,
+                        style={'padding': '8px 20px', 'backgroundColor': '#6c757d', 'color': 'white', 'border': 'none', 'borderRadius': '5px'}),
+            html.Div(id='feedback-undo', style={'color': '#666', 'marginTop': '5px'}),
+        ], style={'textAlign': 'center', 'marginBottom': '10px'}),
+
         # Ajoutez ce Div dans votre layout, près de la modal de substitution ou sous la zone de score/contrôle.
         html.Div(
          id='feedback-sub-output',
@@ -756,7 +808,14 @@ app.layout = html.Div(
             html.Div([
                 html.H4("Set ", style={'width': '20%', 'textAlign': 'left', 'fontSize': '1.5em', 'paddingLeft': '10px'}),
                 html.Span("1", id='set-number-display', style={'fontSize': '1.5em', 'fontWeight': 'bold'}),
-                html.Div(id='timer-progress-bar', style={'width': '70%', 'textAlign': 'right', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'flex-end'}), 
+                html.Div(id='timer-progress-bar', children=html.Div([
+                    html.Div(id='timer-text'),
+                    html.Div([
+                        html.Div(id='timer-bar-track', style={'display': 'none'}),
+                        html.Div(id='timer-bar-fill', style={'display': 'none'}),
+                    ], style={'width': '100%'}),
+                ], style={'width': '100%', 'display': 'flex', 'flexDirection': 'column', 'alignItems': 'flex-end'}),
+                style={'width': '70%', 'textAlign': 'right', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'flex-end'}), 
             ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'marginBottom': '15px', 'paddingRight': '10px'}),
 
             html.Div([
@@ -813,10 +872,21 @@ app.layout = html.Div(
             
         ], style={'padding': '20px', 'borderTop': '1px solid #ccc'}),
         
+        html.Details([
+            html.Summary("Statistiques Joueurs", style={'marginTop': '20px', 'fontWeight': 'bold'}),
+            dcc.RadioItems(id='stats-set-choisi', options=[{'label': 'Match', 'value': 0}], value=0, inline=True,
+                           labelStyle={'marginRight': '15px'}, style={'marginTop': '10px'}),
+            create_stats_table(),
+        ], style={'padding': '10px'}),
+
         html.Details([
             html.Summary("Historique des Actions (Détail)", style={'marginTop': '20px', 'fontWeight': 'bold'}),
             # CORRECTION : Initialisation du tableau
-            html.Div(id='historique-output', children=create_historique_table(initial_state['historique_stats']))
+            html.Div("L'historique des actions est vide pour le moment.", id='historique-vide', style={'padding': '10px', 'color': '#666'}),
+            html.Div(id='historique-output', children=create_historique_table()),
+            html.Button("⬇ Exporter le match (CSV)", id='btn-export-match', n_clicks=0,
+                        style={'marginTop': '10px', 'padding': '8px 20px', 'backgroundColor': '#6c757d', 'color': 'white', 'border': 'none', 'borderRadius': '5px'}),
+            dcc.Download(id='download-export'),
         ], style={'padding': '10px'}),
     ],
     style={'padding': '0', 'margin': '0'}, 
@@ -835,19 +905,106 @@ app.layout = html.Div(
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_libero_swap_ui(n_clicks, current_state):
+def handle_libero_swap_ui(n_clicks, match_ref):
     """
     Gère l'activation du Libero de réserve (N°9) par le bouton dédié.
     """
     if n_clicks is None or n_clicks == 0:
         raise dash.exceptions.PreventUpdate
 
-    # La fonction swap_liberos_on_bench est appelée ici
-    new_state, feedback_message = swap_liberos_on_bench(current_state)
+    current_state = load_match_state(match_ref)
+
+    # La fonction swap_liberos_on_bench vérifie que l'échange est autorisé
+    event_data, feedback_message = swap_liberos_on_bench(current_state)
     
-    # new_state contient l'état mis à jour (ou non si échec)
+    # event_data est None si l'échange est refusé
     # feedback_message contient le résultat de l'opération
-    return new_state, feedback_message
+    if event_data is None:
+        return dash.no_update, feedback_message
+    return dispatch_match_event(match_ref, engine.LIBERO_SWAP_RESERVE, event_data), feedback_message
+
+
+# 0.0 Sélection du match par l'URL (/match/<id>[?effectif=<nom>])
+URL_MATCH_RE = re.compile(r'/match/([A-Za-z0-9_-]{1,64})/?')
+
+@app.callback(
+    Output('match-state', 'data', allow_duplicate=True),
+    Input('url', 'pathname'),
+    State('url', 'search'),
+    prevent_initial_call='initial_duplicate'
+)
+def select_match_from_url(pathname, search):
+    m = URL_MATCH_RE.fullmatch(pathname or '')
+    if m is None:
+        # Racine : match par défaut, à sa version courante (écritures des autres workers comprises)
+        return MATCH_STORE.ouvrir(MATCH_PAR_DEFAUT, initial_state)
+    # Match existant (rechargé s'il a été évincé) ou nouveau match entre les équipes demandées
+    parametres = parse_qs((search or '').lstrip('?'))
+    effectif = EFFECTIFS.get(parametres.get('effectif', [EFFECTIF_PAR_DEFAUT])[0])
+    adversaire = EFFECTIFS.get(parametres.get('adversaire', [ADVERSAIRE_PAR_DEFAUT])[0], defaut=ADVERSAIRE_PAR_DEFAUT)
+    return MATCH_STORE.ouvrir(m.group(1), etat_initial(effectif, adversaire))
+
+
+# 0.1 Reprise d'un match non terminé (journal durable)
+def create_resume_panel(matchs):
+    """Panneau proposant de reprendre les matchs non terminés du journal."""
+    lignes = []
+    for m in matchs:
+        date = datetime.fromtimestamp(m['updated_at']).strftime("%d/%m %H:%M")
+        lignes.append(html.Div([
+            html.Span(f"{date} — Set {m['set']}, {m['score_veec']}-{m['score_adverse']} ({m['nb_events']} actions)",
+                      style={'flex': '1'}),
+            html.Button("Reprendre", id={'type': 'btn-resume-match', 'index': m['match_id']}, n_clicks=0,
+                        style={'backgroundColor': VEEC_COLOR, 'color': 'white', 'border': 'none', 'padding': '8px 15px', 'borderRadius': '5px'}),
+        ], style={'display': 'flex', 'alignItems': 'center', 'gap': '10px', 'padding': '8px 0', 'borderBottom': '1px solid #eee'}))
+
+    content = html.Div([
+        html.H3("Matchs non terminés", style={'marginTop': 0}),
+        html.P("Un ou plusieurs matchs n'ont pas été terminés. Reprendre un match reconstruit son état depuis le journal."),
+        html.Div(lignes),
+        html.Button("Nouveau match", id='btn-resume-dismiss', n_clicks=0,
+                    style={'marginTop': '15px', 'padding': '8px 15px', 'borderRadius': '5px', 'border': '1px solid #ccc'}),
+    ], style={'backgroundColor': 'white', 'padding': '25px', 'borderRadius': '12px', 'width': '95%', 'maxWidth': '600px',
+              'maxHeight': '90vh', 'overflowY': 'auto'})
+
+    return html.Div(content, style={
+        'position': 'fixed', 'top': 0, 'left': 0, 'width': '100%', 'height': '100%',
+        'backgroundColor': 'rgba(0,0,0,0.8)', 'display': 'flex', 'justifyContent': 'center',
+        'alignItems': 'center', 'zIndex': 2000,
+    })
+
+
+@app.callback(
+    Output('resume-panel-container', 'children'),
+    Input('url', 'pathname'),
+    State('match-state', 'data'),
+)
+def show_resume_panel(pathname, match_ref):
+    # Proposé seulement sur la racine : /match/<id> désigne déjà son match
+    if JOURNAL_DURABLE is None or URL_MATCH_RE.fullmatch(pathname or ''):
+        return None
+    matchs = [m for m in JOURNAL_DURABLE.unfinished_matches() if m['match_id'] != match_ref['match_id']]
+    return create_resume_panel(matchs) if matchs else None
+
+
+@app.callback(
+    Output('match-state', 'data', allow_duplicate=True),
+    Output('resume-panel-container', 'children', allow_duplicate=True),
+    Input({'type': 'btn-resume-match', 'index': ALL}, 'n_clicks'),
+    Input('btn-resume-dismiss', 'n_clicks'),
+    prevent_initial_call=True
+)
+def handle_resume_match(resume_clicks, dismiss_clicks):
+    ctx = dash.callback_context
+    if not ctx.triggered or not ctx.triggered[0]['value']:
+        return dash.no_update, dash.no_update
+
+    triggered_id = ctx.triggered_id
+    if triggered_id == 'btn-resume-dismiss':
+        return dash.no_update, None
+
+    # Durée de la reprise (rejeu du journal) : latence de ce callback dans /metrics
+    return MATCH_STORE.restore(triggered_id['index']), None
 
 
 # 0.3 Gestion de la sélection Joueur/Position et Affichage de la Modal
@@ -873,17 +1030,18 @@ def handle_setup_selection(player_clicks, position_clicks,
     # 🚨 BLOC CRITIQUE FINAL : TOUJOURS UTILISER L'INPUT FRAIS COMME BASE
     # ----------------------------------------------------------------------
     # Utiliser l'Input match_state_input (toujours la version la plus fraîche)
-    state_to_use = match_state_input
+    match_ref = match_state_input
     
     # Si l'Input est None (très rare, mais par sécurité), on utilise le State.
-    if state_to_use is None:
-        state_to_use = current_state_from_state
+    if match_ref is None:
+        match_ref = current_state_from_state
         
-    new_state = copy.deepcopy(state_to_use)
+    state_to_use = load_match_state(match_ref)
+    # L'état chargé est partagé (lecture seule) : seule la formation temporaire est copiée avant modification.
+    new_state = dict(state_to_use)
     
     # Assurer que la formation est initialisée (avec des clés ENTRIES)
-    if 'temp_setup_formation_veec' not in new_state:
-        new_state['temp_setup_formation_veec'] = {}
+    new_state['temp_setup_formation_veec'] = dict(state_to_use.get('temp_setup_formation_veec') or {})
     temp_formation = new_state['temp_setup_formation_veec'] 
     
     # ----------------------------------------------------------------------
@@ -926,23 +1084,17 @@ def handle_setup_selection(player_clicks, position_clicks,
         
         # A. Désassigner
         if pos in temp_formation:
-            player_to_unassign = temp_formation[pos]['numero']
+            player_to_unassign = temp_formation[pos]
             temp_formation.pop(pos)
             new_state['temp_setup_selected_player_num'] = None
             print(f"-> POSITION CLIC: P{pos} désassignée (Joueur {player_to_unassign} retiré).")
             
         # B. Assignation
         elif player_num is not None:
-            ROSTER_VEEC = new_state.get('JOUERS_VEEC', {})
-            
-            player_data = ROSTER_VEEC.get(player_num)
-            if player_data is None: 
-                player_data = ROSTER_VEEC.get(str(player_num))
-            
-            if player_data:
-                player_data['numero'] = int(player_num)
+            # La formation temporaire ne garde que le numéro (fiche dans le registre des effectifs)
+            if EFFECTIFS.du_match(new_state).fiche(int(player_num)):
                 # Utilisation de l'ENTIER 'pos' comme clé
-                temp_formation[pos] = player_data 
+                temp_formation[pos] = int(player_num)
                 new_state['temp_setup_selected_player_num'] = None 
                 print(f"-> POSITION CLIC: Joueur N°{player_num} assigné à P{pos}. Sélection réinitialisée.")
             else:
@@ -953,84 +1105,59 @@ def handle_setup_selection(player_clicks, position_clicks,
     # --- D. MISE À JOUR VISUELLE (Après la logique de clic) ---
     updated_modal = create_pre_match_setup_modal(new_state)
     
-    return updated_modal, new_state
+    new_ref = update_match_ui(match_ref,
+                              temp_setup_formation_veec=new_state['temp_setup_formation_veec'],
+                              temp_setup_selected_player_num=new_state['temp_setup_selected_player_num'])
+    return updated_modal, new_ref
 
 # 0.4 Confirmation de la Formation et Démarrage du Match
 @app.callback(
     Output('match-state', 'data', allow_duplicate=True),
-    Output('historique-output', 'children', allow_duplicate=True),
     Input('btn-confirm-setup', 'n_clicks'),
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def confirm_setup_and_start_match(n_clicks, current_state):
+def confirm_setup_and_start_match(n_clicks, match_ref):
     if n_clicks is None or n_clicks == 0:
-        return dash.no_update, dash.no_update
+        return dash.no_update
     
-    new_state = copy.deepcopy(current_state)
-    temp_formation = new_state.get('temp_setup_formation_veec', {})
+    current_state = load_match_state(match_ref)
+    temp_formation = current_state.get('temp_setup_formation_veec', {})
     
     if len(temp_formation) != 6:
         # Ceci ne devrait pas arriver si le bouton est désactivé
-        return dash.no_update, dash.no_update 
-    
-    # 1. Mettre à jour la formation_actuelle
-    new_state['formation_actuelle'] = temp_formation
-    
-    # 2. Définir le banc (tous les autres joueurs non titulaires)
-    ROSTER_VEEC = new_state.get('JOUERS_VEEC', {})
-    assigned_nums = [p['numero'] for p in temp_formation.values()]
+        return dash.no_update
     
-    new_banc = {}
-    for num, data in ROSTER_VEEC.items():
-        # Inclure tous les joueurs non-titulaires (y compris les libéros) au banc
-        if num not in assigned_nums:
-            new_banc[num] = data
-            
-    new_state['joueurs_banc'] = new_banc
-
-    # 3. Finaliser le setup et démarrer
-    new_state['match_setup_completed'] = True
-    new_state['temp_setup_formation_veec'] = {}
-    new_state['temp_setup_selected_player_num'] = None
-    
-    # 4. Historique (Ajout de la ligne de démarrage)
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    log_entry = {
-        'timestamp': timestamp, 'set': 1, 'score': '0-0',
-        'position': 'SETUP', 'joueur_nom': 'MATCH', 'action_code': 'START', 'resultat': 'Formation Confirmée'
-    }
-    new_state['historique_stats'].insert(0, log_entry)
-    historique_table = create_historique_table(new_state['historique_stats']) # Assurez-vous d'avoir cette fonction
+    # 1. Définir le banc (tous les autres joueurs non titulaires)
+    assigned_nums = set(temp_formation.values())
+    # Inclure tous les joueurs non-titulaires (y compris les libéros) au banc
+    new_banc = [num for num in EFFECTIFS.du_match(current_state).numeros if num not in assigned_nums]
+
+    # 2. Finaliser le setup et démarrer (l'événement SETUP ouvre aussi l'historique)
+    new_ref = dispatch_match_event(match_ref, engine.SETUP, {'formation': temp_formation, 'banc': new_banc},
+                                   temp_setup_formation_veec={}, temp_setup_selected_player_num=None)
 
-    return new_state, historique_table
+    return new_ref
 
 # 1. Gérer les points et les rotations
 @app.callback(
     Output('match-state', 'data', allow_duplicate=True),
     Output('joueur-selectionne', 'data', allow_duplicate=True),
+    Output('point-refuse', 'data'),
     Input('btn-point-veec', 'n_clicks'),
     Input('btn-point-adverse', 'n_clicks'),
     State('match-state', 'data'),
+    State('mode-hors-ligne', 'value'),
     prevent_initial_call=True,
 )
-def update_score_and_rotation(n_veec, n_adverse, current_state):
-    new_state = copy.deepcopy(current_state)
-
-    # 🚨 CLAUSE DE GARDE : Bloquer si le setup n'est pas terminé
-    if not current_state.get('match_setup_completed'):
-        # On assume que le retour d'Output('joueur-selectionne', 'data') peut être None ici
-        return dash.no_update, None
-
-    new_state = clean_formations(new_state)
+def update_score_and_rotation(n_veec, n_adverse, match_ref, mode_hors_ligne):
+    # Mode hors ligne : le point est mis en file dans le navigateur (callback 1.1), puis synchronisé
+    if mode_hors_ligne:
+        return dash.no_update, dash.no_update, dash.no_update
 
-    # 🚨 NOUVEAU : Bloquer le jeu si le match est terminé
-    if new_state.get('match_ended'):
-        return new_state, None
-    
     ctx = dash.callback_context
     if not ctx.triggered:
-        return new_state, None
+        return dash.no_update, None, dash.no_update
 
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     gagnant = None
@@ -1038,141 +1165,185 @@ def update_score_and_rotation(n_veec, n_adverse, current_state):
         gagnant = 'VEEC'
     elif button_id == 'btn-point-adverse':
         gagnant = 'ADVERSAIRE'
-        
-    if gagnant:
-        service_avant = new_state['service_actuel']
-        
-        if gagnant == 'VEEC':
-            new_state['score_veec'] += 1
-            if service_avant == 'ADVERSAIRE':
-                
-                # Rotation VEEC (point gagné en réception)
-                new_state['service_actuel'] = 'VEEC'
-                new_state['formation_actuelle'] = appliquer_rotation_veec(new_state['formation_actuelle'])
-                new_state['rotation_count'] += 1 
-                
-                # ----------------------------------------------------
-                # LOGIQUE DE SORTIE FORCÉE DU LIBERO EN P4
-                # ----------------------------------------------------
-                liberos_status = new_state['liberos_veec']
-                libero_num_to_enter = liberos_status['actif_numero'] # <--- Utilisez cette clé ! 
-                
-                if liberos_status['is_on_court']:
-                    
-                    player_in_p4 = new_state['formation_actuelle'][4]
-                    libero_actif_num = liberos_status['actif_numero']
-                    libero_reserve_num = liberos_status['reserve_numero']
-                    
-                    is_libero_in_p4 = player_in_p4['numero'] == libero_actif_num or player_in_p4['numero'] == libero_reserve_num
-                    
-                    if is_libero_in_p4:
-                        
-                        # --- Libero en P4 : Sortie Forcée ---
-                        
-                        pos_sortie = 4
-                        starter_num = liberos_status['starter_numero_replaced']
-                        joueur_libero = player_in_p4 
-                        joueur_titulaire = new_state['joueurs_banc'].get(starter_num)
-                        
-                        if joueur_titulaire:
-                            
-                            # 1. Mettre le Libero sur le banc 
-                            new_state['joueurs_banc'][joueur_libero['numero']] = joueur_libero
-                            
-                            # 2. Mettre le Titulaire sur le terrain en P4
-                            new_state['formation_actuelle'][pos_sortie] = joueur_titulaire
-                            
-                            # 3. Retirer le Titulaire du banc
-                            del new_state['joueurs_banc'][starter_num]
-                            
-                            # 4. Mettre à jour le statut Libero
-                            liberos_status['is_on_court'] = False
-                            liberos_status['starter_numero_replaced'] = None
-                            liberos_status['current_pos_on_court'] = None 
-                            
-                            # 5. Enregistrement dans l'historique
-                            log_entry = {
-                                'timestamp': time.time(), 
-                                'action_code': 'LIBERO_AUTO_OUT', 
-                                'details': f"L{joueur_libero['numero']} OUT, N°{starter_num} IN P{pos_sortie}"
-                            }
-                            new_state['historique_stats'].insert(0, log_entry)
-                        
-                    # ----------------------------------------------------
-                    # GESTION DE LA NOUVELLE POSITION DU LIBERO (s'il est resté)
-                    # ----------------------------------------------------
-                    
-                    # Si le Libero est toujours sur le terrain après la rotation (il était en P1 ou P6)
-                    if liberos_status['is_on_court']:
-                        
-                        # Le joueur en P6 (nouvelle position) était en P1 (ancienne position arrière)
-                        if new_state['formation_actuelle'][6]['numero'] == libero_actif_num or new_state['formation_actuelle'][6]['numero'] == libero_reserve_num:
-                            liberos_status['current_pos_on_court'] = 6
-                        # Le joueur en P5 (nouvelle position) était en P6.
-                        elif new_state['formation_actuelle'][5]['numero'] == libero_actif_num or new_state['formation_actuelle'][5]['numero'] == libero_reserve_num:
-                            liberos_status['current_pos_on_court'] = 5
-                    
-                new_state['liberos_veec'] = liberos_status # Mettre à jour l'état final Libero
-            
-        elif gagnant == 'ADVERSAIRE':
-            new_state['score_adverse'] += 1
-            if service_avant == 'VEEC':
-                new_state['service_actuel'] = 'ADVERSAIRE'
-                new_state['formation_adverse_actuelle'] = appliquer_rotation_adverse(new_state['formation_adverse_actuelle'])
-                new_state['rotation_count'] += 1 
-                
-    # ----------------------------------------------------
-    # NOUVEAU BLOC CENTRALISÉ DE VÉRIFICATION DE FIN DE SET / FIN DE MATCH
-    # ----------------------------------------------------
-    
-    set_ended = False
-    match_winner = None
-    
-    # Déterminer le seuil de points (25 points pour sets 1-4, 15 points pour set 5)
-    seuil_points = 15 if new_state['current_set'] == 5 else 25
-    
-    score_veec = new_state['score_veec']
-    score_adverse = new_state['score_adverse']
 
-    # Vérification de la fin du set (score >= seuil ET écart >= 2)
-    if score_veec >= seuil_points and (score_veec - score_adverse) >= 2:
-        match_winner = 'VEEC'
-        set_ended = True
-    elif score_adverse >= seuil_points and (score_adverse - score_veec) >= 2:
-        match_winner = 'ADVERSAIRE'
-        set_ended = True
+    if not gagnant:
+        return dash.no_update, None, dash.no_update
 
-    if set_ended:
-        # Mise à jour des sets gagnés
-        if match_winner == 'VEEC':
-            new_state['sets_veec'] += 1
-        else:
-            new_state['sets_adverse'] += 1
-        
-        # 🚨 VÉRIFICATION DE LA FIN DU MATCH (3 sets gagnants)
-        if new_state['sets_veec'] == 3 or new_state['sets_adverse'] == 3:
-            new_state['match_ended'] = True
-            new_state['match_winner'] = match_winner
-            # Ajoutez ici une logique pour le minuteur (Ex: new_state['timer_type'] = 'MATCH_ENDED')
-            
-        else:
-            # Préparation pour le prochain set
-            new_state['score_veec'], new_state['score_adverse'] = 0, 0
-            new_state['current_set'] += 1 
-            
-            # Réinitialisation des temps-morts et substitutions
-            new_state['timeouts_veec'], new_state['timeouts_adverse'] = 0, 0
-            new_state['sub_veec'], new_state['sub_adverse'] = 0, 0
-            
-            # Gestion de la minuterie de pause
-            # Assurez-vous que LONG_BREAK_DURATION_SECONDS et SHORT_BREAK_DURATION_SECONDS sont accessibles
-            duration = new_state.get('LONG_BREAK_DURATION_SECONDS', 300) if new_state['current_set'] == 5 else new_state.get('SHORT_BREAK_DURATION_SECONDS', 180) 
-            
-            # Note: Vous devez avoir 'import time' en tête de votre fichier
-            new_state['timer_end_time'] = time.time() + duration
-            new_state['timer_type'] = 'SET_BREAK'
-            
-    return new_state, None # <-- Votre retour de fonction
+    # 🚨 CLAUSES DE GARDE : setup non terminé ou match terminé (mêmes règles que la synchronisation hors ligne)
+    event_data, message = verifier_point(load_match_state(match_ref), gagnant)
+    if event_data is None:
+        # Le navigateur annule l'affichage anticipé du point (callback 1.3)
+        return dash.no_update, None, {'message': message, 'horodatage': time.time()}
+
+    # Le réducteur applique score, service et rotation ; le moteur enchaîne ensuite
+    # les événements imposés par le règlement (sortie forcée du Libero en P4,
+    # fin de set avec minuterie de pause, fin de match).
+    return dispatch_match_event(match_ref, engine.POINT, event_data), None, dash.no_update
+
+
+# 1.1 Mode hors ligne : file des points dans le navigateur (accusés de réception retirés de la file)
+app.clientside_callback(
+    """
+    function(n_veec, n_adverse, etat, file, mode, match_ref) {
+        var no_update = window.dash_clientside.no_update;
+        var declencheur = (window.dash_clientside.callback_context.triggered[0] || {}).prop_id || '';
+        file = file || {'client': Date.now().toString(36) + Math.random().toString(36).slice(2),
+                        'prochain_seq': 1, 'actions': []};
+
+        // Accusé de réception du serveur : retire les actions déjà reçues
+        if (declencheur.indexOf('etat-hors-ligne.') === 0) {
+            if (!etat) { return no_update; }
+            var restantes = file.actions.filter(function(a) {
+                return a.match_id !== etat.match_id || a.seq > etat.dernier_seq;
+            });
+            return restantes.length === file.actions.length ? no_update : Object.assign({}, file, {'actions': restantes});
+        }
+
+        if (!mode || !mode.length || !match_ref) { return no_update; }
+        var action = {'match_id': match_ref.match_id, 'seq': file.prochain_seq,
+                      'gagnant': declencheur.indexOf('btn-point-veec.') === 0 ? 'VEEC' : 'ADVERSAIRE',
+                      'horodatage': Date.now() / 1000};
+        return Object.assign({}, file, {'prochain_seq': file.prochain_seq + 1, 'actions': file.actions.concat([action])});
+    }
+    """,
+    Output('file-hors-ligne', 'data'),
+    Input('btn-point-veec', 'n_clicks'),
+    Input('btn-point-adverse', 'n_clicks'),
+    Input('etat-hors-ligne', 'data'),
+    State('file-hors-ligne', 'data'),
+    State('mode-hors-ligne', 'value'),
+    State('match-state', 'data'),
+    prevent_initial_call=True,
+)
+
+# 1.1 bis Synchronisation : toute la file en une requête dès que le serveur répond (essai à chaque tick)
+app.clientside_callback(
+    """
+    function(n, file, etat, match_ref, mode) {
+        var no_update = window.dash_clientside.no_update;
+        if (!mode || !mode.length || !match_ref || window.veecSynchroEnCours) { return [no_update, no_update]; }
+
+        var actions = (file && file.actions) || [];
+        var matchId = actions.length ? actions[0].match_id : match_ref.match_id;
+        var lot = actions.filter(function(a) { return a.match_id === matchId; });
+        // File vide et copie locale à jour : aucune requête
+        if (!lot.length && etat && etat.match_id === matchId && etat.version === match_ref.version) {
+            return [no_update, no_update];
+        }
+
+        var url = '/sync/' + encodeURIComponent(matchId);
+        var abandon = new AbortController();
+        var delai = setTimeout(function() { abandon.abort(); }, 10000);
+        var requete = lot.length
+            ? fetch(url, {'method': 'POST', 'headers': {'Content-Type': 'application/json'}, 'signal': abandon.signal,
+                          'body': JSON.stringify({'client': file.client, 'envoi': Date.now() / 1000, 'actions': lot})})
+            : fetch(url + (file ? '?client=' + encodeURIComponent(file.client) : ''), {'signal': abandon.signal});
+        window.veecSynchroEnCours = true;
+        return requete
+            .then(function(r) { if (!r.ok) { throw new Error('HTTP ' + r.status); } return r.json(); })
+            .then(function(reponse) {
+                var ref = reponse.ref;
+                var refus = (reponse.resultats || []).filter(function(r) { return r.statut === 'refusee'; });
+                var nouvel_etat = Object.assign({}, reponse.etat, {'refus': refus.map(function(r) { return r.message; })});
+                var nouvelle_ref = ref && ref.match_id === match_ref.match_id && ref.version !== match_ref.version;
+                return [nouvelle_ref ? ref : no_update, nouvel_etat];
+            })
+            .catch(function() { return [no_update, no_update]; }) // Toujours hors ligne : la file est conservée
+            .finally(function() { clearTimeout(delai); window.veecSynchroEnCours = false; });
+    }
+    """,
+    Output('match-state', 'data', allow_duplicate=True),
+    Output('etat-hors-ligne', 'data'),
+    Input('interval-component', 'n_intervals'),
+    Input('file-hors-ligne', 'data'),
+    State('etat-hors-ligne', 'data'),
+    State('match-state', 'data'),
+    State('mode-hors-ligne', 'value'),
+    prevent_initial_call=True,
+)
+
+# 1.1 ter Copie locale : dernier état du serveur + points en attente (mêmes règles que le moteur pour score, service, rotation, sets)
+app.clientside_callback(
+    """
+    function(file, etat, mode) {
+        if (!mode || !mode.length) { return ''; }
+        var actions = (file && file.actions) || [];
+        if (!etat) { return 'Hors ligne : ' + actions.length + ' point(s) en attente (état du serveur inconnu).'; }
+
+        var attente = actions.filter(function(a) { return a.match_id === etat.match_id && a.seq > etat.dernier_seq; });
+        var e = JSON.parse(JSON.stringify(etat));
+        var ignores = 0;
+        attente.forEach(function(a) {
+            if (!e.commence || e.termine) { ignores += 1; return; }
+            if (a.gagnant === 'VEEC') {
+                e.score_veec += 1;
+                if (e.service === 'ADVERSAIRE') {
+                    e.service = 'VEEC';
+                    e.rotation = e.rotation.slice(1).concat(e.rotation.slice(0, 1)); // P2 passe en P1
+                }
+            } else {
+                e.score_adverse += 1;
+                e.service = 'ADVERSAIRE';
+            }
+            var seuil = e.set === 5 ? 15 : 25, ecart = e.score_veec - e.score_adverse;
+            if (Math.max(e.score_veec, e.score_adverse) >= seuil && Math.abs(ecart) >= 2) {
+                if (ecart > 0) { e.sets_veec += 1; } else { e.sets_adverse += 1; }
+                if (e.sets_veec >= 3 || e.sets_adverse >= 3) { // SETS_GAGNANTS
+                    e.termine = true;
+                    e.vainqueur = ecart > 0 ? 'VEEC' : 'ADVERSAIRE';
+                } else {
+                    e.set += 1;
+                    e.score_veec = 0;
+                    e.score_adverse = 0;
+                }
+            }
+        });
+
+        var texte = attente.length
+            ? 'Hors ligne : ' + attente.length + ' point(s) en attente. Score local : '
+            : 'Synchronisé : ';
+        texte += e.score_veec + ' - ' + e.score_adverse + ' (set ' + e.set + ', sets ' + e.sets_veec + ' - ' + e.sets_adverse
+               + '), service ' + e.service + ', rotation ' + e.rotation.join(' - ') + '.';
+        if (e.termine) { texte += ' Match terminé : victoire ' + e.vainqueur + '.'; }
+        if (ignores) { texte += ' ' + ignores + ' point(s) seront refusés.'; }
+        if (etat.refus && etat.refus.length) { texte += ' Refusés par le serveur : ' + etat.refus.join(' ; '); }
+        return texte;
+    }
+    """,
+    Output('statut-hors-ligne', 'children'),
+    Input('file-hors-ligne', 'data'),
+    Input('etat-hors-ligne', 'data'),
+    Input('mode-hors-ligne', 'value'),
+)
+
+# 1.2 Annuler / Rétablir la dernière action
+@app.callback(
+    Output('match-state', 'data', allow_duplicate=True),
+    Output('feedback-undo', 'children'),
+    Input('btn-undo', 'n_clicks'),
+    Input('btn-redo', 'n_clicks'),
+    State('match-state', 'data'),
+    prevent_initial_call=True,
+)
+def handle_undo_redo(n_undo, n_redo, match_ref):
+    ctx = dash.callback_context
+    if not ctx.triggered or not ctx.triggered[0]['value']:
+        return dash.no_update, dash.no_update
+
+    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    # L'action entière est annulée/rétablie, y compris ses conséquences (sortie forcée du Libero, fin de set...)
+    if button_id == 'btn-undo':
+        new_ref, events = MATCH_STORE.undo(match_ref['match_id'])
+        verbe = "annulée"
+    else:
+        new_ref, events = MATCH_STORE.redo(match_ref['match_id'])
+        verbe = "rétablie"
+
+    if new_ref is None:
+        return dash.no_update, f"Aucune action à {'annuler' if button_id == 'btn-undo' else 'rétablir'}."
+
+    feedback = f"Action {verbe} : {', '.join(e.type for e in events)}"
+    return new_ref, feedback
 
 
 def create_libero_sub_modal(current_state):
@@ -1182,13 +1353,7 @@ def create_libero_sub_modal(current_state):
     is_on_court = libero_status['is_on_court']
     # CORRECTION : Utiliser le numéro du Libero ACTIF (qui peut être 8 ou 9)
     libero_num_actif = libero_status.get('actif_numero') 
-    
-    libero_data = current_state['joueurs_banc'].get(libero_num_actif)    
-
-    # Si le Libero n'est pas sur le banc, il doit être sur le terrain (gestion défensive)
-    if not libero_data:
-        # Tenter de récupérer les données du Libero depuis la formation si la substitution est en cours
-        libero_data = next((p for p in current_state['formation_actuelle'].values() if p.get('numero') == libero_num_actif), None)
+    noms = EFFECTIFS.du_match(current_state).noms
         
     modal_title = f"Échange Libero (N°{libero_num_actif})"
     
@@ -1198,10 +1363,10 @@ def create_libero_sub_modal(current_state):
         # Lister les joueurs qui peuvent être remplacés (P1, P5, P6)
         positions_remplacables = []
         for pos in LIBERO_POSITIONS_AUTORISEES:
-            player = current_state['formation_actuelle'].get(pos)
-            if player:
+            numero = current_state['formation_actuelle'].get(pos)
+            if numero is not None:
                 positions_remplacables.append(
-                    html.Button(f"Remplacer P{pos} - N°{player['numero']} ({player['nom']})", 
+                    html.Button(f"Remplacer P{pos} - N°{numero} ({noms.get(numero, 'N/A')})", 
                                 id={'type': 'confirm-libero-in', 'pos': str(pos)}, n_clicks=0,
                                 style={'margin': '5px', 'padding': '10px', 'backgroundColor': '#d4edda', 'border': '1px solid #155724', 'cursor': 'pointer'})
                 )
@@ -1215,14 +1380,13 @@ def create_libero_sub_modal(current_state):
     else:
         # Le Libero est sur le terrain. Il doit sortir.
         starter_numero = libero_status['starter_numero_replaced']
-        starter_data = current_state['joueurs_banc'].get(starter_numero)
         current_pos = libero_status['current_pos_on_court']
         
-        if starter_data:
+        if starter_numero in current_state['joueurs_banc']:
             content = [
                 html.H4(f"Sortie du Libero (N°{libero_num_actif})", style={'color': '#dc3545'}),
                 html.P(f"Le Libero doit être remplacé par le joueur titulaire qu'il a remplacé :"),
-                html.P(f"Joueur entrant : N°{starter_data['numero']} ({starter_data['nom']}) à la position P{current_pos}"),
+                html.P(f"Joueur entrant : N°{starter_numero} ({noms.get(starter_numero, 'N/A')}) à la position P{current_pos}"),
                 html.Button("Confirmer la sortie", id='btn-confirm-libero-out', n_clicks=0, 
                             style={'padding': '10px 20px', 'backgroundColor': '#dc3545', 'color': 'white', 'border': 'none', 'borderRadius': '5px', 'marginTop': '15px', 'cursor': 'pointer'})
             ]
@@ -1241,6 +1405,108 @@ def create_libero_sub_modal(current_state):
     )
 
 
+# 1.3 Affichage anticipé du point (sans attendre le serveur) : score, ballon de service et rotation.
+# Le serveur confirme ou corrige ensuite (callback 3) ; les empreintes des propriétés modifiées sont
+# effacées pour que le patch du serveur les renvoie même si son état ne diffère pas de l'ancien.
+app.clientside_callback(
+    """
+    function(n_veec, n_adverse, score_veec, score_adverse, figure, signature, attente, match_ref, mode) {
+        var no_update = window.dash_clientside.no_update;
+        var rien = [no_update, no_update, no_update, no_update, no_update];
+        if ((mode && mode.length) || !match_ref || !figure || !figure.data || figure.data.length < 3) { return rien; }
+
+        var declencheur = (window.dash_clientside.callback_context.triggered[0] || {}).prop_id || '';
+        var gagnant = declencheur.indexOf('btn-point-veec.') === 0 ? 'VEEC' : 'ADVERSAIRE';
+        var data = JSON.parse(JSON.stringify(figure.data)); // Traces : 0 VEEC, 1 adverse, 2 ballon (COURT_TRACE_INDEX)
+        var veec = data[0], adverse = data[1], ballon = data[2];
+        if (!ballon.x || ballon.x[0] === null || ballon.x[0] === undefined) { return rien; } // Service non choisi
+
+        // Équipe au service : le ballon est près du P1 (premier point de chaque trace)
+        var service = Math.abs(ballon.x[0] - veec.x[0]) <= Math.abs(ballon.x[0] - adverse.x[0]) ? 'VEEC' : 'ADVERSAIRE';
+        var tourner = function(liste) { return liste.slice(1).concat(liste.slice(0, 1)); }; // P2 passe en P1
+        var effacees = [];
+        if (gagnant !== service) {
+            var equipe = gagnant === 'VEEC' ? veec : adverse, cle = gagnant === 'VEEC' ? 'veec' : 'adverse';
+            var depart = gagnant === 'VEEC' ? adverse : veec;
+            equipe.text = tourner(equipe.text);
+            equipe.marker.color = tourner(equipe.marker.color);
+            equipe.marker.line.width = tourner(equipe.marker.line.width);
+            effacees.push(cle + '|text', cle + '|marker.color', cle + '|marker.line.width');
+            if (equipe.hovertext) {
+                equipe.hovertext = tourner(equipe.hovertext).map(function(t, i) { return t.replace(/^P[0-9]+/, 'P' + (i + 1)); });
+                effacees.push(cle + '|hovertext');
+            }
+            // Même décalage par rapport au P1 de l'équipe qui prend le service
+            ballon.x = [equipe.x[0] - (ballon.x[0] - depart.x[0])];
+            ballon.y = [equipe.y[0] - (ballon.y[0] - depart.y[0])];
+            effacees.push('service|x', 'service|y');
+        }
+        var nouvelle_signature = Object.assign({}, signature || {});
+        effacees.forEach(function(cle) { nouvelle_signature[cle] = null; });
+
+        // Affichage à rétablir : celui d'avant le premier point non confirmé
+        var affichage = attente ? attente.affichage
+            : {'scores': [score_veec, score_adverse], 'data': figure.data, 'signature': signature};
+        var nouvelle_attente = {'version': match_ref.version, 'affichage': affichage,
+                                'echeance': Date.now() + 10000}; // Sans confirmation après 10 s : affichage rétabli
+        return [String((parseInt(score_veec, 10) || 0) + (gagnant === 'VEEC' ? 1 : 0)),
+                String((parseInt(score_adverse, 10) || 0) + (gagnant === 'ADVERSAIRE' ? 1 : 0)),
+                Object.assign({}, figure, {'data': data}), nouvelle_signature, nouvelle_attente];
+    }
+    """,
+    Output('score-veec-large', 'children', allow_duplicate=True),
+    Output('score-adverse-large', 'children', allow_duplicate=True),
+    Output('terrain-graph-statique', 'figure', allow_duplicate=True),
+    Output('court-figure-signature', 'data', allow_duplicate=True),
+    Output('point-optimiste', 'data', allow_duplicate=True),
+    Input('btn-point-veec', 'n_clicks'),
+    Input('btn-point-adverse', 'n_clicks'),
+    State('score-veec-large', 'children'),
+    State('score-adverse-large', 'children'),
+    State('terrain-graph-statique', 'figure'),
+    State('court-figure-signature', 'data'),
+    State('point-optimiste', 'data'),
+    State('match-state', 'data'),
+    State('mode-hors-ligne', 'value'),
+    prevent_initial_call=True,
+)
+
+# 1.4 Confirmation (nouvelle version du match : le callback 3 affiche l'état du serveur)
+# ou annulation (point refusé, ou sans réponse à l'échéance) de l'affichage anticipé
+app.clientside_callback(
+    """
+    function(match_ref, refus, n, attente, figure) {
+        var no_update = window.dash_clientside.no_update;
+        var rien = [no_update, no_update, no_update, no_update, no_update];
+        if (!attente) { return rien; }
+
+        var declencheur = (window.dash_clientside.callback_context.triggered[0] || {}).prop_id || '';
+        if (declencheur.indexOf('match-state.') === 0) {
+            if (!match_ref || match_ref.version === attente.version) { return rien; }
+            return [no_update, no_update, no_update, no_update, null];
+        }
+        if (declencheur.indexOf('point-refuse.') !== 0 && Date.now() < attente.echeance) { return rien; }
+
+        var affichage = attente.affichage;
+        return [affichage.scores[0], affichage.scores[1],
+                figure ? Object.assign({}, figure, {'data': affichage.data}) : no_update,
+                affichage.signature, null];
+    }
+    """,
+    Output('score-veec-large', 'children', allow_duplicate=True),
+    Output('score-adverse-large', 'children', allow_duplicate=True),
+    Output('terrain-graph-statique', 'figure', allow_duplicate=True),
+    Output('court-figure-signature', 'data', allow_duplicate=True),
+    Output('point-optimiste', 'data', allow_duplicate=True),
+    Input('match-state', 'data'),
+    Input('point-refuse', 'data'),
+    Input('interval-component', 'n_intervals'),
+    State('point-optimiste', 'data'),
+    State('terrain-graph-statique', 'figure'),
+    prevent_initial_call=True,
+)
+
+
 # 2. Sélection du joueur (pour la modal)
 @app.callback(
     Output('joueur-selectionne', 'data', allow_duplicate=True),
@@ -1248,8 +1514,8 @@ def create_libero_sub_modal(current_state):
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_player_click_dash(clickData, current_state):
-    current_state = clean_formations(current_state)
+def handle_player_click_dash(clickData, match_ref):
+    current_state = load_match_state(match_ref)
     
     if current_state.get('timer_end_time', 0) > time.time() or current_state.get('sub_en_cours_team'):
         return dash.no_update
@@ -1259,9 +1525,9 @@ def handle_player_click_dash(clickData, current_state):
         if point.get('curveNumber') == 0 and 'customdata' in point:
             try:
                 pos = int(point['customdata']) 
-                joueur_data = current_state['formation_actuelle'].get(pos)
-                if joueur_data:
-                    return {'pos': pos, 'data': joueur_data, 'equipe': 'VEEC'}
+                numero = current_state['formation_actuelle'].get(pos)
+                if numero is not None:
+                    return {'pos': pos, 'numero': numero, 'equipe': 'VEEC'}
             except (ValueError, TypeError):
                 pass 
     return None 
@@ -1280,15 +1546,32 @@ def handle_player_click_dash(clickData, current_state):
     Output('btn-to-veec-center', 'children'), 
     Output('btn-sub-adverse-center', 'children'),
     Output('btn-to-adverse-center', 'children'),
+    Output('court-figure-signature', 'data'),
+    Output('nom-equipe-adverse', 'children'),
     Input('match-state', 'data'),
+    State('court-figure-signature', 'data'),
 )
-def update_ui_scores(current_state):
-    current_state = clean_formations(current_state)
-    
-    fig, config = create_court_figure(current_state['formation_actuelle'], 
-                                     current_state['formation_adverse_actuelle'], 
-                                     current_state['service_actuel'],
-                                     current_state['liberos_veec']) # <-- Clé changée à 'liberos_veec'
+def update_ui_scores(match_ref, court_signature):
+    current_state = load_match_state(match_ref)
+    adversaire = EFFECTIFS.adverse_du_match(current_state)
+    
+    court_entry = get_court_figure(current_state['formation_actuelle'],
+                                   current_state['formation_adverse_actuelle'],
+                                   current_state['service_actuel'],
+                                   current_state['liberos_veec'],
+                                   EFFECTIFS.du_match(current_state).noms,
+                                   adversaire.libero)
+
+    # Figure complète au premier rendu (ou après rechargement de la page),
+    # ensuite uniquement les propriétés de traces modifiées (dash.Patch).
+    if court_signature is None:
+        fig, config = court_entry['figure'], COURT_CONFIG
+        court_signature = court_entry['signature']
+    else:
+        patch = create_court_figure_patch(court_entry, court_signature)
+        fig = patch if patch is not None else dash.no_update
+        config = dash.no_update
+        court_signature = court_entry['signature'] if patch is not None else dash.no_update
     
     score_veec_large = str(current_state['score_veec'])
     score_adverse_large = str(current_state['score_adverse'])
@@ -1303,127 +1586,204 @@ def update_ui_scores(current_state):
     
     return (fig, config, score_veec_large, score_adverse_large, sets_veec, sets_adverse, 
             set_number,
-            sub_veec_count, to_veec_count, sub_adverse_count, to_adverse_count)
+            sub_veec_count, to_veec_count, sub_adverse_count, to_adverse_count, court_signature,
+            adversaire.nom.upper())
 
 
-# 4. Affichage du Timer (Mise à jour de l'affichage UNIQUEMENT)
+# 3.1 Historique paginé (pagination, tri et filtre côté serveur)
 @app.callback(
-    Output('timer-progress-bar', 'children'),
-    Input('interval-component', 'n_intervals'),
+    Output('datatable-historique', 'data'),
+    Output('datatable-historique', 'page_count'),
+    Output('historique-vide', 'style'),
+    Input('match-state', 'data'),
+    Input('datatable-historique', 'page_current'),
+    Input('datatable-historique', 'page_size'),
+    Input('datatable-historique', 'sort_by'),
+    Input('datatable-historique', 'filter_query'),
+)
+def update_historique_page(match_ref, page_current, page_size, sort_by, filter_query):
+    page_size = page_size or HISTORIQUE_PAGE_SIZE
+    rows, total = MATCH_STORE.historique_page(match_ref['match_id'], page_current or 0, page_size, sort_by, filter_query)
+    vide_style = {'padding': '10px', 'color': '#666', 'display': 'none' if total or filter_query else 'block'}
+    return rows, max(1, math.ceil(total / page_size)), vide_style
+
+
+# 3.2 Statistiques par joueur (lecture des compteurs, aucun recalcul)
+@app.callback(
+    Output('datatable-stats-joueurs', 'data'),
+    Output('stats-set-choisi', 'options'),
+    Input('match-state', 'data'),
+    Input('stats-set-choisi', 'value'),
+)
+def update_stats_joueurs(match_ref, set_choisi):
+    lignes, sets = MATCH_STORE.stats_joueurs(match_ref['match_id'], set_choisi or None)
+    options = [{'label': 'Match', 'value': 0}] + [{'label': f"Set {s}", 'value': s} for s in sets]
+    return lignes, options
+
+
+# 3.3 Export du match courant (actions, agrégats par joueur, résumé des sets) en archive ZIP de CSV
+@app.callback(
+    Output('download-export', 'data'),
+    Input('btn-export-match', 'n_clicks'),
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def update_timer_display_only(n, current_state):
-    
-    timer_end_time = current_state.get('timer_end_time', 0)
+def handle_export_match(n_clicks, match_ref):
+    if not n_clicks:
+        return dash.no_update
+    match_id = match_ref['match_id']
+    with tempfile.TemporaryDirectory() as tmp:
+        export.export_matches([(match_id, MATCH_STORE.events(match_id))], tmp, formats=('csv',))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for nom in sorted(os.listdir(tmp)):
+                archive.write(os.path.join(tmp, nom), nom)
+    return dcc.send_bytes(buffer.getvalue(), f"match_{datetime.now().strftime('%Y%m%d_%H%M')}.zip")
+
+
+# 4. Affichage du Timer (entièrement côté navigateur)
+# Le serveur ne publie que les bornes du minuteur dans 'timer-state' (voir
+# update_timer_state) ; le décompte et la barre de progression sont calculés
+# par le navigateur à chaque tick de 'interval-component', sans requête.
+
+def create_timer_payload(current_state):
+    """Données minimales nécessaires au rendu du minuteur côté client."""
     timer_type = current_state.get('timer_type')
-    
-    # Cas 1: Minuteur inactif (Affichage du temps de jeu écoulé)
-    if timer_end_time == 0:
-        elapsed_seconds = int(time.time() - current_state.get('start_time', time.time()))
-        minutes = elapsed_seconds // 60
-        seconds = elapsed_seconds % 60
-        time_str = f"Temps de jeu : {minutes:02d}:{seconds:02d}"
-        return html.Div(time_str, style={'textAlign': 'right', 'fontSize': '1.1em', 'fontWeight': 'bold', 'color': '#333'})
-
-    remaining_seconds = int(timer_end_time - time.time())
-    
-    # Cas 2: Minuteur expiré (Affichage du message de fin)
-    if remaining_seconds <= 0:
-        time_str = "REPRISE DU JEU !"
-        return html.Div(time_str, style={'textAlign': 'center', 'color': 'red', 'fontWeight': 'bold', 'fontSize': '1.1em'})
-        
-    # Cas 3: Minuteur actif (Affichage de la barre de progression)
-    minutes = remaining_seconds // 60
-    seconds = remaining_seconds % 60
-    
-    title = ""
-    duration = 1 # Durée par défaut, sera écrasée
-    
     if timer_type == 'TIMEOUT':
-        title = "TEMPS MORT"
-        color = '#ffc107' 
-        # Assurez-vous que TIMEOUT_DURATION_SECONDS est défini quelque part dans votre script
-        duration = TIMEOUT_DURATION_SECONDS 
-    elif timer_type == 'SET_BREAK':
-        title = "PAUSE SET"
-        color = '#333'
-        # Assurez-vous que LONG/SHORT_BREAK_DURATION_SECONDS sont définis
+        duration = TIMEOUT_DURATION_SECONDS
+    else:
         duration = LONG_BREAK_DURATION_SECONDS if current_state['current_set'] == 5 else SHORT_BREAK_DURATION_SECONDS
-        
-    time_str = f"{title}: {minutes:02d}:{seconds:02d}"
-    
-    elapsed_for_bar = duration - remaining_seconds
-    progress_percent = max(0, min(100, (elapsed_for_bar / duration) * 100))
-    
-    progress_bar = html.Div([
-        html.Div(style={
-            'height': '10px', 'backgroundColor': '#ddd', 'borderRadius': '5px', 'width': '100%'
-        }),
-        html.Div(style={
-            'height': '10px', 'backgroundColor': color, 'borderRadius': '5px', 'width': f'{progress_percent}%',
-            'marginTop': '-10px', 'transition': 'width 1s linear'
-        })
-    ], style={'width': '100%'})
-
-    return html.Div([
-        html.Div(time_str, style={'textAlign': 'center', 'fontWeight': 'bold', 'color': color, 'marginBottom': '5px'}),
-        progress_bar 
-    ], style={'width': '100%', 'display': 'flex', 'flexDirection': 'column', 'alignItems': 'center'})
-
-# 4.2 Gestion de l'Expiration du Minuteur (Met à jour le match-state)
+    return {
+        'start_time': current_state.get('start_time', 0),
+        'timer_end_time': current_state.get('timer_end_time', 0),
+        'timer_type': timer_type,
+        'duration': duration,
+        'server_now': time.time(),
+    }
+
+
 @app.callback(
-    Output('match-state', 'data', allow_duplicate=True),
+    Output('timer-state', 'data'),
+    Input('match-state', 'data'),
+)
+def update_timer_state(match_ref):
+    return create_timer_payload(load_match_state(match_ref))
+
+
+# 4.1 Décalage d'horloge navigateur / serveur (calculé à la réception de 'timer-state')
+app.clientside_callback(
+    """
+    function(timer) {
+        if (!timer) { return 0; }
+        return timer.server_now - Date.now() / 1000;
+    }
+    """,
+    Output('timer-clock-offset', 'data'),
+    Input('timer-state', 'data'),
+)
+
+# 4.2 Rendu du minuteur à chaque tick (aucun aller-retour serveur)
+app.clientside_callback(
+    """
+    function(n, timer, offset, notified) {
+        var no_update = window.dash_clientside.no_update;
+        var hidden = {'display': 'none'};
+        if (!timer) { return [no_update, no_update, no_update, no_update, no_update]; }
+
+        var now = Date.now() / 1000 + (offset || 0);
+        var pad = function(v) { return (v < 10 ? '0' : '') + v; };
+        var clock = function(s) { return pad(Math.floor(s / 60)) + ':' + pad(s % 60); };
+
+        // Cas 1: Minuteur inactif (Affichage du temps de jeu écoulé)
+        if (!timer.timer_end_time) {
+            var elapsed = Math.max(0, Math.floor(now - timer.start_time));
+            return ['Temps de jeu : ' + clock(elapsed),
+                    {'textAlign': 'right', 'fontSize': '1.1em', 'fontWeight': 'bold', 'color': '#333'},
+                    hidden, hidden, no_update];
+        }
+
+        var remaining = Math.floor(timer.timer_end_time - now);
+
+        // Cas 2: Minuteur expiré : message de fin + notification unique du serveur
+        if (remaining <= 0) {
+            return ['REPRISE DU JEU !',
+                    {'textAlign': 'center', 'color': 'red', 'fontWeight': 'bold', 'fontSize': '1.1em'},
+                    hidden, hidden,
+                    notified === timer.timer_end_time ? no_update : timer.timer_end_time];
+        }
+
+        // Cas 3: Minuteur actif (Affichage de la barre de progression)
+        var title = timer.timer_type === 'TIMEOUT' ? 'TEMPS MORT' : 'PAUSE SET';
+        var color = timer.timer_type === 'TIMEOUT' ? '#ffc107' : '#333';
+        var duration = timer.duration || 1;
+        var progress = Math.max(0, Math.min(100, ((duration - remaining) / duration) * 100));
+        return [title + ': ' + clock(remaining),
+                {'textAlign': 'center', 'fontWeight': 'bold', 'color': color, 'marginBottom': '5px'},
+                {'height': '10px', 'backgroundColor': '#ddd', 'borderRadius': '5px', 'width': '100%'},
+                {'height': '10px', 'backgroundColor': color, 'borderRadius': '5px', 'width': progress + '%',
+                 'marginTop': '-10px', 'transition': 'width 1s linear'},
+                no_update];
+    }
+    """,
+    Output('timer-text', 'children'),
+    Output('timer-text', 'style'),
+    Output('timer-bar-track', 'style'),
+    Output('timer-bar-fill', 'style'),
+    Output('timer-expired', 'data'),
     Input('interval-component', 'n_intervals'),
+    State('timer-state', 'data'),
+    State('timer-clock-offset', 'data'),
+    State('timer-expired', 'data'),
+)
+
+# 4.3 Gestion de l'Expiration du Minuteur (Met à jour le match-state)
+# Déclenché une seule fois par minuteur, lorsque le navigateur constate l'expiration.
+@app.callback(
+    Output('match-state', 'data', allow_duplicate=True),
+    Input('timer-expired', 'data'),
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_timer_expiration(n, current_state):
-    
+def handle_timer_expiration(expired_end_time, match_ref):
+    current_state = load_match_state(match_ref)
+
     # 🚨 CLAUSE DE GARDE : Bloquer si le setup n'est pas terminé
     if not current_state.get('match_setup_completed', False):
         return dash.no_update # C'est le seul Output, donc retour simple
 
     timer_end_time = current_state.get('timer_end_time', 0)
     
-    # N'agit que si un minuteur est en cours
-    if timer_end_time > 0 and time.time() >= timer_end_time:
-        
-        new_state = copy.deepcopy(current_state)
+    # N'agit que si le minuteur signalé est toujours celui en cours (l'horloge serveur fait foi)
+    if timer_end_time > 0 and expired_end_time == timer_end_time and time.time() >= timer_end_time:
+        # Réinitialiser l'état du minuteur (action automatique : pas d'étape d'annulation)
+        return dispatch_match_event(match_ref, engine.TIMER_END, undoable=False)
         
-        # Réinitialiser l'état du minuteur
-        print(f"DEBUG: Minuteur ({new_state.get('timer_type')}) expiré. Réinitialisation de l'état.")
-        new_state['timer_end_time'] = 0
-        new_state['timer_type'] = None
-        
-        # L'état est mis à jour ici
-        return new_state
-        
-    return dash.no_update # Ne rien faire si le minuteur est actif ou inactif
+    return dash.no_update # Ne rien faire si le minuteur est actif ou déjà traité
 
 
 # 5. Gérer l'enregistrement des statistiques et fermeture de la modale
 @app.callback(
     Output('match-state', 'data', allow_duplicate=True),
     Output('joueur-selectionne', 'data', allow_duplicate=True),
-    Output('historique-output', 'children', allow_duplicate=True), 
     Input({'type': 'stat-btn', 'index': dash.dependencies.ALL}, 'n_clicks'),
     Input('btn-close-modal-static', 'n_clicks'),
     State('match-state', 'data'),
     State('joueur-selectionne', 'data'),
     prevent_initial_call=True
 )
-def handle_stat_log_and_close(n_clicks, close_clicks, current_state, joueur_sel):
+def handle_stat_log_and_close(n_clicks, close_clicks, match_ref, joueur_sel):
     ctx = dash.callback_context
     if not ctx.triggered or not ctx.triggered[0]['value']:
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update
     
+    current_state = load_match_state(match_ref)
+
     # 🚨 CLAUSE DE GARDE : Bloquer si le setup n'est pas terminé
     if not current_state.get('match_setup_completed', False):
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update
 
     triggered_id = ctx.triggered[0]['prop_id']
-    new_state = copy.deepcopy(current_state) 
+    new_ref = match_ref
     
     reset_selection = False
     stat_enregistree_avec_succes = False
@@ -1459,20 +1819,15 @@ def handle_stat_log_and_close(n_clicks, close_clicks, current_state, joueur_sel)
             
             # Récupération des données du joueur (potentiellement la source de KeyError)
             if joueur_sel and joueur_sel['pos'] == pos: 
-                joueur_data = new_state['formation_actuelle'][pos]
+                numero = current_state['formation_actuelle'][pos]
                 
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                log_entry = {
-                    'timestamp': timestamp, 'set': new_state['current_set'], 
-                    'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-                    'position': pos, 'joueur_nom': joueur_data['nom'],
+                # Un résultat gagnant (KILL, ACE, GAIN) est un point VEEC : le moteur applique score,
+                # service, rotation, sortie du Libero en P4 et fin de set, comme pour le bouton Point
+                # Le nom est enregistré dans l'événement (historique, statistiques, exports)
+                new_ref = dispatch_match_event(match_ref, engine.STAT, {
+                    'position': pos, 'numero': numero, 'nom': EFFECTIFS.du_match(current_state).nom_de(numero),
                     'action_code': action_code, 'resultat': resultat
-                }
-                new_state['historique_stats'].insert(0, log_entry)
-
-                # Mise à jour du score
-                if resultat in ['KILL', 'ACE', 'GAIN']:
-                    new_state['score_veec'] += 1
+                })
                     
                 stat_enregistree_avec_succes = True # Stat enregistrée
                 
@@ -1487,13 +1842,13 @@ def handle_stat_log_and_close(n_clicks, close_clicks, current_state, joueur_sel)
     # 3. Retour et Fermeture de la Modale
     # ----------------------------------------------------
     
-    historique_table = create_historique_table(new_state['historique_stats'])
-    
     if reset_selection:
+        if not stat_enregistree_avec_succes:
+            return dash.no_update, None
         # En retournant None pour 'joueur-selectionne', on force la fermeture de la modal via le Callback 6.
-        return new_state, None, historique_table
+        return new_ref, None
     
-    return dash.no_update, dash.no_update, dash.no_update
+    return dash.no_update, dash.no_update
 
 
 # 6. Afficher/Calculer la Modal de Stat
@@ -1503,7 +1858,11 @@ def handle_stat_log_and_close(n_clicks, close_clicks, current_state, joueur_sel)
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def display_stat_modal(joueur_selectionne, current_state):
+def display_stat_modal(joueur_selectionne, match_ref):
+    if not joueur_selectionne:
+        return None
+
+    current_state = load_match_state(match_ref)
     if not joueur_selectionne or not current_state.get('service_choisi', False) or current_state.get('timer_end_time', 0) > time.time() or current_state.get('sub_en_cours_team'):
         return None
     
@@ -1548,7 +1907,7 @@ def display_stat_modal(joueur_selectionne, current_state):
     modal_content = html.Div(
         children=[
             html.Div([
-                html.H3(f"Saisie Stat : N°{joueur_sel['data']['numero']} ({joueur_sel['data']['nom']}) - P{joueur_sel['pos']}", style={'textAlign': 'center', 'color': '#333'}),
+                html.H3(f"Saisie Stat : N°{joueur_sel['numero']} ({EFFECTIFS.du_match(current_state).nom_de(joueur_sel['numero'])}) - P{joueur_sel['pos']}", style={'textAlign': 'center', 'color': '#333'}),
                 
                 html.Button("✕ Fermer", id='btn-close-modal-static', n_clicks=0, 
                     style={'position': 'absolute', 'top': '10px', 'right': '10px', 'backgroundColor': 'transparent', 'border': 'none', 'fontSize': '1.2em', 'cursor': 'pointer'})
@@ -1570,44 +1929,36 @@ def display_stat_modal(joueur_selectionne, current_state):
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_timeouts(n_veec, n_adverse, current_state):
+def handle_timeouts(n_veec, n_adverse, match_ref):
     # (Logique inchangée)
     ctx = dash.callback_context
     if not ctx.triggered:
         return dash.no_update, dash.no_update
     
+    current_state = load_match_state(match_ref)
+
     # 🚨 CLAUSE DE GARDE : Bloquer si le setup n'est pas terminé
     if not current_state.get('match_setup_completed', False):
         return dash.no_update, dash.no_update
 
-    new_state = copy.deepcopy(current_state)
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
-    team = None
     if button_id == 'btn-to-veec':
         team = 'VEEC'
-        count = new_state['timeouts_veec']
     elif button_id == 'btn-to-adverse':
         team = 'ADVERSAIRE'
-        count = new_state['timeouts_adverse']
     else:
         return dash.no_update, dash.no_update
-    
-    if new_state.get('timer_end_time', 0) > time.time():
-        return dash.no_update, dash.no_update
 
-    if count >= MAX_TIMEOUTS_PER_SET:
+    # Minuterie en cours ou quota MAX_TIMEOUTS_PER_SET atteint : refusé
+    event_data, _ = verifier_timeout(current_state, team, time.time())
+    if event_data is None:
         return dash.no_update, dash.no_update
 
-    if team == 'VEEC':
-        new_state['timeouts_veec'] += 1
-    else:
-        new_state['timeouts_adverse'] += 1
-
-    new_state['timer_end_time'] = time.time() + TIMEOUT_DURATION_SECONDS
-    new_state['timer_type'] = 'TIMEOUT'
+    # Le réducteur incrémente le compteur et démarre la minuterie (TIMEOUT_DURATION_SECONDS)
+    new_ref = dispatch_match_event(match_ref, engine.TIMEOUT, event_data)
     
-    return new_state, None # None ferme la modale de stat si elle était ouverte
+    return new_ref, None # None ferme la modale de stat si elle était ouverte
 
 # --- NOUVELLES FONCTIONS D'AFFICHAGE DE MODAL (CORRIGÉES) ---
 
@@ -1642,6 +1993,7 @@ def create_veec_sub_modal(new_state, temp_state, feedback_msg):
     
     formation = new_state['formation_actuelle']
     banc = new_state['joueurs_banc']
+    noms = EFFECTIFS.du_match(new_state).noms
     count = new_state['sub_veec']
     team = 'VEEC'
     color = VEEC_COLOR
@@ -1663,7 +2015,7 @@ def create_veec_sub_modal(new_state, temp_state, feedback_msg):
     pos_keys = sorted(formation_cleaned.keys())
     
     for pos in pos_keys:
-        data = formation_cleaned[pos]
+        numero = formation_cleaned[pos]
         # CORRECTION : Assurer la comparaison entre entiers
         is_selected_out = temp_state.get('sortant_pos') == pos 
         style_out = {
@@ -1676,19 +2028,16 @@ def create_veec_sub_modal(new_state, temp_state, feedback_msg):
             style_out.update({'backgroundColor': '#f8d7da', 'color': '#721c24'})
             
         joueurs_sur_terrain.append(
-            html.Button(f"P{pos} - N°{data['numero']} ({data['nom']})", 
+            html.Button(f"P{pos} - N°{numero} ({noms.get(numero, 'N/A')})", 
                         id={'type': 'sub-player-btn', 'role': 'sortant', 'index': str(pos)}, n_clicks=0, 
                         style=style_out)
         )
 
     # Style pour les joueurs entrants
     joueurs_sur_banc = []
-    banc_cleaned = {int(k): v for k, v in banc.items()}
-    num_keys = sorted(banc_cleaned.keys())
-    
-    for num in num_keys:
-        data = banc_cleaned[num]
-        is_selected_in = temp_state.get('entrant') and temp_state.get('entrant')['numero'] == num
+    for num in sorted(banc):
+        # 'entrant' : numéro du joueur entrant sélectionné
+        is_selected_in = temp_state.get('entrant') == num
         style_in = {
             'width': '48%', 'margin': '1%', 'padding': '10px', 'borderRadius': '5px',
             'border': f'2px solid {VEEC_COLOR}', 'fontWeight': 'normal'
@@ -1700,7 +2049,7 @@ def create_veec_sub_modal(new_state, temp_state, feedback_msg):
             
         joueurs_sur_banc.append(
             # NOUVEL ID : Utiliser 'sub-player-btn' avec role 'entrant' (comme le sortant)
-            html.Button(f"N°{data['numero']} ({data['nom']})", 
+            html.Button(f"N°{num} ({noms.get(num, 'N/A')})", 
                         id={'type': 'sub-player-btn', 'role': 'entrant', 'index': str(num)}, n_clicks=0, # <-- NOUVEL ID
                         style=style_in)
         )
@@ -1745,25 +2094,27 @@ def create_veec_sub_modal(new_state, temp_state, feedback_msg):
 # 8. Gérer le déclenchement de la Modal de Substitution (Affichage simple)
 @app.callback(
     Output('match-state', 'data', allow_duplicate=True),
-    Output('service-modal-container', 'children', allow_duplicate=True), # ✅ MODIFIÉ    Input('btn-sub-veec', 'n_clicks'),
+    Output('service-modal-container', 'children', allow_duplicate=True), # ✅ MODIFIÉ
+    Input('btn-sub-veec', 'n_clicks'),
     Input('btn-sub-adverse', 'n_clicks'),
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_sub_init(n_veec, n_adverse, current_state):
+def handle_sub_init(n_veec, n_adverse, match_ref):
     # Ce callback OUVRE la modale et initialise l'état temporaire
     
     ctx = dash.callback_context
     if not ctx.triggered:
         return dash.no_update, dash.no_update
     
+    current_state = load_match_state(match_ref)
+
     # 🚨 CLAUSE DE GARDE : Bloquer si le setup n'est pas terminé
     if not current_state.get('match_setup_completed', False):
         return dash.no_update, dash.no_update # Deux Outputs
 
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    new_state = copy.deepcopy(current_state)
-    new_state = clean_formations(new_state)
+    new_state = current_state
     
     # Bloquer si un timer est en cours ou si une sub est déjà ouverte
     if new_state.get('timer_end_time', 0) > time.time() or new_state.get('sub_en_cours_team'):
@@ -1780,12 +2131,12 @@ def handle_sub_init(n_veec, n_adverse, current_state):
         team = 'ADVERSAIRE'
 
     if team:
-        new_state['sub_en_cours_team'] = team
         # Initialiser l'état temporaire avec le feedback
-        new_state['temp_sub_state'] = {'entrant': None, 'sortant_pos': None, 'feedback': "Sélectionnez le joueur sortant puis le joueur entrant."}
+        temp_sub_state = {'entrant': None, 'sortant_pos': None, 'feedback': "Sélectionnez le joueur sortant puis le joueur entrant."}
         
         # Le Callback 10 va maintenant voir ce changement et afficher la modale
-        return new_state, dash.no_update
+        new_ref = update_match_ui(match_ref, sub_en_cours_team=team, temp_sub_state=temp_sub_state)
+        return new_ref, dash.no_update
 
     return dash.no_update, dash.no_update
 
@@ -1803,13 +2154,14 @@ def handle_sub_init(n_veec, n_adverse, current_state):
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_sub_selection(n_sortants, n_entrants, current_state):
+def handle_sub_selection(n_sortants, n_entrants, match_ref):
+    current_state = load_match_state(match_ref)
+
     # 🚨 CLAUSE DE GARDE : Bloquer si le setup n'est pas terminé
     if not current_state.get('match_setup_completed', False):
         return dash.no_update
     
-    new_state = copy.deepcopy(current_state)
-    new_state = clean_formations(new_state)
+    new_state = current_state
 
     # N'agir que si une substitution VEEC est en cours
     if not new_state.get('sub_en_cours_team') or new_state.get('sub_en_cours_team') != 'VEEC':
@@ -1825,7 +2177,8 @@ def handle_sub_selection(n_sortants, n_entrants, current_state):
     
     role = triggered_dict.get('role') # Utiliser .get pour éviter une erreur si 'role' n'existe pas
     team = new_state['sub_en_cours_team']
-    temp_state = new_state.get('temp_sub_state', {})
+    # Copie de l'état temporaire : l'état chargé est partagé (lecture seule)
+    temp_state = dict(new_state.get('temp_sub_state', {}))
     
     # 1. Mise à jour de l'état temporaire
     if role == 'sortant':
@@ -1838,39 +2191,39 @@ def handle_sub_selection(n_sortants, n_entrants, current_state):
     
     elif role == 'entrant':
         num_entrant = int(triggered_dict['index'])
-        joueur_entrant = new_state['joueurs_banc'][num_entrant]
+        if num_entrant not in new_state['joueurs_banc']:
+            raise dash.exceptions.PreventUpdate
         
-        if temp_state.get('entrant') and temp_state.get('entrant').get('numero') == num_entrant:
+        if temp_state.get('entrant') == num_entrant:
             temp_state.pop('entrant', None)
         else:
-            temp_state['entrant'] = joueur_entrant
+            temp_state['entrant'] = num_entrant
 
     # 2. Vérification de la validation et mise à jour du message de feedback
     is_ready = temp_state.get('entrant') is not None and temp_state.get('sortant_pos') is not None
     
     default_msg = "Sélectionnez le joueur sortant sur le terrain, puis le joueur entrant sur le banc."
     
+    noms = EFFECTIFS.du_match(new_state).noms
     if is_ready:
         sortant_pos = temp_state['sortant_pos']
         formation = new_state['formation_actuelle']
-        joueur_sortant_nom = formation.get(sortant_pos, {}).get('nom', 'N/A')
-        joueur_entrant_nom = temp_state['entrant'].get('nom', 'N/A')
+        joueur_sortant_nom = noms.get(formation.get(sortant_pos), 'N/A')
+        joueur_entrant_nom = noms.get(temp_state['entrant'], 'N/A')
         temp_state['feedback'] = f"Prêt à confirmer : **{joueur_sortant_nom}** (P{sortant_pos}) sort, remplacé par **{joueur_entrant_nom}**."
     elif temp_state.get('sortant_pos') is not None:
         sortant_pos = temp_state['sortant_pos']
         formation = new_state['formation_actuelle']
-        joueur_sortant_nom = formation.get(sortant_pos, {}).get('nom', 'N/A')
+        joueur_sortant_nom = noms.get(formation.get(sortant_pos), 'N/A')
         temp_state['feedback'] = f"Joueur sortant sélectionné: **{joueur_sortant_nom}** (P{sortant_pos}). Sélectionnez maintenant l'entrant sur le banc."
     elif temp_state.get('entrant') is not None:
-        joueur_entrant_nom = temp_state['entrant'].get('nom', 'N/A')
+        joueur_entrant_nom = noms.get(temp_state['entrant'], 'N/A')
         temp_state['feedback'] = f"Joueur entrant sélectionné: **{joueur_entrant_nom}**. Sélectionnez maintenant le joueur sortant sur le terrain."
     else:
         temp_state['feedback'] = default_msg
         
-    new_state['temp_sub_state'] = temp_state
-    
     # Renvoyer l'état mis à jour
-    return new_state
+    return update_match_ui(match_ref, temp_sub_state=temp_state)
 
 
 # 10. AFFICHAGE (Callback 10) et CONFIRMATION/ANNULATION (Callback 11)
@@ -1882,8 +2235,9 @@ def handle_sub_selection(n_sortants, n_entrants, current_state):
     Input('match-state', 'data'), # Écoute tous les changements d'état
     prevent_initial_call=True
 )
-def display_sub_modal_on_state_change(current_state):
-    
+def display_sub_modal_on_state_change(match_ref):
+    current_state = load_match_state(match_ref)
+
     sub_team = current_state.get('sub_en_cours_team')
     
     # Si aucune substitution n'est en cours, fermer la modal.
@@ -1910,7 +2264,6 @@ def display_sub_modal_on_state_change(current_state):
 # 11. CONFIRMATION et ANNULATION (Actions de fermeture)
 @app.callback(
     Output('match-state', 'data', allow_duplicate=True),
-    Output('historique-output', 'children', allow_duplicate=True),
     Output('feedback-sub-output', 'children'),
     [
         Input('btn-confirm-sub', 'n_clicks'),
@@ -1920,16 +2273,17 @@ def display_sub_modal_on_state_change(current_state):
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_sub_confirm_cancel(confirm_clicks, cancel_clicks, confirm_adverse_clicks, current_state):
+def handle_sub_confirm_cancel(confirm_clicks, cancel_clicks, confirm_adverse_clicks, match_ref):
     
     ctx = dash.callback_context
     triggered_inputs = [c for c in ctx.triggered if c and c.get('value', 0) > 0]
     if not triggered_inputs:
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update
+
+    current_state = load_match_state(match_ref)
 
     triggered_prop_id = triggered_inputs[0]['prop_id']
-    new_state = copy.deepcopy(current_state)
-    new_state = clean_formations(new_state)
+    new_state = current_state
 
     # Déterminer quel bouton a été cliqué
     try:
@@ -1947,26 +2301,13 @@ def handle_sub_confirm_cancel(confirm_clicks, cancel_clicks, confirm_adverse_cli
     # --- 1. Logique d'annulation (VEEC ou ADVERSE) ---
     if triggered_type == 'cancel-sub':
         print("DEBUG : Annulation (Clic). Fermeture de la modale.")
-        new_state['sub_en_cours_team'] = None
-        new_state['temp_sub_state'] = {}
-        return new_state, dash.no_update, ""
+        return update_match_ui(match_ref, sub_en_cours_team=None, temp_sub_state={}), ""
 
     # --- 2. Logique de confirmation de SUB ADVERSE ---
     if triggered_type == 'confirm-sub-adverse':
         print("DEBUG : Confirmation de la substitution ADVERSE. Fermeture de la modale.")
-        new_state['sub_adverse'] += 1
-        new_state['sub_en_cours_team'] = None
-        
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = {
-            'timestamp': timestamp, 'set': new_state['current_set'], 'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-            'position': 'Adv Bench', 'joueur_nom': f"Adversaire Sub",
-            'action_code': 'SUB', 'resultat': 'ADVERSE_CONFIRMED'
-        }
-        new_state['historique_stats'].insert(0, log_entry)
-        
-        historique_table = create_historique_table(new_state['historique_stats'])
-        return new_state, historique_table, ""
+        new_ref = dispatch_match_event(match_ref, engine.SUB_ADVERSE, sub_en_cours_team=None)
+        return new_ref, ""
 
     # --- 3. Logique de confirmation de SUB VEEC ---
     if triggered_type == 'btn-confirm-sub' and current_state.get('sub_en_cours_team') == 'VEEC':
@@ -1975,77 +2316,27 @@ def handle_sub_confirm_cancel(confirm_clicks, cancel_clicks, confirm_adverse_cli
         temp_state = new_state.get('temp_sub_state', {})
         
         sortant_pos = temp_state.get('sortant_pos')
-        joueur_entrant_data = temp_state.get('entrant')
+        entrant_numero = temp_state.get('entrant')
 
-        if not team or not sortant_pos or not joueur_entrant_data:
+        if not team or not sortant_pos or entrant_numero is None:
             print("DEBUG: ERREUR - Données de substitution manquantes à la confirmation.")
-            return dash.no_update, dash.no_update, "ERREUR : Le Libero ne peut pas être impliqué dans une substitution régulière." # ✅ Correction
+            return dash.no_update, "ERREUR : Le Libero ne peut pas être impliqué dans une substitution régulière." # ✅ Correction
         
-        joueur_entrant = joueur_entrant_data
-        
-        print(f"DEBUG: Confirmation SUB {team}. Sortant Pos: {sortant_pos}, Entrant Num: {joueur_entrant.get('numero')}")
-
-        if team == 'VEEC':
-            # Récupérer les numéros des joueurs impliqués dans cette SUB régulière
-            veec_sortant_num = new_state['formation_actuelle'][sortant_pos]['numero']
-            veec_entrant_num = joueur_entrant_data['numero']
-            
-            # ----------------------------------------------------
-            # NOUVELLE VALIDATION LIBERO (Bloc Inséré ici)
-            # ----------------------------------------------------
-            libero_status = new_state['liberos_veec']
-            starter_bloque = libero_status.get('starter_numero_replaced')
-            libero_est_sur_terrain = libero_status.get('is_on_court')
-            libero_actif_num = libero_status.get('actif_numero')
-
-            # Règle 1 : Interdire la substitution du Libero
-            if veec_sortant_num == libero_actif_num or veec_entrant_num == libero_actif_num:
-                 # Le message d'erreur est affiché via le 'print' (à logguer dans votre interface si possible)
-                 print(f"ERREUR SUB : Le Libero (L{libero_actif_num}) ne peut pas être impliqué dans une substitution régulière.")
-                 # Annuler la substitution en fermant la modale sans appliquer de changements d'état/historique.
-                 new_state['sub_en_cours_team'] = None
-                 new_state['temp_sub_state'] = {}
-                 # On renvoie l'état actuel et on ne met pas à jour l'historique
-                 return new_state, dash.no_update, f"ERREUR : Le joueur N°{starter_bloque} est bloqué et doit revenir via l'échange Libero." # ✅ Correction
-
-            # Règle 2 : Interdire l'entrée du joueur titulaire bloqué tant que le Libero est sur le terrain
-            if libero_est_sur_terrain and starter_bloque is not None:
-                if veec_entrant_num == starter_bloque:
-                    print(f"ERREUR SUB : Le joueur N°{starter_bloque} doit revenir via l'échange Libero-OUT.")
-                    # Annuler la substitution
-                    new_state['sub_en_cours_team'] = None
-                    new_state['temp_sub_state'] = {}
-                    return new_state, dash.no_update
-            
-            # ----------------------------------------------------
-            # FIN VALIDATION LIBERO
-            # ----------------------------------------------------
-            
-            joueur_sortant = new_state['formation_actuelle'][sortant_pos]
-            new_state['joueurs_banc'][joueur_sortant['numero']] = joueur_sortant 
-            new_state['formation_actuelle'][sortant_pos] = joueur_entrant 
-            del new_state['joueurs_banc'][joueur_entrant['numero']]
-            new_state['sub_veec'] += 1
-            print(f"DEBUG: VEEC - {joueur_sortant['nom']} sort de P{sortant_pos}. {joueur_entrant['nom']} entre.")
-    
-        # Enregistrement et réinitialisation
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = {
-            'timestamp': timestamp, 'set': new_state['current_set'], 'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-            'position': sortant_pos, 'joueur_nom': f"{joueur_sortant['nom']} (SORT)",
-            'action_code': 'SUB', 'resultat': f"ENTRE: {joueur_entrant['nom']}"
-        }
-        new_state['historique_stats'].insert(0, log_entry)
-
-        new_state['sub_en_cours_team'] = None
-        new_state['temp_sub_state'] = {}
+        # Quota du set et règles Libero (le Libero ne participe jamais, le titulaire bloqué revient par l'échange Libero)
+        event_data, message = verifier_substitution(new_state, sortant_pos, entrant_numero,
+                                                    EFFECTIFS.du_match(new_state).noms)
+        if event_data is None:
+            print(f"ERREUR SUB : {message}")
+            # Annuler la substitution en fermant la modale sans enregistrer d'événement
+            return update_match_ui(match_ref, sub_en_cours_team=None, temp_sub_state={}), message
+    
+        # Enregistrement (le réducteur échange banc/terrain et incrémente sub_veec) et réinitialisation
+        new_ref = dispatch_match_event(match_ref, engine.SUB, event_data, sub_en_cours_team=None, temp_sub_state={})
         print("DEBUG: Substitution appliquée et état réinitialisé. Fermeture de la modale.")
-
-        historique_table = create_historique_table(new_state['historique_stats'])
         
-        return new_state, historique_table, ""
+        return new_ref, ""
 
-    return new_state, dash.no_update, "Votre message d'erreur"
+    return dash.no_update, "Votre message d'erreur"
 
 # 12. Gérer le déclenchement de la Modal du Libero
 @app.callback(
@@ -2055,25 +2346,22 @@ def handle_sub_confirm_cancel(confirm_clicks, cancel_clicks, confirm_adverse_cli
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_libero_init(n_clicks, current_state):
+def handle_libero_init(n_clicks, match_ref):
+    current_state = load_match_state(match_ref)
+
     # Blocage si un autre timer/sub est en cours
     if not n_clicks or current_state.get('timer_end_time', 0) > time.time() or current_state.get('sub_en_cours_team'):
         return dash.no_update, dash.no_update
         
-    new_state = copy.deepcopy(current_state)
-    
     # Déclencher l'affichage du type de modal Libero
-    new_state['sub_en_cours_team'] = 'LIBERO_VEEC' 
-    
-    modal = create_libero_sub_modal(new_state)
+    modal = create_libero_sub_modal(current_state)
     
-    return new_state, modal
+    return update_match_ui(match_ref, sub_en_cours_team='LIBERO_VEEC'), modal
 
 
 # 13. Gérer la confirmation de la substitution Libero
 @app.callback(
     Output('match-state', 'data', allow_duplicate=True),
-    Output('historique-output', 'children', allow_duplicate=True),
     Output('stat-modal-container', 'children', allow_duplicate=True), # Fermer la modal
     [
         Input('btn-confirm-libero-out', 'n_clicks'),
@@ -2083,89 +2371,48 @@ def handle_libero_init(n_clicks, current_state):
     State('match-state', 'data'),
     prevent_initial_call=True
 )
-def handle_libero_swap(out_clicks, cancel_clicks, in_clicks, current_state):
+def handle_libero_swap(out_clicks, cancel_clicks, in_clicks, match_ref):
     ctx = dash.callback_context
     triggered_inputs = [c for c in ctx.triggered if c and c.get('value', 0) > 0]
     if not triggered_inputs:
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update
     
+    current_state = load_match_state(match_ref)
+
     triggered_prop_id = triggered_inputs[0]['prop_id']
-    new_state = copy.deepcopy(current_state)
-    libero_status = new_state['liberos_veec']
-    historique_output = dash.no_update
 
     # --- 1. Annulation ---
     if triggered_prop_id == 'btn-cancel-libero-sub.n_clicks':
-        new_state['sub_en_cours_team'] = None
-        return new_state, dash.no_update, None
+        return update_match_ui(match_ref, sub_en_cours_team=None), None
 
     # --- 2. Sortie du Libero (Libero -> Titulaire) ---
     if triggered_prop_id == 'btn-confirm-libero-out.n_clicks':
-        if not libero_status['is_on_court'] or libero_status.get('starter_numero_replaced') is None: # Vérification renforcée
-            print("ERREUR: Tente de sortir le Libero alors qu'il n'est pas censé être là ou pas de titulaire enregistré.")
-            return new_state, dash.no_update, dash.no_update
-            
-        starter_num = libero_status['starter_numero_replaced']
-        current_pos = libero_status['current_pos_on_court']
+        # Vérifications (Libero sur le terrain, titulaire connu et disponible sur le banc)
+        event_data, message = handle_libero_out(current_state)
+        if event_data is None:
+            print(f"ERREUR: {message}")
+            return dash.no_update, dash.no_update
+
+        # Échange Libero -> Titulaire et mise à jour du statut Libero (réducteur LIBERO_OUT)
+        new_ref = dispatch_match_event(match_ref, engine.LIBERO_OUT, event_data, sub_en_cours_team=None)
         
-        # CORRECTION : Utiliser le Libero ACTIF
-        libero_num_actif = libero_status['actif_numero']
-
-        # 1. Échange Libero (P4) -> Titulaire (P1)
-        new_state['joueurs_banc'][libero_num_actif] = new_state['formation_actuelle'][current_pos] # Libero sur le banc
-        new_state['formation_actuelle'][current_pos] = new_state['joueurs_banc'][starter_num] # Titulaire sur le terrain
-        del new_state['joueurs_banc'][starter_num] # Titulaire retiré du banc
-
-        # 2. Mise à jour du statut Libero
-        libero_status['is_on_court'] = False
-        libero_status['current_pos_on_court'] = None
-        new_state['sub_en_cours_team'] = None
-        
-        # 3. Historique
-        log_entry = {'timestamp': datetime.now().strftime("%H:%M:%S"), 'set': new_state['current_set'], 'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-                     'position': current_pos, 'joueur_nom': f"L{libero_num_actif} (SORT)", 'action_code': 'LIBERO_OUT', 'resultat': f"ENTRE: N°{starter_num}"}
-        new_state['historique_stats'].insert(0, log_entry)
-        historique_output = create_historique_table(new_state['historique_stats'])
-        
-        return new_state, historique_output, None
+        return new_ref, None
 
     # --- 3. Entrée du Libero (Titulaire -> Libero) ---
-    if triggered_prop_id.startswith('{"type":"confirm-libero-in"'):
-        if libero_status['is_on_court']:
-            print("ERREUR: Tente d'entrer le Libero alors qu'il est déjà sur le terrain.")
-            return new_state, dash.no_update, dash.no_update
-            
+    if '"confirm-libero-in"' in triggered_prop_id:
         triggered_dict = json.loads(re.sub(r"'", '"', triggered_prop_id.replace(".n_clicks", "")))
-        pos_sortant = int(triggered_dict['pos'])
-        libero_num_actif = libero_status['actif_numero']
-
-        # Vérification finale (Libero doit être sur le banc)
-        if libero_num_actif not in new_state['joueurs_banc']:
-            print("ERREUR: Libero non trouvé sur le banc.")
-            return new_state, dash.no_update, dash.no_update
-            
-        joueur_sortant = new_state['formation_actuelle'][pos_sortant]
-        
-        # 1. Échange Titulaire (P1) -> Libero (P4)
-        new_state['joueurs_banc'][joueur_sortant['numero']] = joueur_sortant # Titulaire sur le banc
-        new_state['formation_actuelle'][pos_sortant] = new_state['joueurs_banc'][libero_num_actif] # Libero sur le terrain
-        del new_state['joueurs_banc'][libero_num_actif] # Libero retiré du banc
-
-        # 2. Mise à jour du statut Libero
-        libero_status['is_on_court'] = True
-        libero_status['starter_numero_replaced'] = joueur_sortant['numero']
-        libero_status['current_pos_on_court'] = pos_sortant
-        new_state['sub_en_cours_team'] = None
+        # Vérifications (Libero sur le banc, position de ligne arrière)
+        event_data, message = verifier_libero_in(current_state, int(triggered_dict['pos']))
+        if event_data is None:
+            print(f"ERREUR: {message}")
+            return dash.no_update, dash.no_update
+
+        # Échange Titulaire -> Libero et mise à jour du statut Libero (réducteur LIBERO_IN)
+        new_ref = dispatch_match_event(match_ref, engine.LIBERO_IN, event_data, sub_en_cours_team=None)
         
-        # 3. Historique
-        log_entry = {'timestamp': datetime.now().strftime("%H:%M:%S"), 'set': new_state['current_set'], 'score': f"{new_state['score_veec']}-{new_state['score_adverse']}",
-                     'position': pos_sortant, 'joueur_nom': f"N°{joueur_sortant['numero']} (SORT)", 'action_code': 'LIBERO_IN', 'resultat': f"ENTRE: L{libero_num_actif}"}
-        new_state['historique_stats'].insert(0, log_entry)
-        historique_output = create_historique_table(new_state['historique_stats'])
-        
-        return new_state, historique_output, None
+        return new_ref, None
 
-    return dash.no_update, dash.no_update, dash.no_update
+    return dash.no_update, dash.no_update
 
 # --- DÉMARRAGE DE L'APPLICATION ---
 if __name__ == '__main__':
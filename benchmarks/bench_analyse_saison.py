@@ -0,0 +1,150 @@
+"""
+Benchmark : analyse de saison (analyse_saison.py) sur des archives synthétiques.
+
+Génère NB_MATCHS matchs aléatoires (rallyes avec services, réceptions,
+attaques et blocs) répartis dans NB_FICHIERS fichiers de journal SQLite, en
+passant par le vrai chemin d'écriture (MatchStore + SQLiteJournal). Les
+archives sont conservées dans un dossier temporaire et réutilisées d'une
+exécution à l'autre : le nom du dossier comprend la version du format d'état
+(codec.VERSION_ETAT) et une empreinte de ce script, pour qu'une archive d'un
+autre format ou d'un autre générateur ne soit jamais relue.
+
+Mesure ensuite le chargement en colonnes et chaque étape vectorielle, puis
+vérifie la reconstruction des rallyes (service, rotation) en rejouant
+quelques matchs avec le réducteur.
+
+Usage : python benchmarks/bench_analyse_saison.py [nb_matchs]
+"""
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analyse_saison
+import codec
+import match_engine as engine
+from bench_state_updates import NOMS, etat_initial
+from journal_sqlite import SQLiteJournal, load_saved_match
+from match_store import MatchStore
+
+NB_MATCHS = 300
+NB_FICHIERS = 10
+NB_VERIFIES = 5
+GRAINE = 2024
+
+
+def _stat(store, match_id, pos, action_code, resultat):
+    numero = store.load(match_id)['formation_actuelle'][pos]
+    store.dispatch(match_id, engine.STAT, {'position': pos, 'numero': numero, 'nom': NOMS[numero],
+                                           'action_code': action_code, 'resultat': resultat})
+
+
+def _point(store, match_id, gagnant):
+    store.dispatch(match_id, engine.POINT, {'gagnant': gagnant})
+
+
+def jouer_rallye(store, match_id):
+    """Un rallye : service ou réception, puis attaques (et blocs) jusqu'au point."""
+    if store.load(match_id)['service_actuel'] == 'VEEC':
+        resultat = random.choices(('ACE', 'OK', 'FAUTE'), (8, 80, 12))[0]
+        _stat(store, match_id, 1, 'SVC', resultat)
+        if resultat == 'ACE':
+            return
+        if resultat == 'FAUTE':
+            return _point(store, match_id, 'ADVERSAIRE')
+    else:
+        resultat = random.choices(('PERF', 'OK', 'FAUTE'), (35, 55, 10))[0]
+        _stat(store, match_id, random.choice((1, 5, 6)), 'REC', resultat)
+        if resultat == 'FAUTE':
+            return _point(store, match_id, 'ADVERSAIRE')
+    for _ in range(3):
+        resultat = random.choices(('KILL', 'MANU', 'FAUTE'), (45, 40, 15))[0]
+        _stat(store, match_id, random.choice((2, 3, 4)), 'ATK', resultat)
+        if resultat == 'KILL':
+            return
+        if resultat == 'FAUTE':
+            return _point(store, match_id, 'ADVERSAIRE')
+        if random.random() < 0.3:
+            resultat = random.choices(('GAIN', 'TOUCH', 'FAUTE'), (20, 60, 20))[0]
+            _stat(store, match_id, random.choice((2, 3, 4)), 'BLK', resultat)
+            if resultat == 'GAIN':
+                return
+            if resultat == 'FAUTE':
+                return _point(store, match_id, 'ADVERSAIRE')
+    _point(store, match_id, random.choice(('VEEC', 'ADVERSAIRE')))
+
+
+def generer_archives(dossier, nb_matchs):
+    random.seed(GRAINE)
+    os.makedirs(dossier, exist_ok=True)
+    par_fichier = -(-nb_matchs // NB_FICHIERS)
+    for f in range(NB_FICHIERS):
+        journal = SQLiteJournal(os.path.join(dossier, f"saison_{f:02d}.db"), batch_max_ops=4096)
+        store = MatchStore(journal_durable=journal)
+        for _ in range(min(par_fichier, nb_matchs - f * par_fichier)):
+            match_id = store.create(etat_initial())['match_id']
+            state = store.load(match_id)
+            store.dispatch(match_id, engine.SETUP, {'formation': state['formation_actuelle'], 'banc': state['joueurs_banc']})
+            while not store.load(match_id)['match_ended']:
+                jouer_rallye(store, match_id)
+        journal.close()
+
+
+def verifier_rallyes(dossier, table_rallyes, nb):
+    """Compare service et rotation reconstruits à ceux du réducteur, rallye par rallye."""
+    path = os.path.join(dossier, 'saison_00.db')
+    matchs = table_rallyes[table_rallyes['match'].astype(str).str.startswith('saison_00.db:')]
+    for match in list(dict.fromkeys(matchs['match'].astype(str)))[:nb]:
+        initial_state, events = load_saved_match(path, match.split(':', 1)[1])
+        state = engine.reduce_event(initial_state, events[0]) if events else initial_state
+        attendus = []
+        for event in events[1:]:
+            if engine.gagnant_du_rallye(event) is not None:
+                attendus.append((state['service_actuel'], state['formation_actuelle'].offset + 1))
+            state = engine.reduce_event(state, event)
+        r = matchs[matchs['match'].astype(str) == match]
+        obtenus = list(zip(r['serveur'], r['rotation'].astype(int)))
+        assert obtenus == attendus, f"Reconstruction incorrecte pour {match}"
+
+
+def main():
+    nb_matchs = int(sys.argv[1]) if len(sys.argv) > 1 else NB_MATCHS
+    with open(__file__, 'rb') as f:
+        empreinte = hashlib.sha256(f.read()).hexdigest()[:8]
+    dossier = os.path.join(tempfile.gettempdir(), f"veec_saison_{nb_matchs}_v{codec.VERSION_ETAT}_{empreinte}")
+    if not os.path.isdir(dossier):
+        t0 = time.perf_counter()
+        generer_archives(dossier, nb_matchs)
+        print(f"Archives générées en {time.perf_counter() - t0:.1f} s dans {dossier}")
+
+    etapes = []
+    t0 = time.perf_counter()
+    events = analyse_saison.charger_saison([dossier])
+    etapes.append(('Chargement (SQLite -> colonnes)', time.perf_counter() - t0))
+    t0 = time.perf_counter()
+    table_rallyes = analyse_saison.rallyes(events)
+    etapes.append(('Rallyes (service, rotation)', time.perf_counter() - t0))
+    t0 = time.perf_counter()
+    stats = analyse_saison.stats_par_rallye(events, table_rallyes)
+    etapes.append(('Stats par rallye', time.perf_counter() - t0))
+    t0 = time.perf_counter()
+    joueurs = analyse_saison.par_joueur(events, stats)
+    rotations = analyse_saison.par_rotation(events, table_rallyes, stats)
+    etapes.append(('Indicateurs joueurs + rotations', time.perf_counter() - t0))
+
+    verifier_rallyes(dossier, table_rallyes, NB_VERIFIES)
+
+    print(f"{events['match'].nunique()} matchs, {len(events)} événements, {len(table_rallyes)} rallyes, {len(stats)} stats")
+    for nom, duree in etapes:
+        print(f"{nom:34s}: {duree * 1e3:8.1f} ms")
+    print(f"{'Total':34s}: {sum(d for _, d in etapes) * 1e3:8.1f} ms")
+    print(rotations[['rallyes', 'side_out_pct', 'break_pct', 'kill_eff_pct', 'ace_pct']])
+    print(joueurs[['nom', 'matchs', 'kill_eff_pct', 'side_out_pct', 'ace_pct', 'break_service_pct']])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+"""
+Test de charge : N matchs marqués en parallèle, M spectateurs par match.
+
+Rejoue contre /_dash-update-component le trafic qu'enverrait le navigateur :
+  - marqueur : une stat éventuelle (bouton 'stat-btn'), puis un clic de point,
+    suivis de la cascade de callbacks que le navigateur déclenche à chaque
+    changement de 'match-state' (terrain et scores, historique, stats
+    joueurs, minuteur, modales...). En fin de match, le marqueur annule le
+    dernier point pour continuer à jouer (charge constante).
+  - spectateur : une fois par seconde, les callbacks d'affichage du match
+    (terrain, historique) avec la dernière référence connue. Le tick
+    'interval-component' étant traité côté navigateur, c'est ce
+    rafraîchissement à 1 Hz qui représente la charge d'un écran d'affichage.
+    Avec --sse, les spectateurs s'abonnent plutôt au flux /direct/<match_id>
+    (Server-Sent Events) : la latence mesurée est alors le délai entre la
+    publication d'un état par le serveur et sa réception.
+
+Par défaut, le serveur est lancé localement dans un sous-processus (journal
+SQLite temporaire), les N matchs y sont créés et leur formation confirmée
+avant la mesure. Le processus serveur est échantillonné via /proc (CPU, RSS) :
+aucun service extérieur n'est nécessaire. --url vise un serveur déjà lancé :
+les matchs y sont ouverts comme dans un navigateur (/match/charge-<i>) et
+leur formation est confirmée par la modale de configuration.
+
+Rapport : débit (requêtes/s, rallyes/s), latences p50/p99 par type de
+requête, erreurs, CPU et mémoire du serveur.
+
+Usage : python benchmarks/bench_charge.py [--matchs N] [--spectateurs M] [--duree S] [--cadence S] [--url URL]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTE = '/_dash-update-component'
+PORT = 8071
+
+# Lance l'application et prépare les matchs (formation confirmée), puis écrit leurs références
+_LANCEUR = """
+import json, sys
+import app
+import match_engine as engine
+refs = []
+for _ in range({nb_matchs}):
+    ref = app.MATCH_STORE.create(app.initial_state)
+    state = app.MATCH_STORE.load(ref['match_id'])
+    refs.append(app.MATCH_STORE.dispatch(ref['match_id'], engine.SETUP,
+                                         {{'formation': state['formation_actuelle'], 'banc': state['joueurs_banc']}}))
+with open({refs_path!r}, 'w') as f:
+    json.dump(refs, f)
+app.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)
+"""
+
+CALLBACKS_SPECTATEUR = ('terrain-graph-statique.figure', 'datatable-historique.data')
+
+
+class ClientDash:
+    """Construit les requêtes des callbacks à partir de /_dash-dependencies (comme le renderer Dash)."""
+
+    def __init__(self, url, dependances):
+        self.url = url
+        self.session = requests.Session()
+        self.deps = dependances
+
+    @staticmethod
+    def _sorties(dep):
+        sorties = []
+        for part in dep['output'].strip('.').split('...'):
+            cid, prop = part.split('@')[0].rsplit('.', 1)
+            sorties.append({'id': cid, 'property': prop})
+        return sorties if len(sorties) > 1 else sorties[0]
+
+    def corps(self, dep, valeurs, declencheur):
+        """Corps de requête : valeurs['id.prop'] pour chaque entrée/état, listes vides pour les motifs ALL."""
+        def entree(i):
+            if i['id'].startswith('{'):
+                if declencheur and declencheur[0] == 'motif' and json.loads(i['id'])['type'] == declencheur[1]['type']:
+                    return [{'id': declencheur[1], 'property': i['property'], 'value': 1}]
+                return []
+            return {'id': i['id'], 'property': i['property'], 'value': valeurs.get(f"{i['id']}.{i['property']}")}
+        if declencheur is None:
+            changed = []
+        elif declencheur[0] == 'motif':
+            changed = [json.dumps(declencheur[1], sort_keys=True, separators=(',', ':')) + '.n_clicks']
+        else:
+            changed = [declencheur[1]]
+        return {'output': dep['output'], 'outputs': self._sorties(dep), 'inputs': [entree(i) for i in dep['inputs']],
+                'state': [entree(s) for s in dep['state']], 'changedPropIds': changed}
+
+    def appeler(self, dep, valeurs, declencheur=None):
+        """Retourne (code HTTP, réponse JSON ou None, durée en secondes)."""
+        t0 = time.perf_counter()
+        r = self.session.post(self.url + ROUTE, json=self.corps(dep, valeurs, declencheur), timeout=30)
+        duree = time.perf_counter() - t0
+        return r.status_code, (r.json().get('response') if r.status_code == 200 else None), duree
+
+
+def _trouver(deps, entree=None, sortie=None):
+    for dep in deps:
+        if dep.get('clientside_function'): # Exécutés par le navigateur : aucune requête
+            continue
+        if entree and not any(f"{i['id']}.{i['property']}" == entree or entree in i['id'] for i in dep['inputs']):
+            continue
+        if sortie and sortie not in dep['output']:
+            continue
+        return dep
+    raise KeyError(entree or sortie)
+
+
+class Mesures:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latences = defaultdict(list)
+        self.erreurs = defaultdict(int)
+        self.rallyes = 0
+
+    def ajouter(self, nature, statut, duree):
+        with self._lock:
+            self.latences[nature].append(duree)
+            if statut not in (200, 204):
+                self.erreurs[nature] += 1
+
+
+class _Match:
+    """Référence courante d'un match, partagée entre son marqueur et ses spectateurs."""
+
+    def __init__(self, ref):
+        self.ref = ref
+        self.lock = threading.Lock()
+
+
+def _appliquer(valeurs, reponse):
+    for cid, props in (reponse or {}).items():
+        for prop, valeur in props.items():
+            valeurs[f"{cid}.{prop}"] = valeur
+
+
+def marqueur(client, match, mesures, fin, cadence, rng):
+    deps = client.deps
+    dep_point = _trouver(deps, entree='btn-point-veec.n_clicks')
+    dep_undo = _trouver(deps, entree='btn-undo.n_clicks')
+    dep_stat = _trouver(deps, entree='stat-btn')
+    cascade = [d for d in deps if not d.get('clientside_function')
+               and any(f"{i['id']}.{i['property']}" == 'match-state.data' for i in d['inputs'])]
+    valeurs = {'datatable-historique.page_current': 0, 'datatable-historique.page_size': 25,
+               'datatable-historique.sort_by': [], 'datatable-historique.filter_query': '', 'stats-set-choisi.value': 0}
+
+    def action(dep, nature, declencheur):
+        valeurs['match-state.data'] = match.ref
+        statut, reponse, duree = client.appeler(dep, valeurs, declencheur)
+        mesures.ajouter(nature, statut, duree)
+        nouvelle = (reponse or {}).get('match-state', {}).get('data')
+        if nouvelle:
+            with match.lock:
+                match.ref = nouvelle
+            valeurs['match-state.data'] = nouvelle
+            # Cascade déclenchée par le navigateur à chaque nouvelle référence
+            for d in cascade:
+                s, r, t = client.appeler(d, valeurs, ('prop', 'match-state.data'))
+                mesures.ajouter('cascade', s, t)
+                _appliquer(valeurs, r)
+        return statut
+
+    while time.monotonic() < fin:
+        if rng.random() < 0.5:
+            pos = rng.randint(1, 6)
+            geste, resultat = rng.choice([('ATK', 'MANU'), ('REC', 'OK'), ('SVC', 'OK'), ('BLK', 'TOUCH'), ('ATK', 'KILL')])
+            valeurs['joueur-selectionne.data'] = {'pos': pos, 'data': {}}
+            action(dep_stat, 'stat', ('motif', {'type': 'stat-btn', 'index': f"{pos}_{geste}_{resultat}"}))
+        bouton = rng.choice(('btn-point-veec', 'btn-point-adverse'))
+        if action(dep_point, 'point', ('prop', f"{bouton}.n_clicks")) == 204:
+            action(dep_undo, 'annulation', ('prop', 'btn-undo.n_clicks')) # Match terminé : on rejoue la fin
+        with mesures._lock:
+            mesures.rallyes += 1
+        if cadence:
+            time.sleep(rng.uniform(0.5, 1.5) * cadence)
+
+
+def _ids(composant, type_id):
+    """Index des composants d'un type donné (identifiants à motif) dans une réponse de callback."""
+    if isinstance(composant, dict):
+        cid = composant.get('id')
+        trouves = [cid['index']] if isinstance(cid, dict) and cid.get('type') == type_id else []
+        return trouves + [i for v in composant.values() for i in _ids(v, type_id)]
+    if isinstance(composant, list):
+        return [i for v in composant for i in _ids(v, type_id)]
+    return []
+
+
+def ouvrir_match(client, match_id):
+    """Ouvre /match/<match_id> et, si le match n'a pas commencé, confirme une formation (mode --url)."""
+    deps = client.deps
+    _, reponse, _ = client.appeler(_trouver(deps, entree='url.pathname', sortie='match-state'),
+                                   {'url.pathname': f"/match/{match_id}", 'url.search': ''}, ('prop', 'url.pathname'))
+    valeurs = {'match-state.data': reponse['match-state']['data']}
+    dep_setup = _trouver(deps, sortie='pre-match-setup-container')
+    _, reponse, _ = client.appeler(dep_setup, valeurs, ('prop', 'match-state.data'))
+    for pos in range(1, 7):
+        joueurs = _ids(reponse, 'setup-player-select')
+        if not joueurs:
+            return valeurs['match-state.data'] # Formation déjà confirmée
+        for type_id, index in (('setup-player-select', joueurs[0]), ('setup-position-assign', str(pos))):
+            _, reponse, _ = client.appeler(dep_setup, valeurs, ('motif', {'type': type_id, 'index': index}))
+            _appliquer(valeurs, reponse)
+    valeurs['btn-confirm-setup.n_clicks'] = 1
+    _, reponse, _ = client.appeler(_trouver(deps, entree='btn-confirm-setup.n_clicks'), valeurs, ('prop', 'btn-confirm-setup.n_clicks'))
+    return reponse['match-state']['data']
+
+
+def spectateur(client, match, mesures, fin, rng):
+    deps = [_trouver(client.deps, sortie=s) for s in CALLBACKS_SPECTATEUR]
+    valeurs = {'datatable-historique.page_current': 0, 'datatable-historique.page_size': 25,
+               'datatable-historique.sort_by': [], 'datatable-historique.filter_query': ''}
+    time.sleep(rng.random()) # Répartit les ticks des spectateurs dans la seconde
+    while time.monotonic() < fin:
+        debut = time.monotonic()
+        valeurs['match-state.data'] = match.ref
+        for dep in deps:
+            statut, reponse, duree = client.appeler(dep, valeurs, ('prop', 'match-state.data'))
+            mesures.ajouter('spectateur', statut, duree)
+            _appliquer(valeurs, reponse)
+        time.sleep(max(0.0, 1.0 - (time.monotonic() - debut)))
+
+
+def spectateur_sse(client, match, mesures, fin, rng):
+    time.sleep(rng.random())
+    reste = fin - time.monotonic()
+    try:
+        with client.session.get(f"{client.url}/direct/{match.ref['match_id']}", stream=True,
+                                timeout=(5, max(1.0, reste))) as r:
+            if r.status_code != 200:
+                return mesures.ajouter('direct (SSE)', r.status_code, 0.0)
+            for ligne in r.iter_lines():
+                if ligne.startswith(b'data: {'):
+                    mesures.ajouter('direct (SSE)', 200, time.time() - json.loads(ligne[6:])['horodatage'])
+                if time.monotonic() >= fin:
+                    return
+    except requests.exceptions.RequestException: # Délai de lecture, ou serveur arrêté en fin de mesure
+        pass
+
+
+class SondeProcessus(threading.Thread):
+    """Échantillonne CPU (% d'un cœur) et RSS d'un processus via /proc (Linux)."""
+
+    def __init__(self, pid, periode=0.5):
+        super().__init__(daemon=True)
+        self.pid, self.periode = pid, periode
+        self.cpu, self.rss = [], []
+        self.arret = threading.Event()
+        self._tick = os.sysconf('SC_CLK_TCK')
+
+    def _lire(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            champs = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(champs[11]) + int(champs[12])) / self._tick # utime + stime
+        with open(f"/proc/{self.pid}/status") as f:
+            rss = next(int(l.split()[1]) for l in f if l.startswith('VmRSS:')) * 1024
+        return cpu, rss
+
+    def run(self):
+        cpu_prec, t_prec = self._lire()[0], time.monotonic()
+        while not self.arret.wait(self.periode):
+            try:
+                cpu, rss = self._lire()
+            except (OSError, StopIteration):
+                return
+            t = time.monotonic()
+            self.cpu.append(100 * (cpu - cpu_prec) / (t - t_prec))
+            self.rss.append(rss)
+            cpu_prec, t_prec = cpu, t
+
+
+def lancer_serveur(nb_matchs, dossier):
+    refs_path = os.path.join(dossier, 'refs.json')
+    env = dict(os.environ, VEEC_JOURNAL_DB=os.path.join(dossier, 'charge.db'), VEEC_METRICS_LOG='')
+    code = _LANCEUR.format(nb_matchs=nb_matchs, refs_path=refs_path, port=PORT)
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=RACINE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{PORT}"
+    for _ in range(300):
+        if proc.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage")
+        try:
+            if os.path.exists(refs_path) and requests.get(url + '/_dash-dependencies', timeout=1).ok:
+                with open(refs_path) as f:
+                    return proc, url, json.load(f)
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Le serveur n'a pas démarré")
+
+
+def _pct(valeurs, q):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(q * len(valeurs)))] * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge VEEC Scorer (marqueurs et spectateurs simulés).")
+    parser.add_argument('--matchs', type=int, default=4)
+    parser.add_argument('--spectateurs', type=int, default=5, help="Spectateurs par match")
+    parser.add_argument('--duree', type=float, default=20.0, help="Durée de la mesure (s)")
+    parser.add_argument('--cadence', type=float, default=2.0, help="Secondes entre deux rallyes d'un marqueur (0 = au plus vite)")
+    parser.add_argument('--sse', action='store_true', help="Spectateurs abonnés au flux /direct (sinon callbacks Dash à 1 Hz)")
+    parser.add_argument('--url', help="Serveur déjà lancé (sinon lancé localement)")
+    parser.add_argument('--graine', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    proc = sonde = None
+    with tempfile.TemporaryDirectory() as dossier:
+        if args.url:
+            url = args.url.rstrip('/')
+            client = ClientDash(url, requests.get(url + '/_dash-dependencies', timeout=10).json())
+            refs = [ouvrir_match(client, f"charge-{i}") for i in range(args.matchs)]
+        else:
+            proc, url, refs = lancer_serveur(args.matchs, dossier)
+            sonde = SondeProcessus(proc.pid)
+        try:
+            deps = requests.get(url + '/_dash-dependencies', timeout=10).json()
+            mesures = Mesures()
+            fin = time.monotonic() + args.duree
+            threads = []
+            for i, ref in enumerate(refs):
+                match = _Match(ref)
+                threads.append(threading.Thread(target=marqueur, args=(ClientDash(url, deps), match, mesures, fin,
+                                                                       args.cadence, random.Random(args.graine + i))))
+                for j in range(args.spectateurs):
+                    threads.append(threading.Thread(target=spectateur_sse if args.sse else spectateur, daemon=True, args=(ClientDash(url, deps), match, mesures, fin,
+                                                                             random.Random(args.graine * 1000 + i * 100 + j))))
+            if sonde:
+                sonde.start()
+            debut = time.monotonic()
+            for t in threads:
+                t.start()
+            for t in threads: # Les abonnés SSE peuvent attendre un dernier événement : on ne les attend pas au-delà
+                t.join(max(0.0, fin - time.monotonic()) + 2.0)
+            duree = min(time.monotonic() - debut, args.duree)
+        finally:
+            if sonde:
+                sonde.arret.set()
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    total = sum(len(v) for v in mesures.latences.values())
+    print(f"{args.matchs} matchs x {args.spectateurs} spectateurs, {duree:.1f} s, cadence {args.cadence} s")
+    print(f"Débit : {total / duree:8.1f} requêtes/s, {mesures.rallyes / duree:6.1f} rallyes/s")
+    print(f"{'Requête':12s} {'nombre':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'erreurs':>8s}")
+    toutes = []
+    for nature, latences in sorted(mesures.latences.items()):
+        toutes += latences
+        print(f"{nature:12s} {len(latences):8d} {_pct(latences, 0.5):8.1f} {_pct(latences, 0.99):8.1f} "
+              f"{max(latences) * 1000:8.1f} {mesures.erreurs[nature]:8d}")
+    if toutes:
+        print(f"{'(toutes)':12s} {len(toutes):8d} {_pct(toutes, 0.5):8.1f} {_pct(toutes, 0.99):8.1f} "
+              f"{max(toutes) * 1000:8.1f} {sum(mesures.erreurs.values()):8d}")
+    if sonde and sonde.cpu:
+        print(f"Serveur : CPU moyen {statistics.mean(sonde.cpu):.0f} % (max {max(sonde.cpu):.0f} %) d'un cœur, "
+              f"RSS max {max(sonde.rss) / 2**20:.1f} Mio")
+
+
+if __name__ == '__main__':
+    main()
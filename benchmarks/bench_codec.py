@@ -0,0 +1,100 @@
+"""
+Benchmark : encodage / décodage de l'état d'un match (codec.py).
+
+Compare, pour un état en cours de match (formations tournées, banc, bloc Libero) :
+  - l'ancien aller-retour JSON : formations en dictionnaires de fiches joueurs,
+    banc et roster complets dans l'état, clés entières rendues en texte par
+    JSON puis reconverties (clean_formations) ;
+  - le codec générique sur l'état sous forme de dictionnaire (parcours récursif) ;
+  - le codec d'EtatMatch (champs positionnels, sans parcours récursif), avec
+    json puis avec orjson s'il est installé.
+
+Rapporte le temps médian d'encodage et de décodage et la taille du texte produit.
+
+Usage : python benchmarks/bench_codec.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec
+import match_engine as engine
+from bench_state_updates import JOUEURS, etat_initial
+
+REPETITIONS = 2000
+NB_RALLYES = 37
+
+
+def etat_en_cours():
+    """État après quelques rallyes (rotations des deux équipes, changement de set)."""
+    journal = engine.MatchLog(dict(etat_initial(), match_setup_completed=True))
+    for i in range(NB_RALLYES):
+        journal.dispatch(engine.POINT, {'gagnant': 'VEEC' if i % 3 else 'ADVERSAIRE'})
+    return journal.state
+
+
+def etat_ancien_format(etat):
+    """Même état avec les fiches joueurs recopiées dans l'état (format d'avant le registre des effectifs)."""
+    fiches = {j['numero']: j for j in JOUEURS}
+    return {**etat.en_dict(),
+            'formation_actuelle': {pos: fiches[n] for pos, n in etat['formation_actuelle'].items()},
+            'formation_adverse_actuelle': {pos: {'numero': n, 'nom': f"Adv {n}"} for pos, n in etat['formation_adverse_actuelle'].items()},
+            'joueurs_banc': {n: fiches[n] for n in etat['joueurs_banc']}, 'joueurs_banc_adverse': {},
+            'JOUERS_VEEC': fiches}
+
+
+def _clean_formations(state):
+    # Ancienne conversion, à chaque callback, des clés texte produites par JSON
+    for cle in ('formation_actuelle', 'formation_adverse_actuelle', 'joueurs_banc'):
+        state[cle] = {int(k): v for k, v in state[cle].items()}
+    return state
+
+
+def mesurer(fonction, argument):
+    durees = []
+    for _ in range(REPETITIONS):
+        t0 = time.perf_counter()
+        fonction(argument)
+        durees.append(time.perf_counter() - t0)
+    return statistics.median(durees) * 1e6
+
+
+def main():
+    etat = etat_en_cours()
+    etat_dict = {**etat.en_dict(), 'formation_actuelle': etat['formation_actuelle'].to_dict(),
+                 'formation_adverse_actuelle': etat['formation_adverse_actuelle'].to_dict()}
+
+    variantes = [
+        ("JSON + clean_formations (ancien)", etat_ancien_format(etat),
+         lambda e: json.dumps(e, separators=(',', ':')),
+         lambda t: _clean_formations(json.loads(t))),
+        ("codec générique (dictionnaire)", etat.en_dict(),
+         lambda e: json.dumps(codec.encode_valeur(e), separators=(',', ':')),
+         lambda t: codec.decode_valeur(json.loads(t))),
+        ("codec EtatMatch + json", etat,
+         lambda e: json.dumps(codec.encode_valeur(e), separators=(',', ':')),
+         lambda t: codec.decode_valeur(json.loads(t))),
+    ]
+    if codec.orjson is not None:
+        variantes.append(("codec EtatMatch + orjson", etat,
+                          lambda e: codec.orjson.dumps(codec.encode_valeur(e)),
+                          lambda t: codec.decode_valeur(codec.orjson.loads(t))))
+    else:
+        print("orjson non installé : variante orjson ignorée")
+
+    print(f"{'Variante':34} {'encodage µs':>12} {'décodage µs':>12} {'octets':>8}")
+    for nom, valeur, encoder, decoder in variantes:
+        texte = encoder(valeur)
+        relu = decoder(texte)
+        if isinstance(valeur, engine.EtatMatch):
+            assert relu == valeur and isinstance(relu['formation_actuelle'], engine.Formation), nom
+        taille = len(texte.encode() if isinstance(texte, str) else texte)
+        print(f"{nom:34} {mesurer(encoder, valeur):12.1f} {mesurer(decoder, texte):12.1f} {taille:8d}")
+
+
+if __name__ == '__main__':
+    main()
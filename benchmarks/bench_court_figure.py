@@ -0,0 +1,53 @@
+"""
+Benchmark : coût de la figure du terrain, construction complète vs cache LRU.
+
+Rejoue un match aléatoire (points uniquement) et demande la figure du terrain
+après chaque rallye, comme le fait update_ui_scores. Affiche le coût moyen
+d'une construction (échec de cache) et d'une lecture (succès), puis les
+compteurs du cache.
+
+Usage : python benchmarks/bench_court_figure.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import match_engine as engine
+
+NB_RALLYES = 400
+GRAINE = 7
+
+
+def main():
+    random.seed(GRAINE)
+    app.COURT_FIGURE_CACHE.clear()
+    state = dict(app.initial_state, match_setup_completed=True)
+    journal = engine.MatchLog(state)
+    noms = app.EFFECTIFS.du_match(state).noms
+    libero_adverse = app.EFFECTIFS.adverse_du_match(state).libero
+
+    hits, misses = [], []
+    for _ in range(NB_RALLYES):
+        if journal.state['match_ended']:
+            break
+        journal.dispatch(engine.POINT, {'gagnant': random.choice(['VEEC', 'ADVERSAIRE'])})
+        s = journal.state
+        avant = app.COURT_FIGURE_CACHE.misses
+        t0 = time.perf_counter()
+        app.get_court_figure(s['formation_actuelle'], s['formation_adverse_actuelle'], s['service_actuel'], s['liberos_veec'], noms, libero_adverse)
+        duree = time.perf_counter() - t0
+        (misses if app.COURT_FIGURE_CACHE.misses > avant else hits).append(duree)
+
+    print(f"Construction (échec) : {statistics.mean(misses) * 1e6:9.1f} µs  ({len(misses)} appels)")
+    if hits:
+        print(f"Lecture (succès)     : {statistics.mean(hits) * 1e6:9.1f} µs  ({len(hits)} appels)")
+    print("Compteurs :", app.COURT_FIGURE_CACHE.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark : mémoire occupée par l'historique d'un match complet.
+
+Compare l'ancienne représentation (liste de dictionnaires, une entrée par
+action avec ses chaînes) au stockage en colonnes de historique.HistoriqueIndex.
+Le match simulé alterne points et statistiques jusqu'à la fin du match.
+
+Usage : python benchmarks/bench_historique_memory.py
+"""
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import match_engine as engine
+from bench_state_updates import NOMS, etat_initial
+from historique import HistoriqueIndex
+
+GRAINE = 11
+STATS_PAR_RALLYE = 2
+
+ACTIONS = [('ATK', 'FAUTE'), ('REC', 'POS'), ('REC', 'NEG'), ('DEF', 'OK'), ('SRV', 'FAUTE'), ('BLK', 'TOUCHE')]
+
+
+def journal_de_match():
+    random.seed(GRAINE)
+    journal = engine.MatchLog(dict(etat_initial(), match_setup_completed=True))
+    while not journal.state['match_ended']:
+        formation = journal.state['formation_actuelle']
+        for _ in range(STATS_PAR_RALLYE):
+            pos = random.randint(1, 6)
+            action_code, resultat = random.choice(ACTIONS)
+            journal.dispatch(engine.STAT, {'position': pos, 'numero': formation[pos], 'nom': NOMS[formation[pos]],
+                                           'action_code': action_code, 'resultat': resultat})
+        journal.dispatch(engine.POINT, {'gagnant': random.choice(['VEEC', 'ADVERSAIRE'])})
+    return journal
+
+
+def mesurer(construire):
+    gc.collect()
+    tracemalloc.start()
+    avant = tracemalloc.get_traced_memory()[0]
+    resultat = construire()
+    apres = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return resultat, apres - avant
+
+
+def main():
+    events = journal_de_match().events
+
+    lignes, octets_dicts = mesurer(lambda: engine.historique_records(events))
+
+    def colonnes():
+        index = HistoriqueIndex()
+        index.sync(events)
+        return index
+    index, octets_colonnes = mesurer(colonnes)
+
+    assert index.records() == lignes
+    print(f"Lignes d'historique      : {len(lignes)}")
+    print(f"Liste de dictionnaires   : {octets_dicts / 1024:8.1f} Kio ({octets_dicts / len(lignes):6.1f} o/ligne)")
+    print(f"Stockage en colonnes     : {octets_colonnes / 1024:8.1f} Kio ({octets_colonnes / len(lignes):6.1f} o/ligne)")
+    print(f"Réduction                : {100 * (1 - octets_colonnes / octets_dicts):.1f} %")
+
+
+if __name__ == '__main__':
+    main()
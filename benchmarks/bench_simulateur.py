@@ -0,0 +1,109 @@
+"""
+Benchmark : débit du moteur de règles et mémoire par match, via le simulateur.
+
+Joue NB_MATCHS matchs aléatoires (simulateur.simuler_match, graines fixes)
+et rapporte :
+  - le débit : rallyes/s et événements/s (médiane de REPETITIONS passes),
+  - le coût moyen d'une action par type d'événement (dispatch complet,
+    conséquences réglementaires comprises),
+  - la mémoire retenue par un match terminé (journal, snapshots, historique
+    d'annulation) et le pic pendant la simulation (tracemalloc).
+
+Avec --seuil, le script échoue (code 1) si le débit passe sous le seuil
+donné en rallyes/s : utilisable pour repérer une régression du chemin chaud.
+
+Usage : python benchmarks/bench_simulateur.py [--matchs N] [--seuil RALLYES_PAR_S]
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import match_engine as engine
+import simulateur
+
+NB_MATCHS = 100
+REPETITIONS = 3
+NB_MATCHS_MEMOIRE = 10
+
+
+def mesurer_debit(nb_matchs):
+    """Retourne (rallyes/s, événements/s, rallyes, événements) pour la passe médiane."""
+    passes = []
+    for _ in range(REPETITIONS):
+        t0 = time.perf_counter()
+        journaux = [simulateur.simuler_match(graine) for graine in range(nb_matchs)]
+        duree = time.perf_counter() - t0
+        rallyes = sum(simulateur.compter_rallyes(j.events) for j in journaux)
+        events = sum(len(j.events) for j in journaux)
+        passes.append((rallyes / duree, events / duree, rallyes, events))
+    return sorted(passes)[len(passes) // 2]
+
+
+def mesurer_actions(nb_matchs):
+    """Coût moyen d'un dispatch par type d'action, mesuré en enveloppant MatchLog.dispatch."""
+    durees = defaultdict(list)
+    dispatch = engine.MatchLog.dispatch
+
+    def dispatch_chronometre(self, event_type, *args, **kwargs):
+        t0 = time.perf_counter()
+        ajoutes = dispatch(self, event_type, *args, **kwargs)
+        durees[event_type].append(time.perf_counter() - t0)
+        return ajoutes
+
+    engine.MatchLog.dispatch = dispatch_chronometre
+    try:
+        for graine in range(nb_matchs):
+            simulateur.simuler_match(graine)
+    finally:
+        engine.MatchLog.dispatch = dispatch
+    return {t: (len(d), statistics.mean(d)) for t, d in sorted(durees.items(), key=lambda kv: -len(kv[1]))}
+
+
+def mesurer_memoire(nb_matchs):
+    """Retourne (octets retenus par match terminé, pic moyen pendant un match)."""
+    retenus, pics = [], []
+    for graine in range(nb_matchs):
+        gc.collect()
+        tracemalloc.start()
+        avant = tracemalloc.get_traced_memory()[0]
+        journal = simulateur.simuler_match(graine)
+        apres, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        retenus.append(apres - avant)
+        pics.append(pic - avant)
+        del journal
+    return statistics.mean(retenus), statistics.mean(pics)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--matchs', type=int, default=NB_MATCHS)
+    parser.add_argument('--seuil', type=float, help="Débit minimal attendu (rallyes/s)")
+    args = parser.parse_args(argv)
+
+    rallyes_s, events_s, rallyes, events = mesurer_debit(args.matchs)
+    print(f"{args.matchs} matchs : {rallyes} rallyes, {events} événements ({rallyes / args.matchs:.0f} rallyes/match)")
+    print(f"Débit                : {rallyes_s:10,.0f} rallyes/s   {events_s:10,.0f} événements/s")
+
+    print("Coût moyen par action (dispatch + conséquences) :")
+    for event_type, (n, moyenne) in mesurer_actions(min(args.matchs, 20)).items():
+        print(f"  {event_type:22s} {moyenne * 1e6:8.1f} µs  ({n} actions)")
+
+    retenu, pic = mesurer_memoire(NB_MATCHS_MEMOIRE)
+    print(f"Mémoire par match    : {retenu / 1024:8.1f} Kio retenus, pic {pic / 1024:8.1f} Kio")
+
+    if args.seuil is not None and rallyes_s < args.seuil:
+        print(f"RÉGRESSION : {rallyes_s:,.0f} rallyes/s < seuil {args.seuil:,.0f}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
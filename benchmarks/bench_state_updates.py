@@ -0,0 +1,104 @@
+"""
+Benchmark : coût d'un clic « point » (chargement + dispatch) en fonction de la
+longueur du match.
+
+Le score est maintenu à égalité (les points alternent) pour que le set ne se
+termine jamais et que chaque rallye provoque une rotation : c'est le pire cas
+pour la copie des formations. Avec le partage structurel, le coût par clic
+doit rester plat entre le rallye 1 et le rallye 250.
+
+Usage : python benchmarks/bench_state_updates.py
+"""
+import copy
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import match_engine as engine
+from match_store import MatchStore
+
+NB_RALLYES = 250
+REPETITIONS = 20
+FENETRES = [(1, 10), (120, 130), (241, 250)]
+
+JOUEURS = [{'numero': n, 'nom': f"Joueur {n}"} for n in (1, 3, 6, 7, 8, 9, 11, 12, 13, 15, 16)]
+NOMS = {j['numero']: j['nom'] for j in JOUEURS}
+
+
+def etat_initial():
+    return {
+        'formation_actuelle': {pos: JOUEURS[pos - 1]['numero'] for pos in range(1, 7)},
+        'joueurs_banc': [j['numero'] for j in JOUEURS[6:]],
+        'formation_adverse_actuelle': {pos: pos for pos in range(1, 7)},
+        'joueurs_banc_adverse': [],
+        'match_setup_completed': False,
+        'service_actuel': 'VEEC',
+        'score_veec': 0, 'score_adverse': 0, 'sets_veec': 0, 'sets_adverse': 0,
+        'current_set': 1, 'match_ended': False, 'match_winner': None,
+        'timeouts_veec': 0, 'timeouts_adverse': 0, 'sub_veec': 0, 'sub_adverse': 0,
+        'rotation_count': 0, 'service_choisi': True,
+        'start_time': time.time(), 'timer_end_time': 0, 'timer_type': None,
+        'sub_en_cours_team': None, 'temp_sub_state': {},
+        'liberos_veec': {
+            'actif_numero': 7, 'is_on_court': False, 'starter_numero_replaced': None, 'current_pos_on_court': None,
+            'reserve_numero': 9, 'is_reserve_used': False, 'reserve_can_swap_in': False, 'libero_spot_starter_numero': 6,
+        },
+    }
+
+
+def mesurer_match():
+    """Retourne la durée (s) de chaque clic, indexée par numéro de rallye (1..NB_RALLYES)."""
+    store = MatchStore()
+    match_id = store.create(etat_initial())['match_id']
+    state = store.load(match_id)
+    store.dispatch(match_id, engine.SETUP, {'formation': state['formation_actuelle'], 'banc': state['joueurs_banc']})
+
+    durees = []
+    for rallye in range(1, NB_RALLYES + 1):
+        gagnant = 'ADVERSAIRE' if rallye % 2 else 'VEEC'
+        debut = time.perf_counter()
+        store.load(match_id) # Comme un callback : lecture de l'état...
+        store.dispatch(match_id, engine.POINT, {'gagnant': gagnant}) # ...puis enregistrement de l'action
+        durees.append(time.perf_counter() - debut)
+    assert not store.load(match_id)['match_ended']
+    return durees
+
+
+def mesurer_deepcopy_historique():
+    """Référence : ancienne approche (deepcopy de l'état complet, historique inclus) à chaque clic."""
+    state = etat_initial()
+    state['historique_stats'] = []
+    durees = []
+    for rallye in range(1, NB_RALLYES + 1):
+        debut = time.perf_counter()
+        new_state = copy.deepcopy(state)
+        new_state['historique_stats'].insert(0, {
+            'timestamp': '12:00:00', 'set': 1, 'score': f"{rallye}-{rallye}",
+            'position': 1, 'joueur_nom': 'Joueur 1', 'action_code': 'ATK', 'resultat': 'KILL',
+        })
+        state = new_state
+        durees.append(time.perf_counter() - debut)
+    return durees
+
+
+def resume(nom, mesures):
+    par_rallye = [statistics.median(m[i] for m in mesures) for i in range(NB_RALLYES)]
+    colonnes = []
+    for debut, fin in FENETRES:
+        colonnes.append(statistics.median(par_rallye[debut - 1:fin]) * 1e6)
+    ratio = colonnes[-1] / colonnes[0]
+    print(f"{nom:<32}" + "".join(f"{c:>17.1f}" for c in colonnes) + f"{ratio:>10.2f}x")
+
+
+def main():
+    print(f"Coût médian par clic (µs), {REPETITIONS} matchs de {NB_RALLYES} rallyes")
+    print(f"{'':<32}" + "".join(f"{f'rallyes {d}-{f}':>17}" for d, f in FENETRES) + f"{'fin/début':>11}")
+    resume("partage structurel (actuel)", [mesurer_match() for _ in range(REPETITIONS)])
+    resume("deepcopy + historique (ancien)", [mesurer_deepcopy_historique() for _ in range(REPETITIONS)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Vérification : affichage anticipé des points (callbacks clientside 1.3 et 1.4 d'app.py).
+
+Exécute sous node les fonctions JavaScript enregistrées par l'application,
+sur des figures du terrain construites par get_court_figure, en rejouant ce
+que ferait le navigateur (sorties appliquées aux propriétés, puis callback
+suivant) :
+  - point sans changement de service et point avec changement de service
+    (rotation, ballon) : l'affichage anticipé est comparé propriété par
+    propriété (court_trace_props) au rendu du serveur après le point, et les
+    empreintes effacées doivent être renvoyées par le patch du serveur ;
+  - confirmation : une nouvelle version du match efface le point en attente,
+    sans toucher à l'affichage ; la même version ne change rien ;
+  - refus (point-refuse) : score, figure et empreintes d'avant le clic sont
+    rétablis, y compris après deux clics non confirmés ;
+  - échéance : sans réponse, rien ne change avant l'échéance et l'affichage
+    d'avant le clic est rétabli au premier tick suivant.
+
+Toute divergence lève une AssertionError. Nécessite node (ignoré sinon).
+
+Usage : python benchmarks/verifier_affichage_anticipe.py
+"""
+import copy
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import match_engine as engine
+
+NO_UPDATE = {'__no_update__': True}
+
+# Charge les fonctions clientside de l'application puis exécute un appel lu sur l'entrée standard
+NODE_HARNAIS = """
+var entree = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+var window = globalThis.window = {'dash_clientside': {'no_update': {'__no_update__': true}}};
+entree.scripts.forEach(function(script) { eval(script); });
+window.dash_clientside.callback_context = {'triggered': [{'prop_id': entree.declencheur, 'value': 1}]};
+if (entree.maintenant !== null) { Date.now = function() { return entree.maintenant; }; }
+var fonction = window.dash_clientside._dashprivate_clientside_funcs[entree.fonction];
+process.stdout.write(JSON.stringify(fonction.apply(null, entree.arguments)));
+"""
+
+
+def fonction_clientside(premiere_entree, sortie):
+    """Nom (empreinte) de la fonction clientside dont la première entrée et une sortie sont données."""
+    for callback in app.app._callback_list:
+        fonction = callback.get('clientside_function')
+        if fonction and callback['inputs'][0]['id'] == premiere_entree and sortie in callback['output']:
+            return fonction['function_name']
+    raise LookupError(f"Aucun callback clientside {premiere_entree} -> {sortie}")
+
+
+def executer(fonction, declencheur, arguments, maintenant=None):
+    entree = {'scripts': app.app._inline_scripts, 'fonction': fonction, 'declencheur': declencheur,
+              'arguments': arguments, 'maintenant': maintenant}
+    sortie = subprocess.run(['node', '-e', NODE_HARNAIS], input=json.dumps(entree), capture_output=True,
+                            text=True, check=True)
+    return json.loads(sortie.stdout)
+
+
+class Navigateur:
+    """Propriétés du navigateur lues et écrites par les callbacks 1.3 et 1.4."""
+
+    def __init__(self, state, version):
+        entree = rendu_serveur(state)
+        self.scores = [str(state['score_veec']), str(state['score_adverse'])]
+        self.figure = copy.deepcopy(entree['figure'])
+        self.signature = dict(entree['signature'])
+        self.attente = None
+        self.match_ref = {'match_id': 'verification', 'version': version}
+        self.clic_point = fonction_clientside('btn-point-veec', 'point-optimiste')
+        self.confirmation = fonction_clientside('match-state', 'point-optimiste')
+
+    def affichage(self):
+        return copy.deepcopy((self.scores, self.figure['data'], self.signature))
+
+    def _appliquer(self, sorties):
+        score_veec, score_adverse, figure, signature, attente = sorties
+        if score_veec != NO_UPDATE:
+            self.scores = [score_veec, score_adverse]
+        if figure != NO_UPDATE:
+            self.figure = figure
+        if signature != NO_UPDATE:
+            self.signature = signature
+        if attente != NO_UPDATE:
+            self.attente = attente
+        return sorties
+
+    def clic(self, gagnant):
+        bouton = 'btn-point-veec' if gagnant == 'VEEC' else 'btn-point-adverse'
+        return self._appliquer(executer(self.clic_point, f'{bouton}.n_clicks', [
+            1, 1, self.scores[0], self.scores[1], self.figure, self.signature, self.attente, self.match_ref, []]))
+
+    def _callback_14(self, declencheur, maintenant=None):
+        return self._appliquer(executer(self.confirmation, declencheur, [
+            self.match_ref, {'message': 'refus'}, 1, self.attente, self.figure], maintenant))
+
+    def nouvelle_version(self, version):
+        self.match_ref = {'match_id': 'verification', 'version': version}
+        return self._callback_14('match-state.data')
+
+    def refus(self):
+        return self._callback_14('point-refuse.data')
+
+    def tick(self, maintenant_ms):
+        return self._callback_14('interval-component.n_intervals', maintenant_ms)
+
+
+def rendu_serveur(state):
+    return app.get_court_figure(state['formation_actuelle'], state['formation_adverse_actuelle'],
+                                state['service_actuel'], state['liberos_veec'], app.EFFECTIFS.du_match(state).noms,
+                                app.EFFECTIFS.adverse_du_match(state).libero)
+
+
+def valeur(data, trace, chemin):
+    cible = data[app.COURT_TRACE_INDEX[trace]]
+    for partie in chemin.split('.'):
+        cible = cible[partie]
+    return cible
+
+
+def verifier_prediction(navigateur, journal, gagnant):
+    """Un clic, comparé au rendu du serveur après le même point."""
+    signature_avant = dict(navigateur.signature)
+    navigateur.clic(gagnant)
+    journal.dispatch(engine.POINT, {'gagnant': gagnant})
+    state = journal.state
+    serveur = rendu_serveur(state)
+
+    assert navigateur.scores == [str(state['score_veec']), str(state['score_adverse'])], navigateur.scores
+    for trace, proprietes in serveur['props'].items():
+        for chemin, attendu in proprietes.items():
+            obtenu = valeur(navigateur.figure['data'], trace, chemin)
+            assert obtenu == attendu, f"{gagnant} : {trace}|{chemin} = {obtenu}, serveur : {attendu}"
+    # Empreintes effacées : le patch du serveur renverra ces propriétés même si elles n'ont pas changé
+    effacees = [cle for cle, crc in navigateur.signature.items() if crc is None]
+    assert all(cle in serveur['signature'] for cle in effacees), effacees
+    assert all(navigateur.signature[cle] == crc for cle, crc in signature_avant.items() if cle not in effacees)
+    patch = app.create_court_figure_patch(serveur, navigateur.signature)
+    if effacees:
+        assert patch is not None
+    return effacees
+
+
+def main():
+    if shutil.which('node') is None:
+        print("node non installé : vérification ignorée")
+        return
+
+    journal = engine.MatchLog(app.initial_state)
+    state = journal.state
+    journal.dispatch(engine.SETUP, {'formation': state['formation_actuelle'], 'banc': state['joueurs_banc']})
+    version = 1
+    navigateur = Navigateur(journal.state, version)
+    assert journal.state['service_actuel'] == 'VEEC'
+
+    # Point sans changement de service, puis confirmation par le serveur
+    effacees = verifier_prediction(navigateur, journal, 'VEEC')
+    assert effacees == [], effacees
+    assert navigateur.nouvelle_version(version) == [NO_UPDATE] * 5 # Même version : point toujours en attente
+    version += 1
+    assert navigateur.nouvelle_version(version) == [NO_UPDATE] * 4 + [None]
+    assert navigateur.attente is None
+    print("point sans changement de service : prédiction = serveur, confirmation OK")
+
+    # Point avec changement de service : rotation adverse et ballon
+    effacees = verifier_prediction(navigateur, journal, 'ADVERSAIRE')
+    assert 'adverse|text' in effacees and 'service|x' in effacees, effacees
+    version += 1
+    navigateur.nouvelle_version(version)
+    print("point avec changement de service : prédiction = serveur, confirmation OK")
+
+    # Refus après deux clics non confirmés : retour à l'affichage d'avant le premier
+    avant = navigateur.affichage()
+    navigateur.clic('VEEC')
+    navigateur.clic('VEEC')
+    assert navigateur.affichage() != avant and navigateur.attente is not None
+    navigateur.refus()
+    assert navigateur.affichage() == avant and navigateur.attente is None
+    assert navigateur.refus() == [NO_UPDATE] * 5 # Plus rien en attente
+    print("point refusé : affichage d'avant le clic rétabli")
+
+    # Sans réponse : rien avant l'échéance, affichage rétabli au premier tick suivant
+    navigateur.clic('ADVERSAIRE')
+    echeance = navigateur.attente['echeance']
+    assert navigateur.tick(echeance - 1) == [NO_UPDATE] * 5
+    navigateur.tick(echeance)
+    assert navigateur.affichage() == avant and navigateur.attente is None
+    print("point sans réponse : affichage d'avant le clic rétabli à l'échéance")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Codec des états et des données d'événements (journal durable, backends d'état).
+
+JSON seul perd les types : les clés entières (positions, numéros de maillot)
+deviennent du texte et les formations des dictionnaires. Ce codec les
+encode explicitement pour les relire à l'identique :
+
+  - EtatMatch : {'__etat__': [VERSION_ETAT, valeur du 1er champ, ...]}, dans
+    l'ordre de CHAMPS_ETAT (aucun nom de champ répété dans la charge) ;
+  - Formation : {'__formation__': [6 numéros dans l'ordre de départ], 'offset': n} ;
+  - dictionnaire à clés non textuelles : {'__items__': [[clé, valeur], ...]}.
+
+L'état d'un match est encodé champ par champ, sans parcours récursif
+générique : il ne contient que des numéros de joueurs (les fiches sont dans
+le registre des équipes). dumps()/loads() utilisent orjson s'il est
+installé (dépendance optionnelle), sinon le module json ; le texte produit
+est le même JSON compact dans les deux cas.
+"""
+import json
+
+from match_engine import CHAMPS_ETAT, EtatMatch, Formation
+
+try:
+    import orjson
+except ImportError: # json de la bibliothèque standard : même format, plus lent
+    orjson = None
+
+VERSION_ETAT = 1 # À incrémenter si les champs d'EtatMatch changent d'ordre ou de sens
+
+_FORMATIONS = frozenset(('formation_actuelle', 'formation_adverse_actuelle'))
+_BANCS = frozenset(('joueurs_banc', 'joueurs_banc_adverse'))
+
+
+# --- Formations ---
+
+def _encode_formation(formation):
+    return {'__formation__': list(formation.joueurs), 'offset': formation.offset}
+
+
+# Encodeur par champ d'EtatMatch (dans l'ordre de CHAMPS_ETAT)
+_ENCODEURS_ETAT = tuple(_encode_formation if nom in _FORMATIONS else None for nom in CHAMPS_ETAT)
+
+
+def _encode_etat(etat):
+    return {'__etat__': [VERSION_ETAT] + [valeur if encodeur is None else encodeur(valeur)
+                                          for encodeur, valeur in zip(_ENCODEURS_ETAT, etat.valeurs())]}
+
+
+def _decode_etat(valeurs):
+    version, *valeurs = valeurs
+    if version != VERSION_ETAT:
+        raise ValueError(f"Version d'état inconnue : {version} (attendue : {VERSION_ETAT})")
+    for i, nom in enumerate(CHAMPS_ETAT):
+        if nom in _FORMATIONS:
+            valeurs[i] = Formation(valeurs[i]['__formation__'], valeurs[i]['offset'])
+        elif nom in _BANCS:
+            valeurs[i] = tuple(valeurs[i])
+    return EtatMatch(*valeurs)
+
+
+# --- Valeurs quelconques (données d'événements, état d'interface, commandes) ---
+
+def encode_valeur(valeur):
+    if isinstance(valeur, EtatMatch):
+        return _encode_etat(valeur)
+    if isinstance(valeur, Formation):
+        return _encode_formation(valeur)
+    if isinstance(valeur, dict):
+        if all(isinstance(k, str) for k in valeur):
+            return {k: encode_valeur(v) for k, v in valeur.items()}
+        return {'__items__': [[k, encode_valeur(v)] for k, v in valeur.items()]}
+    if isinstance(valeur, (list, tuple)):
+        return [encode_valeur(v) for v in valeur]
+    return valeur
+
+
+def decode_valeur(valeur):
+    if isinstance(valeur, dict):
+        if '__etat__' in valeur:
+            return _decode_etat(valeur['__etat__'])
+        if '__formation__' in valeur:
+            return Formation(valeur['__formation__'], valeur['offset'])
+        if '__items__' in valeur:
+            return {k: decode_valeur(v) for k, v in valeur['__items__']}
+        return {k: decode_valeur(v) for k, v in valeur.items()}
+    if isinstance(valeur, list):
+        return [decode_valeur(v) for v in valeur]
+    return valeur
+
+
+# --- Texte JSON ---
+
+def dumps(valeur):
+    """Texte JSON compact de `valeur` (str)."""
+    if orjson is not None:
+        return orjson.dumps(encode_valeur(valeur)).decode()
+    return json.dumps(encode_valeur(valeur), separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(texte):
+    """Relit un texte (str ou bytes) produit par dumps()."""
+    return decode_valeur(orjson.loads(texte) if orjson is not None else json.loads(texte))
@@ -0,0 +1,223 @@
+"""
+Direct spectateurs : flux Server-Sent Events par match, en lecture seule.
+
+Un spectateur (parents, entraîneurs, écran du club) n'ouvre pas l'application
+Dash : la page GET /spectateur/<match_id> s'abonne au flux
+GET /direct/<match_id> (text/event-stream) et reçoit score, sets, service,
+rotation VEEC, Libero et minuterie à chaque changement.
+
+Diffusion : un seul producteur par match (thread démarré au premier abonné,
+arrêté après le départ du dernier). À chaque nouvelle version du match, il
+calcule l'état spectateur et le sérialise UNE fois ; le message est publié
+dans un canal (dernier message + numéro de séquence + Condition) et chaque
+abonné renvoie simplement ces octets. Un abonné en retard saute directement
+au dernier état (ce sont des instantanés, pas des deltas). Le coût par
+changement ne dépend donc pas du nombre de spectateurs, hors écriture réseau.
+
+Le producteur est réveillé immédiatement par les écritures de ce processus
+(MatchStore.observer) et vérifie aussi la version toutes les
+INTERVALLE_VERIFICATION secondes, pour les écritures faites par un autre
+worker (backend d'état partagé).
+"""
+import json
+import threading
+import time
+
+import flask
+
+from match_engine import (
+    LONG_BREAK_DURATION_SECONDS, POSITIONS, SHORT_BREAK_DURATION_SECONDS, TIMEOUT_DURATION_SECONDS,
+)
+
+INTERVALLE_VERIFICATION = 0.5
+BATTEMENT_SECONDES = 15.0 # Commentaire SSE périodique : garde la connexion ouverte, détecte les départs
+ARRET_PRODUCTEUR_SECONDES = 30.0 # Sans abonné depuis ce délai, le producteur s'arrête
+
+
+def etat_spectateur(state):
+    """Vue publique d'un match (aucun état d'interface) : ce qui est envoyé aux spectateurs."""
+    formation = state['formation_actuelle']
+    liberos = state.get('liberos_veec') or {}
+    timer_type = state.get('timer_type')
+    if timer_type == 'TIMEOUT':
+        duree = TIMEOUT_DURATION_SECONDS
+    else:
+        duree = LONG_BREAK_DURATION_SECONDS if state['current_set'] == 5 else SHORT_BREAK_DURATION_SECONDS
+    return {
+        'score_veec': state['score_veec'], 'score_adverse': state['score_adverse'],
+        'sets_veec': state['sets_veec'], 'sets_adverse': state['sets_adverse'],
+        'set': state['current_set'],
+        'service': state['service_actuel'],
+        'rotation': [formation[pos] for pos in POSITIONS], # P1 à P6
+        'libero_position': liberos.get('current_pos_on_court') if liberos.get('is_on_court') else None,
+        'temps_morts': [state['timeouts_veec'], state['timeouts_adverse']],
+        'minuterie': {'type': timer_type, 'fin': state.get('timer_end_time') or 0, 'duree': duree} if timer_type else None,
+        'commence': bool(state.get('match_setup_completed')),
+        'termine': state['match_ended'], 'vainqueur': state['match_winner'],
+    }
+
+
+class _Canal:
+    """Dernier message d'un match, partagé par tous ses abonnés."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.message = None
+        self.vue = None
+        self.seq = 0
+        self.abonnes = 0
+        self.dernier_depart = time.monotonic()
+        self.reveil = threading.Event()
+        self.actif = True
+
+    def publier(self, message):
+        with self.condition:
+            self.message = message
+            self.seq += 1
+            self.condition.notify_all()
+
+
+class DiffusionMatchs:
+    """Producteurs SSE par match, à installer sur le serveur Flask de l'application Dash."""
+
+    def __init__(self, store, intervalle=INTERVALLE_VERIFICATION, battement=BATTEMENT_SECONDES):
+        self.store = store
+        self.intervalle = intervalle
+        self.battement = battement
+        self._lock = threading.Lock()
+        self._canaux = {}
+        store.observer(self._signaler)
+
+    def installer(self, server):
+        server.add_url_rule('/direct/<match_id>', 'veec_direct', self._flux)
+        server.add_url_rule('/spectateur/<match_id>', 'veec_spectateur', self._page)
+
+    # --- Producteur (un par match) ---
+
+    def _signaler(self, match_id):
+        canal = self._canaux.get(match_id)
+        if canal is not None:
+            canal.reveil.set()
+
+    def _canal(self, match_id):
+        with self._lock:
+            canal = self._canaux.get(match_id)
+            if canal is None or not canal.actif:
+                canal = _Canal()
+                version = self._produire_une_fois(match_id, canal, None) # Premier abonné : état courant immédiat
+                self._canaux[match_id] = canal
+                threading.Thread(target=self._producteur, args=(match_id, canal, version),
+                                 name=f"veec-direct-{match_id}", daemon=True).start()
+            canal.abonnes += 1
+            return canal
+
+    def _produire_une_fois(self, match_id, canal, version_publiee):
+        version = self.store.version(match_id)
+        if version == version_publiee:
+            return version
+        vue = etat_spectateur(self.store.load(match_id))
+        if vue != canal.vue: # Changement d'interface seul : rien à diffuser
+            canal.vue = vue
+            corps = json.dumps({**vue, 'match_id': match_id, 'version': version, 'horodatage': time.time()},
+                               separators=(',', ':'))
+            canal.publier(f"id: {version}\nevent: etat\ndata: {corps}\n\n".encode())
+        return version
+
+    def _producteur(self, match_id, canal, version):
+        while True:
+            canal.reveil.wait(self.intervalle)
+            canal.reveil.clear()
+            with self._lock:
+                if canal.abonnes == 0 and time.monotonic() - canal.dernier_depart > ARRET_PRODUCTEUR_SECONDES:
+                    canal.actif = False
+                    del self._canaux[match_id]
+                    return
+            try:
+                version = self._produire_une_fois(match_id, canal, version)
+            except KeyError: # Match inconnu (supprimé du backend)
+                continue
+
+    # --- Abonnés ---
+
+    def _flux(self, match_id):
+        try:
+            canal = self._canal(match_id)
+        except KeyError:
+            flask.abort(404)
+
+        def evenements():
+            # Heure du serveur, pour les comptes à rebours (seul message propre à chaque abonné)
+            yield f"event: horloge\ndata: {time.time():.3f}\n\n".encode()
+            seq = 0
+            while True:
+                with canal.condition:
+                    canal.condition.wait_for(lambda: canal.seq != seq, timeout=self.battement)
+                    message, nouveau = canal.message, canal.seq
+                if nouveau != seq:
+                    seq = nouveau
+                    yield message
+                else:
+                    yield b": battement\n\n"
+
+        def depart(): # Connexion fermée (appelé par le serveur WSGI)
+            with self._lock:
+                canal.abonnes -= 1
+                canal.dernier_depart = time.monotonic()
+
+        response = flask.Response(evenements(), mimetype='text/event-stream',
+                                  headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        response.call_on_close(depart)
+        return response
+
+    def _page(self, match_id):
+        match_id_js = json.dumps(match_id).replace('<', '\\u003c') # Pas de '</script>' injecté par l'URL
+        return flask.Response(PAGE_SPECTATEUR.replace('__MATCH_ID__', match_id_js), mimetype='text/html')
+
+    def abonnes(self):
+        """Nombre d'abonnés par match (supervision)."""
+        with self._lock:
+            return {match_id: canal.abonnes for match_id, canal in self._canaux.items()}
+
+
+# Page autonome (sans Dash) : tableau de score alimenté par EventSource, compte à rebours local
+PAGE_SPECTATEUR = """<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>VEEC - Direct</title>
+<style>
+body { font-family: sans-serif; text-align: center; margin: 0; padding: 20px; background: #f4f4f4; color: #333; }
+.score { font-size: 5em; font-weight: 900; } .veec { color: #007bff; } .adv { color: #dc3545; }
+.sets { font-size: 2em; margin: 10px 0; } .info { font-size: 1.2em; margin: 8px 0; }
+#etat { color: #888; font-size: 0.9em; }
+</style></head>
+<body>
+<div class="info">Set <span id="set">-</span> &middot; service <span id="service">-</span></div>
+<div class="score"><span class="veec" id="score_veec">0</span> : <span class="adv" id="score_adverse">0</span></div>
+<div class="sets">Sets <span class="veec" id="sets_veec">0</span> - <span class="adv" id="sets_adverse">0</span></div>
+<div class="info">Rotation VEEC (P1 à P6) : <span id="rotation">-</span></div>
+<div class="info" id="minuterie"></div>
+<div class="info" id="fin"></div>
+<div id="etat">Connexion...</div>
+<script>
+var matchId = __MATCH_ID__, dernier = null, decalage = 0; // decalage : heure serveur - heure locale (ms)
+function texte(id, valeur) { document.getElementById(id).textContent = valeur; }
+function afficher(e) {
+  dernier = e;
+  ['set', 'service', 'score_veec', 'score_adverse', 'sets_veec', 'sets_adverse'].forEach(function (c) { texte(c, e[c]); });
+  texte('rotation', e.rotation.map(function (n, i) { return (i + 1 === e.libero_position ? 'L' : '') + n; }).join(' - '));
+  texte('fin', e.termine ? 'Match terminé : victoire ' + e.vainqueur : '');
+  tic();
+}
+function tic() {
+  var m = dernier && dernier.minuterie, reste = m ? Math.ceil(m.fin - (Date.now() + decalage) / 1000) : 0;
+  texte('minuterie', reste > 0 ? (m.type === 'TIMEOUT' ? 'Temps mort : ' : 'Pause : ') + reste + ' s' : '');
+}
+setInterval(tic, 1000);
+var source = new EventSource('/direct/' + encodeURIComponent(matchId));
+source.addEventListener('horloge', function (ev) { decalage = parseFloat(ev.data) * 1000 - Date.now(); });
+source.addEventListener('etat', function (ev) { afficher(JSON.parse(ev.data)); });
+source.onopen = function () { texte('etat', 'En direct'); };
+source.onerror = function () { texte('etat', 'Reconnexion...'); };
+</script>
+</body></html>
+"""
@@ -0,0 +1,269 @@
+"""
+Registre des équipes : effectifs (VEEC et adversaires) partagés par tous les matchs.
+
+L'état d'un match ne désigne les joueurs que par leur numéro (formations,
+banc, Liberos) et référence chaque équipe par (nom, version). Les fiches
+(numéro, nom) restent en mémoire, partagées par tous les matchs du
+processus (un tournoi, plusieurs terrains) : elles ne sont plus recopiées à
+chaque action (copies d'état, journal durable, backend partagé).
+
+Sources : des effectifs intégrés (enregistrer()) et, optionnellement, un
+fichier ou un répertoire de fichiers (VEEC_EFFECTIFS) :
+
+  - YAML (.yaml, .yml) ou JSON (.json) : {nom: définition}, voir RegistreEffectifs ;
+  - CSV (.csv) : une ligne par joueur, colonnes numero, nom et, optionnelles,
+    equipe (nom de l'équipe, sinon le nom du fichier) et role ('libero',
+    'libero_reserve' ou 'libero_titulaire'). Séparateur ',' ou ';'.
+
+Une équipe définie dans un fichier remplace l'effectif intégré de même nom.
+Les fichiers sont relus à la demande : au plus une vérification toutes les
+INTERVALLE_VERIFICATION secondes (date de modification et taille de chaque
+fichier), et seuls les fichiers modifiés sont analysés de nouveau. Ajouter
+une équipe ou corriger un effectif ne demande donc aucun redémarrage ; un
+fichier invalide est signalé et son contenu précédent conservé.
+
+La version d'un effectif est une empreinte de son contenu : identique dans
+tous les workers, elle change dès qu'un joueur est ajouté, retiré ou
+renommé. Les versions précédentes restent disponibles, pour qu'un match en
+cours garde l'effectif avec lequel il a commencé.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+try:
+    import yaml
+except ImportError: # PyYAML absent : seuls les fichiers CSV et JSON sont lus
+    yaml = None
+
+INTERVALLE_VERIFICATION = 1.0 # Secondes entre deux vérifications des fichiers d'effectifs
+EXTENSIONS = ('.yaml', '.yml', '.json', '.csv')
+ROLES_LIBERO = ('libero', 'libero_reserve', 'libero_titulaire')
+
+# Fichier illisible ou définition invalide : le fichier est ignoré, sans interrompre le serveur
+_ERREURS_LECTURE = (OSError, ValueError, KeyError, TypeError, csv.Error) + ((yaml.YAMLError,) if yaml else ())
+
+
+def version_effectif(definition):
+    """Empreinte du contenu d'un effectif (12 caractères hexadécimaux)."""
+    texte = json.dumps(definition, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(texte.encode()).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class Effectif:
+    """
+    Version figée d'un effectif. Les 6 premiers joueurs forment la formation
+    de départ proposée, les suivants le banc.
+    """
+    nom: str
+    version: str
+    joueurs: tuple # Fiches {'numero', 'nom'}, dans l'ordre de la définition
+    libero: int | None = None
+    libero_reserve: int | None = None
+    libero_titulaire: int | None = None # Titulaire que le Libero remplace habituellement
+    fiches: dict = field(init=False, repr=False, compare=False) # {numéro: fiche}
+    noms: dict = field(init=False, repr=False, compare=False) # {numéro: nom}
+
+    def __post_init__(self):
+        object.__setattr__(self, 'fiches', {j['numero']: j for j in self.joueurs})
+        object.__setattr__(self, 'noms', {j['numero']: j['nom'] for j in self.joueurs})
+
+    @property
+    def numeros(self):
+        return tuple(j['numero'] for j in self.joueurs)
+
+    def fiche(self, numero):
+        return self.fiches.get(numero)
+
+    def nom_de(self, numero, defaut='N/A'):
+        return self.noms.get(numero, defaut)
+
+    def reference(self, suffixe=''):
+        """Champs d'état désignant cette version de l'effectif ('_adverse' pour l'adversaire)."""
+        return {f'effectif{suffixe}': self.nom, f'version_effectif{suffixe}': self.version}
+
+
+# --- Lecture des fichiers ---
+
+def _lire_csv(texte, equipe_par_defaut):
+    premiere_ligne = texte.split('\n', 1)[0]
+    lignes = csv.DictReader(io.StringIO(texte), delimiter=';' if ';' in premiere_ligne else ',')
+    definitions = {}
+    for ligne in lignes:
+        ligne = {(cle or '').strip().lower(): (valeur or '').strip() for cle, valeur in ligne.items()}
+        if not ligne.get('numero'):
+            continue # Ligne vide
+        equipe = definitions.setdefault(ligne.get('equipe') or equipe_par_defaut, {'joueurs': []})
+        equipe['joueurs'].append({'numero': ligne['numero'], 'nom': ligne.get('nom', '')})
+        role = ligne.get('role', '').lower()
+        if role in ROLES_LIBERO:
+            equipe[role] = ligne['numero']
+        elif role:
+            raise ValueError(f"Rôle inconnu {role!r} (N°{ligne['numero']}) : {', '.join(ROLES_LIBERO)} attendu")
+    return definitions
+
+
+def lire_fichier(chemin):
+    """Définitions {nom: définition} d'un fichier d'effectifs (YAML, JSON ou CSV)."""
+    extension = os.path.splitext(chemin)[1].lower()
+    with open(chemin, encoding='utf-8-sig') as f: # -sig : CSV enregistrés par Excel
+        texte = f.read()
+    if extension == '.csv':
+        return _lire_csv(texte, os.path.splitext(os.path.basename(chemin))[0])
+    if extension in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ValueError("PyYAML n'est pas installé (pip install pyyaml)")
+        definitions = yaml.safe_load(texte) or {}
+    else:
+        definitions = json.loads(texte)
+    if not isinstance(definitions, dict):
+        raise ValueError("Dictionnaire {équipe: définition} attendu")
+    return {str(nom): definition for nom, definition in definitions.items()}
+
+
+def _signatures(chemin):
+    """{fichier: (date de modification, taille)} des fichiers d'effectifs sous `chemin` (fichier ou répertoire)."""
+    if not os.path.isdir(chemin):
+        try:
+            stat = os.stat(chemin)
+        except FileNotFoundError:
+            return {}
+        return {chemin: (stat.st_mtime_ns, stat.st_size)}
+    signatures = {}
+    with os.scandir(chemin) as entrees:
+        for entree in entrees:
+            if entree.is_file() and os.path.splitext(entree.name)[1].lower() in EXTENSIONS:
+                stat = entree.stat()
+                signatures[entree.path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+# --- Registre ---
+
+class RegistreEffectifs:
+    """
+    Effectifs par nom d'équipe (index équipe -> version -> numéro), toutes
+    versions connues de ce processus.
+
+    Définition d'un effectif (dictionnaire, comme dans les fichiers YAML/JSON) :
+      {"joueurs": [{"numero": 1, "nom": "..."}, ...], "libero": 7, "libero_reserve": 9, "libero_titulaire": 6}
+    """
+
+    def __init__(self, defaut, defaut_adverse=None, chemin=None, intervalle=INTERVALLE_VERIFICATION):
+        self.defaut = defaut # Équipe utilisée si le nom demandé est inconnu
+        self.defaut_adverse = defaut_adverse or defaut
+        self.chemin = chemin # Fichier ou répertoire d'effectifs (None : effectifs intégrés seulement)
+        self.intervalle = intervalle
+        self._integres = {} # {nom: définition} (enregistrer)
+        self._fichiers = {} # {fichier: (signature, {nom: définition})}
+        self._courants = {} # {nom: Effectif} (version courante)
+        self._versions = {} # {(nom, version): Effectif}
+        self._lock = threading.Lock()
+        self._lock_fichiers = threading.Lock()
+        self._prochaine_verification = 0.0
+
+    def _effectif(self, nom, definition):
+        """Effectif (mémorisé par version) d'une définition ; à appeler sous self._lock."""
+        joueurs = tuple({'numero': int(j['numero']), 'nom': str(j['nom'])} for j in definition['joueurs'])
+        if len({j['numero'] for j in joueurs}) != len(joueurs):
+            raise ValueError(f"Effectif {nom!r} : numéro de joueur en double")
+        liberos = {cle: None if definition.get(cle) in (None, '') else int(definition[cle]) for cle in ROLES_LIBERO}
+        version = version_effectif({'joueurs': joueurs, **liberos})
+        effectif = self._versions.get((nom, version))
+        if effectif is None:
+            effectif = self._versions[(nom, version)] = Effectif(nom, version, joueurs, **liberos)
+        return effectif
+
+    def enregistrer(self, nom, definition):
+        """Ajoute ou met à jour un effectif intégré ; retourne sa version courante."""
+        with self._lock:
+            effectif = self._effectif(nom, definition)
+            self._integres[nom] = definition
+            if not any(nom in definitions for _, definitions in self._fichiers.values()):
+                self._courants[nom] = effectif # Sinon, le fichier a priorité
+        return effectif
+
+    def rafraichir(self, forcer=False):
+        """
+        Relit les fichiers ajoutés, modifiés ou supprimés depuis la dernière
+        vérification (au plus une toutes les `intervalle` secondes, sauf `forcer`).
+        Retourne True si les effectifs courants ont changé.
+        """
+        if self.chemin is None:
+            return False
+        maintenant = time.monotonic()
+        if not forcer and maintenant < self._prochaine_verification:
+            return False
+        # Une seule vérification à la fois : les autres requêtes gardent les effectifs actuels
+        if not self._lock_fichiers.acquire(blocking=forcer):
+            return False
+        try:
+            self._prochaine_verification = maintenant + self.intervalle
+            signatures = _signatures(self.chemin)
+            if signatures == {fichier: signature for fichier, (signature, _) in self._fichiers.items()}:
+                return False
+            fichiers = {}
+            for fichier, signature in sorted(signatures.items()):
+                precedent = self._fichiers.get(fichier)
+                if precedent is not None and precedent[0] == signature:
+                    fichiers[fichier] = precedent
+                    continue
+                try:
+                    definitions = lire_fichier(fichier)
+                    with self._lock:
+                        for nom, definition in definitions.items():
+                            self._effectif(nom, definition) # Validation avant de publier le fichier
+                except _ERREURS_LECTURE as e:
+                    print(f"Effectifs : {fichier} ignoré ({e})")
+                    if precedent is not None:
+                        fichiers[fichier] = (signature, precedent[1]) # Contenu précédent conservé
+                    continue
+                fichiers[fichier] = (signature, definitions)
+            with self._lock:
+                self._fichiers = fichiers
+                definitions = dict(self._integres)
+                for _, definitions_fichier in fichiers.values():
+                    definitions.update(definitions_fichier)
+                courants = {nom: self._effectif(nom, definition) for nom, definition in definitions.items()}
+                change = courants != self._courants
+                self._courants = courants
+            if change:
+                print(f"Effectifs : {len(courants)} équipe(s) chargée(s) depuis {self.chemin}")
+            return change
+        finally:
+            self._lock_fichiers.release()
+
+    def get(self, nom=None, version=None, defaut=None):
+        """
+        Effectif `nom` dans la `version` demandée. Version inconnue de ce
+        processus (redémarrage après modification des fichiers) : version
+        courante de la même équipe ; nom inconnu : équipe `defaut`
+        (self.defaut si None).
+        """
+        self.rafraichir()
+        effectif = self._versions.get((nom, version))
+        if effectif is None:
+            effectif = self._courants.get(nom) or self._courants[defaut or self.defaut]
+        return effectif
+
+    def du_match(self, state):
+        """Effectif VEEC référencé par l'état d'un match (champs 'effectif', 'version_effectif')."""
+        return self.get(state.get('effectif'), state.get('version_effectif'))
+
+    def adverse_du_match(self, state):
+        """Effectif adverse référencé par l'état d'un match (champs 'effectif_adverse', 'version_effectif_adverse')."""
+        return self.get(state.get('effectif_adverse'), state.get('version_effectif_adverse'), self.defaut_adverse)
+
+    def noms(self):
+        self.rafraichir()
+        return sorted(self._courants)
+
+    def __contains__(self, nom):
+        self.rafraichir()
+        return nom in self._courants
@@ -0,0 +1,188 @@
+"""
+Backends d'état partagé des matchs (plusieurs workers gunicorn).
+
+Un match y est enregistré comme son état initial suivi de la liste ordonnée
+des commandes reçues (action de match, annulation, rétablissement,
+changement d'interface). Le numéro de version d'un match est le nombre de
+commandes enregistrées : c'est la 'version' de la référence du dcc.Store.
+
+Chaque worker garde en cache un MatchLog par match et rejoue les commandes
+qu'il n'a pas encore vues (le moteur est déterministe : l'horodatage fait
+partie de la commande). L'écriture est optimiste : ajouter(match_id,
+version, commande) ne réussit que si le match en est toujours à la version
+attendue ; sinon un autre worker a écrit entre-temps, le MatchStore se
+resynchronise et recommence. Aucun clic n'est perdu ni appliqué deux fois.
+
+  - MemoireBackend : dans le processus (un seul worker, comportement historique).
+  - SQLiteBackend : fichier SQLite partagé par les workers d'une machine.
+  - RedisBackend : serveur compatible Redis (Redis, Valkey, KeyDB...), via
+    redis-py (dépendance optionnelle).
+
+backend_depuis_url('memoire' | 'sqlite:///chemin.db' | 'redis://hote:port/0').
+"""
+import sqlite3
+import threading
+
+from codec import dumps as _dumps, loads as _loads
+
+try:
+    import redis
+except ImportError: # RedisBackend indisponible : mémoire et SQLite restent utilisables
+    redis = None
+
+
+class MemoireBackend:
+    """Matchs gardés dans le processus : aucun partage entre workers."""
+
+    partage = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._initiaux = {}
+        self._commandes = {}
+
+    def creer(self, match_id, initial):
+        with self._lock:
+            if match_id in self._initiaux:
+                return False
+            self._initiaux[match_id] = initial
+            self._commandes[match_id] = []
+            return True
+
+    def initial(self, match_id):
+        return self._initiaux.get(match_id)
+
+    def commandes(self, match_id, depuis=0):
+        return self._commandes[match_id][depuis:]
+
+    def ajouter(self, match_id, version, commande):
+        with self._lock:
+            commandes = self._commandes[match_id]
+            if len(commandes) != version:
+                return False
+            commandes.append(commande)
+            return True
+
+    def oublier(self, match_id):
+        with self._lock:
+            self._initiaux.pop(match_id, None)
+            self._commandes.pop(match_id, None)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS etat_matchs (
+    match_id TEXT PRIMARY KEY,
+    initial TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS etat_commandes (
+    match_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    commande TEXT NOT NULL,
+    PRIMARY KEY (match_id, version)
+);
+"""
+
+
+class SQLiteBackend:
+    """
+    Matchs partagés par un fichier SQLite (mode WAL), pour des workers sur la
+    même machine. La clé primaire (match_id, version) sert de compare-and-set :
+    deux workers ne peuvent pas enregistrer la même version.
+    """
+
+    partage = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        # Une connexion par thread (serveur Flask multi-thread)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def creer(self, match_id, initial):
+        cur = self._conn().execute("INSERT OR IGNORE INTO etat_matchs (match_id, initial) VALUES (?, ?)",
+                                   (match_id, _dumps(initial)))
+        return cur.rowcount == 1
+
+    def initial(self, match_id):
+        row = self._conn().execute("SELECT initial FROM etat_matchs WHERE match_id = ?", (match_id,)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def commandes(self, match_id, depuis=0):
+        return [_loads(c) for (c,) in self._conn().execute(
+            "SELECT commande FROM etat_commandes WHERE match_id = ? AND version > ? ORDER BY version", (match_id, depuis))]
+
+    def ajouter(self, match_id, version, commande):
+        try:
+            self._conn().execute("INSERT INTO etat_commandes (match_id, version, commande) VALUES (?, ?, ?)",
+                                 (match_id, version + 1, _dumps(commande)))
+            return True
+        except sqlite3.IntegrityError: # Version déjà écrite par un autre worker
+            return False
+
+    def oublier(self, match_id):
+        conn = self._conn()
+        conn.execute("DELETE FROM etat_commandes WHERE match_id = ?", (match_id,))
+        conn.execute("DELETE FROM etat_matchs WHERE match_id = ?", (match_id,))
+
+
+# Ajout conditionnel atomique : la liste des commandes doit avoir exactement ARGV[1] éléments
+_LUA_AJOUTER = """
+if redis.call('LLEN', KEYS[1]) == tonumber(ARGV[1]) then
+    redis.call('RPUSH', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """Matchs partagés par un serveur compatible Redis (workers sur une ou plusieurs machines)."""
+
+    partage = True
+
+    def __init__(self, url='redis://localhost:6379/0', prefixe='veec', client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("Le backend Redis nécessite redis-py (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self.prefixe = prefixe
+        self._ajouter = client.register_script(_LUA_AJOUTER)
+
+    def _cle(self, match_id, nom):
+        return f"{self.prefixe}:match:{match_id}:{nom}"
+
+    def creer(self, match_id, initial):
+        return bool(self._redis.set(self._cle(match_id, 'initial'), _dumps(initial), nx=True))
+
+    def initial(self, match_id):
+        texte = self._redis.get(self._cle(match_id, 'initial'))
+        return _loads(texte) if texte is not None else None
+
+    def commandes(self, match_id, depuis=0):
+        return [_loads(c) for c in self._redis.lrange(self._cle(match_id, 'commandes'), depuis, -1)]
+
+    def ajouter(self, match_id, version, commande):
+        return bool(self._ajouter(keys=[self._cle(match_id, 'commandes')], args=[version, _dumps(commande)]))
+
+    def oublier(self, match_id):
+        self._redis.delete(self._cle(match_id, 'initial'), self._cle(match_id, 'commandes'))
+
+
+def backend_depuis_url(url):
+    """Backend décrit par une URL : 'memoire' (ou vide), 'sqlite:///chemin.db', 'redis://...'."""
+    if not url or url == 'memoire':
+        return MemoireBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"Backend d'état inconnu : {url}")
@@ -0,0 +1,289 @@
+"""
+Export des matchs vers CSV, JSON Lines et Parquet.
+
+Trois tables sont produites, chaque ligne portant l'identifiant du match :
+  - actions : le journal complet des actions (une ligne par événement),
+  - joueurs : les agrégats par joueur (nombre de chaque geste/résultat),
+  - sets    : le résumé de chaque set (score final, vainqueur, durée, temps morts...).
+
+Tout passe par des générateurs : les événements sont lus en flux (journal
+SQLite ou journal en mémoire), chaque ligne d'action est écrite dès qu'elle
+est produite, et seuls les agrégats (quelques dizaines de lignes par match)
+restent en mémoire le temps d'un match. Une archive de tournoi entière peut
+donc être exportée sans jamais être chargée.
+
+Parquet nécessite pyarrow (dépendance optionnelle).
+
+Usage :
+    python export.py <journal.db | dossier> <dossier_sortie> [--formats csv,jsonl,parquet]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+
+from journal_sqlite import iter_saved_events, saved_match_ids
+from match_engine import (
+    MATCH_END, POINT, RESULTATS_GAGNANTS, SET_END, STAT, SUB, SUB_ADVERSE, TIMEOUT, TIMER_END,
+    event_record_fields,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet indisponible : CSV et JSONL restent utilisables
+    pa = pq = None
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+PARQUET_ROW_GROUP = 10_000
+
+# Schéma des tables : (colonne, type)
+TABLES = {
+    'actions': [
+        ('match_id', 'string'), ('seq', 'int'), ('timestamp', 'string'), ('type', 'string'),
+        ('set', 'int'), ('score_veec', 'int'), ('score_adverse', 'int'),
+        ('position', 'string'), ('numero', 'int'), ('joueur_nom', 'string'),
+        ('action_code', 'string'), ('resultat', 'string'),
+    ],
+    'joueurs': [
+        ('match_id', 'string'), ('numero', 'int'), ('nom', 'string'),
+        ('action_code', 'string'), ('resultat', 'string'), ('total', 'int'),
+    ],
+    'sets': [
+        ('match_id', 'string'), ('set', 'int'), ('score_veec', 'int'), ('score_adverse', 'int'),
+        ('vainqueur', 'string'), ('debut', 'string'), ('fin', 'string'), ('duree_secondes', 'int'),
+        ('nb_actions', 'int'), ('timeouts_veec', 'int'), ('timeouts_adverse', 'int'),
+        ('subs_veec', 'int'), ('subs_adverse', 'int'), ('fin_de_match', 'bool'),
+    ],
+}
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+
+# --- PIPELINE ---
+
+class _Agregats:
+    """Agrégats d'un match, mis à jour événement par événement (mémoire bornée par match)."""
+
+    def __init__(self, match_id):
+        self.match_id = match_id
+        self.joueurs = Counter() # (numero, nom, action_code, resultat) -> total
+        self.sets = {}
+
+    def _set(self, event):
+        resume = self.sets.get(event.set)
+        if resume is None:
+            resume = self.sets[event.set] = {
+                'match_id': self.match_id, 'set': event.set, 'score_veec': 0, 'score_adverse': 0,
+                'vainqueur': None, 'debut': event.timestamp, 'fin': event.timestamp, 'nb_actions': 0,
+                'timeouts_veec': 0, 'timeouts_adverse': 0, 'subs_veec': 0, 'subs_adverse': 0, 'fin_de_match': False,
+            }
+        return resume
+
+    def ajouter(self, event):
+        if event.type == TIMER_END:
+            return
+        if event.type == MATCH_END:
+            self.sets[max(self.sets)]['fin_de_match'] = True
+            return
+        resume = self._set(event)
+        resume['fin'] = event.timestamp
+        if event.type == SET_END:
+            # Score d'avant l'événement = score final du set
+            resume['score_veec'], resume['score_adverse'] = event.score_veec, event.score_adverse
+            resume['vainqueur'] = event.data['vainqueur']
+            return
+        resume['nb_actions'] += 1
+        # Score courant (celui d'un set inachevé) : score d'avant l'événement + point éventuel
+        resume['score_veec'], resume['score_adverse'] = event.score_veec, event.score_adverse
+        if event.type == POINT:
+            resume['score_veec' if event.data['gagnant'] == 'VEEC' else 'score_adverse'] += 1
+        elif event.type == STAT:
+            d = event.data
+            self.joueurs[(d['numero'], d['nom'], d['action_code'], d['resultat'])] += 1
+            if d['resultat'] in RESULTATS_GAGNANTS:
+                resume['score_veec'] += 1
+        elif event.type == TIMEOUT:
+            resume['timeouts_veec' if event.data['team'] == 'VEEC' else 'timeouts_adverse'] += 1
+        elif event.type == SUB:
+            resume['subs_veec'] += 1
+        elif event.type == SUB_ADVERSE:
+            resume['subs_adverse'] += 1
+
+    def lignes_joueurs(self):
+        for (numero, nom, action_code, resultat), total in sorted(self.joueurs.items(), key=lambda kv: kv[0][:1] + kv[0][2:]):
+            yield {'match_id': self.match_id, 'numero': numero, 'nom': nom,
+                   'action_code': action_code, 'resultat': resultat, 'total': total}
+
+    def lignes_sets(self):
+        for num in sorted(self.sets):
+            resume = dict(self.sets[num])
+            resume['duree_secondes'] = int(resume['fin'] - resume['debut'])
+            resume['debut'], resume['fin'] = _iso(resume['debut']), _iso(resume['fin'])
+            yield resume
+
+
+def action_rows(match_id, events, agregats=None):
+    """Lignes de la table 'actions' ; alimente au passage les agrégats du match."""
+    for event in events:
+        if agregats is not None:
+            agregats.ajouter(event)
+        if event.type == TIMER_END:
+            continue
+        position, joueur_nom, action_code, resultat = event_record_fields(event)
+        yield {
+            'match_id': match_id, 'seq': event.seq, 'timestamp': _iso(event.timestamp), 'type': event.type,
+            'set': event.set, 'score_veec': event.score_veec, 'score_adverse': event.score_adverse,
+            'position': str(position), 'numero': event.data.get('numero') if event.type == STAT else None,
+            'joueur_nom': joueur_nom, 'action_code': action_code, 'resultat': resultat,
+        }
+
+
+# --- ÉCRIVAINS ---
+
+class _CSVWriter:
+    def __init__(self, path, colonnes):
+        self._f = open(path, 'w', newline='', encoding='utf-8')
+        self._w = csv.DictWriter(self._f, fieldnames=colonnes)
+        self._w.writeheader()
+
+    def write(self, ligne):
+        self._w.writerow(ligne)
+
+    def close(self):
+        self._f.close()
+
+
+class _JSONLWriter:
+    def __init__(self, path, colonnes):
+        self._f = open(path, 'w', encoding='utf-8')
+
+    def write(self, ligne):
+        self._f.write(json.dumps(ligne, ensure_ascii=False))
+        self._f.write('\n')
+
+    def close(self):
+        self._f.close()
+
+
+class _ParquetWriter:
+    """Écriture Parquet par groupes de lignes (PARQUET_ROW_GROUP) : mémoire bornée."""
+
+    _TYPES = {'string': 'string', 'int': 'int64', 'bool': 'bool_'}
+
+    def __init__(self, path, schema):
+        if pq is None:
+            raise RuntimeError("L'export Parquet nécessite pyarrow (pip install pyarrow)")
+        self._schema = pa.schema([(col, getattr(pa, self._TYPES[t])()) for col, t in schema])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._tampon = []
+
+    def write(self, ligne):
+        self._tampon.append(ligne)
+        if len(self._tampon) >= PARQUET_ROW_GROUP:
+            self._vider()
+
+    def _vider(self):
+        if self._tampon:
+            self._writer.write_table(pa.Table.from_pylist(self._tampon, schema=self._schema))
+            self._tampon = []
+
+    def close(self):
+        self._vider()
+        self._writer.close()
+
+
+def _ouvrir(out_dir, table, formats):
+    colonnes = [col for col, _ in TABLES[table]]
+    writers = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{table}.{fmt}")
+        if fmt == 'csv':
+            writers.append(_CSVWriter(path, colonnes))
+        elif fmt == 'jsonl':
+            writers.append(_JSONLWriter(path, colonnes))
+        elif fmt == 'parquet':
+            writers.append(_ParquetWriter(path, TABLES[table]))
+        else:
+            raise ValueError(f"Format d'export inconnu : {fmt} (formats : {', '.join(FORMATS)})")
+    return writers
+
+
+# --- EXPORT ---
+
+def export_matches(matches, out_dir, formats=('csv', 'jsonl')):
+    """
+    Exporte une suite de matchs, donnée comme itérable de (match_id, événements),
+    vers out_dir/{actions,joueurs,sets}.{format}. Les événements de chaque match
+    sont consommés une seule fois, en flux. Retourne le nombre de lignes par table.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ecrivains = {table: _ouvrir(out_dir, table, formats) for table in TABLES}
+    compteurs = Counter()
+    try:
+        for match_id, events in matches:
+            agregats = _Agregats(match_id)
+            for table, lignes in (('actions', action_rows(match_id, events, agregats)),
+                                  ('joueurs', agregats.lignes_joueurs()),
+                                  ('sets', agregats.lignes_sets())):
+                # Les agrégats ne sont lus qu'après épuisement des actions (ordre du tuple)
+                for ligne in lignes:
+                    for w in ecrivains[table]:
+                        w.write(ligne)
+                    compteurs[table] += 1
+    finally:
+        for writers in ecrivains.values():
+            for w in writers:
+                w.close()
+    return dict(compteurs)
+
+
+def iter_journal_matches(db_path):
+    """(match_id, événements en flux) pour chaque match commencé d'un fichier de journal."""
+    for match_id in saved_match_ids(db_path):
+        events = iter_saved_events(db_path, match_id)
+        premier = next(events, None)
+        if premier is None:
+            continue # Match créé mais jamais commencé
+        yield match_id, _prefixer(premier, events)
+
+
+def _prefixer(premier, suite):
+    yield premier
+    yield from suite
+
+
+def iter_directory_matches(directory):
+    """Tous les matchs de tous les fichiers de journal (*.db) d'un dossier, fichier par fichier."""
+    for nom in sorted(os.listdir(directory)):
+        if nom.endswith('.db'):
+            yield from iter_journal_matches(os.path.join(directory, nom))
+
+
+def export_directory(directory, out_dir, formats=('csv', 'jsonl')):
+    """Export en un seul lot de tous les matchs sauvegardés d'un dossier."""
+    return export_matches(iter_directory_matches(directory), out_dir, formats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export des matchs VEEC (CSV, JSON Lines, Parquet).")
+    parser.add_argument('source', help="Fichier de journal (.db) ou dossier de journaux")
+    parser.add_argument('out_dir', help="Dossier de sortie")
+    parser.add_argument('--formats', default='csv,jsonl', help=f"Formats séparés par des virgules ({', '.join(FORMATS)})")
+    args = parser.parse_args(argv)
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    if os.path.isdir(args.source):
+        compteurs = export_directory(args.source, args.out_dir, formats)
+    else:
+        compteurs = export_matches(iter_journal_matches(args.source), args.out_dir, formats)
+    print(f"Export terminé dans {args.out_dir} : " + ", ".join(f"{n} lignes '{t}'" for t, n in compteurs.items()))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
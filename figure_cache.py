@@ -0,0 +1,71 @@
+"""
+Cache LRU des figures du terrain.
+
+Un match ne parcourt qu'un petit nombre de configurations distinctes du terrain
+(6 rotations VEEC × 6 rotations adverses × côté du service, plus les variantes
+Libero). Chaque configuration est construite une seule fois ; la revisiter ne
+coûte ensuite qu'une recherche dans un dictionnaire.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 512
+
+
+class LRUCache:
+    """Cache LRU borné en nombre d'entrées, avec compteurs de succès/échecs."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        if maxsize <= 0:
+            raise ValueError("maxsize doit être strictement positif")
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, build):
+        """Retourne la valeur associée à key, en la construisant via build() si absente."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Construction hors verrou : deux requêtes concurrentes peuvent construire
+        # la même entrée, le résultat est identique.
+        value = build()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Compteurs du cache (pour le suivi des performances)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / total) if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
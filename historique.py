@@ -0,0 +1,223 @@
+"""
+Historique des actions indexé côté serveur.
+
+Le tableau 'datatable-historique' fonctionne en pagination, tri et filtrage
+« custom » : le navigateur n'envoie que la page demandée, le tri et le filtre,
+et le serveur ne renvoie que les lignes de cette page. Les lignes sont
+indexées une seule fois par événement (HistoriqueIndex.sync) et retirées
+lors d'une annulation (HistoriqueIndex.truncate) ; un clic ne reconstruit
+donc jamais l'historique complet.
+
+Le stockage est en colonnes (voir HistoriqueIndex) : un match complet occupe
+une fraction de la mémoire d'une liste de dictionnaires.
+"""
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from match_engine import TIMER_END, event_record_fields
+
+HISTORIQUE_COLUMNS = ('timestamp', 'set', 'score', 'position', 'joueur_nom', 'action_code', 'resultat')
+HISTORIQUE_PAGE_SIZE = 25
+
+# Opérateurs de filtre produits par le DataTable (forme symbolique et forme textuelle).
+# Préfixe facultatif : 's' (sensible à la casse) ou 'i' (insensible).
+_FILTER_PART = re.compile(
+    r"^\{(?P<col>[^}]+)\}\s+(?P<case>[si]?)(?P<op>>=|<=|!=|=|<|>|eq|ne|lt|le|gt|ge|contains|datestartswith)\s+(?P<val>.+)$"
+)
+_OPERATEURS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+
+def _valeur_filtre(brute):
+    brute = brute.strip()
+    if len(brute) >= 2 and brute[0] == brute[-1] and brute[0] in '"\'`':
+        return brute[1:-1].replace('\\' + brute[0], brute[0])
+    return brute
+
+
+def parse_filter_query(filter_query):
+    """
+    Traduit un filter_query du DataTable ('{set} = 2 && {joueur_nom} icontains hugo')
+    en liste de (colonne, opérateur, valeur, insensible_casse). Les parties non
+    reconnues ou portant sur une colonne inconnue sont ignorées.
+    """
+    conditions = []
+    for part in (filter_query or '').split(' && '):
+        m = _FILTER_PART.match(part.strip())
+        if not m or m.group('col') not in HISTORIQUE_COLUMNS:
+            continue
+        op = _OPERATEURS.get(m.group('op'), m.group('op'))
+        conditions.append((m.group('col'), op, _valeur_filtre(m.group('val')), m.group('case') == 'i'))
+    return conditions
+
+
+def _compare(valeur, op, cible, insensible):
+    if op == 'contains':
+        v, c = str(valeur), str(cible)
+        return c.lower() in v.lower() if insensible else c in v
+    if op == 'datestartswith':
+        return str(valeur).startswith(str(cible))
+
+    # Comparaison numérique si la colonne est numérique (set), textuelle sinon
+    if isinstance(valeur, (int, float)):
+        try:
+            cible = float(cible)
+        except ValueError:
+            return False
+    else:
+        valeur, cible = str(valeur), str(cible)
+        if insensible:
+            valeur, cible = valeur.lower(), cible.lower()
+
+    if op == '=':
+        return valeur == cible
+    if op == '!=':
+        return valeur != cible
+    if op == '<':
+        return valeur < cible
+    if op == '<=':
+        return valeur <= cible
+    if op == '>':
+        return valeur > cible
+    return valeur >= cible
+
+
+class _Dictionnaire:
+    """Encodage par dictionnaire d'une colonne (valeurs texte internées, codes entiers)."""
+
+    __slots__ = ('codes', 'valeurs')
+
+    def __init__(self):
+        self.codes = {}
+        self.valeurs = []
+
+    def encode(self, valeur):
+        code = self.codes.get(valeur)
+        if code is None:
+            if isinstance(valeur, str):
+                valeur = sys.intern(valeur)
+            code = len(self.valeurs)
+            self.codes[valeur] = code
+            self.valeurs.append(valeur)
+        return code
+
+
+# Colonnes encodées par dictionnaire (peu de valeurs distinctes par match)
+_COLONNES_DICTIONNAIRE = ('position', 'joueur_nom', 'action_code', 'resultat')
+
+
+class HistoriqueIndex:
+    """
+    Lignes d'historique d'un match, alignées sur son journal d'événements et
+    stockées en colonnes compactes : horodatage en secondes (array 'd'), set et
+    score en petits entiers, textes (position, joueur, action, résultat)
+    encodés par dictionnaire. Les lignes au format du tableau ne sont
+    matérialisées qu'à la lecture (record, records, query).
+    """
+
+    def __init__(self):
+        self._timestamps = array('d')
+        self._sets = array('B')
+        self._scores_veec = array('H')
+        self._scores_adverse = array('H')
+        self._codes = {col: array('H') for col in _COLONNES_DICTIONNAIRE}
+        self._dictionnaires = {col: _Dictionnaire() for col in _COLONNES_DICTIONNAIRE}
+        self._event_pos = array('I')   # indice, dans le journal, de l'événement source de chaque ligne
+        self._n_events = 0             # nombre d'événements du journal déjà indexés
+
+    def sync(self, events):
+        """Indexe les événements ajoutés au journal depuis le dernier appel."""
+        for i in range(self._n_events, len(events)):
+            event = events[i]
+            if event.type != TIMER_END:
+                self.append(event, i)
+        self._n_events = len(events)
+
+    def append(self, event, event_pos):
+        """Ajoute la ligne d'un événement (O(1) amorti)."""
+        self._timestamps.append(event.timestamp)
+        self._sets.append(event.set)
+        self._scores_veec.append(event.score_veec)
+        self._scores_adverse.append(event.score_adverse)
+        for col, valeur in zip(_COLONNES_DICTIONNAIRE, event_record_fields(event)):
+            self._codes[col].append(self._dictionnaires[col].encode(valeur))
+        self._event_pos.append(event_pos)
+
+    def truncate(self, n_events):
+        """Retire les lignes des événements retirés du journal (annulation)."""
+        debut = bisect_left(self._event_pos, n_events)
+        for colonne in (self._timestamps, self._sets, self._scores_veec, self._scores_adverse,
+                        self._event_pos, *self._codes.values()):
+            del colonne[debut:]
+        self._n_events = min(self._n_events, n_events)
+
+    def valeur(self, i, col):
+        """Valeur de la colonne col pour la ligne i (format du tableau)."""
+        if col in self._codes:
+            return self._dictionnaires[col].valeurs[self._codes[col][i]]
+        if col == 'set':
+            return self._sets[i]
+        if col == 'score':
+            return f"{self._scores_veec[i]}-{self._scores_adverse[i]}"
+        return datetime.fromtimestamp(self._timestamps[i]).strftime("%H:%M:%S")
+
+    def record(self, i):
+        """Ligne i (ordre chronologique) au format du tableau."""
+        return {col: self.valeur(i, col) for col in HISTORIQUE_COLUMNS}
+
+    def iter_records(self, newest_first=True):
+        indices = range(len(self) - 1, -1, -1) if newest_first else range(len(self))
+        for i in indices:
+            yield self.record(i)
+
+    def records(self):
+        """Historique complet, du plus récent au plus ancien."""
+        return list(self.iter_records())
+
+    def _predicat(self, col, op, cible, insensible):
+        if col in self._codes:
+            # Le filtre est évalué une fois par valeur distincte, puis comparé aux codes
+            valeurs = self._dictionnaires[col].valeurs
+            codes_ok = {code for code, v in enumerate(valeurs) if _compare(v, op, cible, insensible)}
+            codes = self._codes[col]
+            return lambda i: codes[i] in codes_ok
+        return lambda i: _compare(self.valeur(i, col), op, cible, insensible)
+
+    def _cle_tri(self, col):
+        if col == 'timestamp':
+            return self._timestamps.__getitem__
+        if col == 'set':
+            return self._sets.__getitem__
+        if col == 'score':
+            return lambda i: (self._scores_veec[i], self._scores_adverse[i])
+        valeurs, codes = self._dictionnaires[col].valeurs, self._codes[col]
+        return lambda i: (isinstance(valeurs[codes[i]], str), valeurs[codes[i]])
+
+    def query(self, page_current=0, page_size=HISTORIQUE_PAGE_SIZE, sort_by=None, filter_query=''):
+        """
+        Page demandée par le DataTable. Par défaut, les lignes les plus récentes
+        viennent en premier. Retourne (lignes de la page, nombre total de lignes après filtrage).
+        """
+        conditions = parse_filter_query(filter_query)
+        sort_by = [s for s in (sort_by or []) if s.get('column_id') in HISTORIQUE_COLUMNS]
+        debut = page_current * page_size
+
+        # Cas courant (ni tri ni filtre) : seules les lignes de la page sont matérialisées
+        if not conditions and not sort_by:
+            total = len(self)
+            fin = max(total - debut, 0)
+            return [self.record(i) for i in range(fin - 1, max(fin - page_size, 0) - 1, -1)], total
+
+        indices = list(range(len(self) - 1, -1, -1))
+        for condition in conditions:
+            predicat = self._predicat(*condition)
+            indices = [i for i in indices if predicat(i)]
+        # Tri multi-colonnes : tris stables successifs, de la clé la moins prioritaire à la plus prioritaire
+        for critere in reversed(sort_by):
+            indices.sort(key=self._cle_tri(critere['column_id']), reverse=critere.get('direction') == 'desc')
+        return [self.record(i) for i in indices[debut:debut + page_size]], len(indices)
+
+    def __len__(self):
+        return len(self._timestamps)
@@ -0,0 +1,88 @@
+"""
+Mode hors ligne du marqueur : synchronisation par lots des points mis en file.
+
+Quand le réseau de la salle est coupé, le navigateur n'envoie plus chaque
+clic : il applique le point à une copie locale de l'état (score, service,
+rotation) et le met en file dans le localStorage avec un numéro de séquence
+propre à ce navigateur. Au retour du lien, toute la file est envoyée en UNE
+requête :
+
+  POST /sync/<match_id>
+  {"client": "...", "envoi": <heure du navigateur>,
+   "actions": [{"seq": 1, "gagnant": "VEEC", "horodatage": <heure du navigateur>}, ...]}
+
+Le serveur applique le lot dans l'ordre avec les mêmes règles que les
+boutons Point (match_engine.verifier_point, puis fin de set, Libero en P4...)
+et renvoie un seul état réconcilié : la référence du match pour le dcc.Store,
+le résultat de chaque action et la vue du match (diffusion.etat_spectateur)
+avec la dernière séquence reçue de ce client. Renvoyer un lot déjà appliqué
+(réponse perdue) est sans effet.
+
+Les horodatages du navigateur sont recalés sur l'horloge du serveur avec
+l'écart mesuré à l'envoi (heure serveur - champ 'envoi').
+
+GET /sync/<match_id>?client=... renvoie le même état sans rien appliquer :
+c'est la base de la copie locale du navigateur.
+"""
+import time
+
+import flask
+
+from diffusion import etat_spectateur
+
+MAX_ACTIONS_PAR_LOT = 1000
+MAX_LONGUEUR_CLIENT = 64
+
+
+class SynchroHorsLigne:
+    """Point d'entrée /sync/<match_id>, à installer sur le serveur Flask de l'application Dash."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def installer(self, server):
+        server.add_url_rule('/sync/<match_id>', 'veec_sync', self._sync, methods=['GET', 'POST'])
+
+    def etat(self, match_id, client=None):
+        """Vue du match renvoyée au navigateur (base de sa copie locale)."""
+        vue = etat_spectateur(self.store.load(match_id))
+        vue['match_id'] = match_id
+        vue['version'] = self.store.version(match_id)
+        vue['dernier_seq'] = self.store.derniere_sequence(match_id, client) if client else 0
+        return vue
+
+    def _sync(self, match_id):
+        try:
+            if flask.request.method == 'GET':
+                return flask.jsonify({'etat': self.etat(match_id, flask.request.args.get('client'))})
+            client, actions = self._lot(flask.request.get_json(silent=True))
+            ref, resultats = self.store.appliquer_lot(match_id, client, actions)
+            if ref is None: # Lot déjà reçu en entier
+                resultats = [{'seq': a['seq'], 'statut': 'doublon'} for a in actions]
+            etat = self.etat(match_id, client)
+        except KeyError:
+            flask.abort(404)
+        except ValueError as e:
+            return flask.jsonify({'erreur': str(e)}), 400
+        return flask.jsonify({'ref': self.store.ref(match_id) if ref is None else ref,
+                              'resultats': resultats, 'etat': etat})
+
+    def _lot(self, corps):
+        """Valide le corps de la requête ; retourne (client, actions triées par séquence, horodatages recalés)."""
+        if not isinstance(corps, dict):
+            raise ValueError("Corps JSON attendu")
+        client, actions = corps.get('client'), corps.get('actions')
+        if not isinstance(client, str) or not 0 < len(client) <= MAX_LONGUEUR_CLIENT:
+            raise ValueError("Identifiant de client invalide")
+        if not isinstance(actions, list) or not 0 < len(actions) <= MAX_ACTIONS_PAR_LOT:
+            raise ValueError(f"Entre 1 et {MAX_ACTIONS_PAR_LOT} actions attendues")
+        maintenant = time.time()
+        try:
+            decalage = maintenant - float(corps['envoi'])
+            lot = [{'seq': int(a['seq']), 'gagnant': str(a['gagnant']),
+                    # Un point ne peut pas être daté après sa réception
+                    'timestamp': min(float(a['horodatage']) + decalage, maintenant)} for a in actions]
+        except (KeyError, TypeError):
+            raise ValueError("Action invalide (seq, gagnant, horodatage attendus)") from None
+        lot.sort(key=lambda a: a['seq'])
+        return client, lot
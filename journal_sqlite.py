@@ -0,0 +1,220 @@
+"""
+Journal durable des matchs (SQLite en mode WAL).
+
+Chaque action acceptée par le MatchStore est ajoutée à une base SQLite locale :
+l'état initial du match à sa création, puis chaque événement du journal. Les
+écritures sont confiées à un thread d'écriture qui les regroupe par lots (une
+transaction par lot) : un rallye n'attend jamais le disque. Au démarrage,
+les matchs non terminés (sans événement MATCH_END) peuvent être repris en
+rejouant leurs événements (MatchStore.restore).
+
+Fenêtre de perte en cas de crash : au plus le dernier lot non encore écrit
+(BATCH_DELAY_SECONDS).
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+from codec import dumps as _dumps, loads as _loads
+from match_engine import MATCH_END, MatchEvent
+
+BATCH_MAX_OPS = 256
+BATCH_DELAY_SECONDS = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    initial_state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    match_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    set_num INTEGER NOT NULL,
+    score_veec INTEGER NOT NULL,
+    score_adverse INTEGER NOT NULL,
+    PRIMARY KEY (match_id, seq)
+);
+"""
+
+
+# --- JOURNAL ---
+
+class SQLiteJournal:
+    """Journal des matchs sur disque, avec écriture différée par lots dans un thread dédié."""
+
+    def __init__(self, path, batch_max_ops=BATCH_MAX_OPS, batch_delay=BATCH_DELAY_SECONDS):
+        self.path = path
+        self.batch_max_ops = batch_max_ops
+        self.batch_delay = batch_delay
+        self._queue = queue.Queue()
+        self._closed = False
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name='veec-journal-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- Écritures (non bloquantes) ---
+
+    def create_match(self, match_id, initial_state, created_at=None):
+        """Enregistre un match à son premier événement (sans effet s'il est déjà enregistré)."""
+        created_at = time.time() if created_at is None else created_at
+        self._queue.put(("INSERT OR IGNORE INTO matches (match_id, created_at, initial_state) VALUES (?, ?, ?)",
+                         [(match_id, created_at, _dumps(initial_state))]))
+
+    def append(self, match_id, events):
+        """Ajoute des événements (dispatch ou redo)."""
+        if not events:
+            return
+        self._queue.put(("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [(match_id, e.seq, e.type, _dumps(e.data), e.timestamp, e.set, e.score_veec, e.score_adverse)
+                          for e in events]))
+
+    def truncate(self, match_id, n_events):
+        """Retire les événements postérieurs aux n_events premiers (annulation)."""
+        self._queue.put(("DELETE FROM events WHERE match_id = ? AND seq > ?", [(match_id, n_events)]))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            op = self._queue.get()
+            if op is None:
+                self._queue.task_done()
+                break
+            lot = [op]
+            # Regroupe les opérations arrivées pendant la fenêtre de lot
+            limite = time.monotonic() + self.batch_delay
+            while len(lot) < self.batch_max_ops:
+                reste = limite - time.monotonic()
+                if reste <= 0:
+                    break
+                try:
+                    suivante = self._queue.get(timeout=reste)
+                except queue.Empty:
+                    break
+                if suivante is None:
+                    self._queue.put(None) # Traité au tour suivant, après ce lot
+                    self._queue.task_done()
+                    break
+                lot.append(suivante)
+            try:
+                with conn:
+                    for sql, lignes in lot:
+                        conn.executemany(sql, lignes)
+            except sqlite3.Error as e:
+                print(f"ERREUR journal SQLite ({len(lot)} opérations perdues) : {e}")
+            finally:
+                for _ in lot:
+                    self._queue.task_done()
+        conn.close()
+
+    def flush(self):
+        """Attend que toutes les écritures en file soient sur disque."""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    # --- Lectures (reprise) ---
+
+    def unfinished_matches(self):
+        """
+        Matchs commencés mais non terminés (au moins un événement, aucun MATCH_END),
+        du plus récent au plus ancien.
+        """
+        self.flush()
+        conn = self._connect()
+        try:
+            rows = conn.execute("""
+                SELECT m.match_id, m.created_at, COUNT(e.seq), MAX(e.timestamp)
+                FROM matches m JOIN events e ON e.match_id = m.match_id
+                GROUP BY m.match_id
+                HAVING SUM(e.type = ?) = 0
+                ORDER BY MAX(e.timestamp) DESC
+            """, (MATCH_END,)).fetchall()
+            resumes = []
+            for match_id, created_at, nb_events, updated_at in rows:
+                dernier = conn.execute("""
+                    SELECT set_num, score_veec, score_adverse FROM events
+                    WHERE match_id = ? ORDER BY seq DESC LIMIT 1
+                """, (match_id,)).fetchone()
+                resumes.append({
+                    'match_id': match_id, 'created_at': created_at, 'updated_at': updated_at,
+                    'nb_events': nb_events, 'set': dernier[0], 'score_veec': dernier[1], 'score_adverse': dernier[2],
+                })
+            return resumes
+        finally:
+            conn.close()
+
+    def has_match(self, match_id):
+        """Le match est-il enregistré dans le journal ?"""
+        self.flush()
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM matches WHERE match_id = ?", (match_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def load_match(self, match_id):
+        """Retourne (état initial, événements) d'un match enregistré."""
+        self.flush()
+        return load_saved_match(self.path, match_id)
+
+
+# --- LECTURE EN FLUX (reprise, export) ---
+# Fonctions sans thread d'écriture : utilisables sur n'importe quel fichier
+# de journal, y compris une archive copiée d'une autre machine.
+
+def saved_match_ids(path):
+    """Identifiants des matchs d'un fichier de journal, par date de création."""
+    conn = sqlite3.connect(path)
+    try:
+        for (match_id,) in conn.execute("SELECT match_id FROM matches ORDER BY created_at"):
+            yield match_id
+    finally:
+        conn.close()
+
+
+def iter_saved_events(path, match_id):
+    """Événements d'un match, lus en flux depuis le fichier de journal (ordre du journal)."""
+    conn = sqlite3.connect(path)
+    try:
+        for seq, type_, data, timestamp, set_num, score_veec, score_adverse in conn.execute("""
+            SELECT seq, type, data, timestamp, set_num, score_veec, score_adverse
+            FROM events WHERE match_id = ? ORDER BY seq
+        """, (match_id,)):
+            yield MatchEvent(seq=seq, type=type_, data=_loads(data), timestamp=timestamp,
+                             set=set_num, score_veec=score_veec, score_adverse=score_adverse)
+    finally:
+        conn.close()
+
+
+def load_saved_match(path, match_id):
+    """Retourne (état initial, événements) d'un match du fichier de journal."""
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT initial_state FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise KeyError(f"Match inconnu dans le journal : {match_id}")
+    return _loads(row[0]), list(iter_saved_events(path, match_id))
@@ -0,0 +1,799 @@
+"""
+Moteur de match événementiel (aucune dépendance à Dash).
+
+Chaque action du match (point, stat, temps mort, substitution, entrée/sortie
+du Libero, fin de set...) est enregistrée comme un événement typé dans un
+journal append-only (MatchLog). L'état courant est obtenu par un réducteur pur
+(reduce_event) appliqué depuis le dernier snapshot : reconstruire l'état après
+une reconnexion coûte O(événements depuis le snapshot), pas un rejeu complet.
+
+Le même journal alimente l'historique affiché (event_to_record) et, à terme,
+les exports et les statistiques.
+"""
+import copy
+import operator
+import time
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+
+# --- RÈGLES ---
+
+LIBERO_POSITIONS_AUTORISEES = [1, 5, 6] # Positions arrière où le Libero peut entrer
+
+MAX_TIMEOUTS_PER_SET = 2
+MAX_SUBS_PER_SET = 6
+TIMEOUT_DURATION_SECONDS = 30
+SHORT_BREAK_DURATION_SECONDS = 3 * 60
+LONG_BREAK_DURATION_SECONDS = 5 * 60
+
+SETS_GAGNANTS = 3
+RESULTATS_GAGNANTS = ['KILL', 'ACE', 'GAIN'] # Stats qui rapportent un point à VEEC
+
+# --- TYPES D'ÉVÉNEMENTS ---
+
+SETUP = 'SETUP'
+POINT = 'POINT'
+STAT = 'STAT'
+TIMEOUT = 'TIMEOUT'
+TIMER_END = 'TIMER_END'
+SUB = 'SUB'
+SUB_ADVERSE = 'SUB_ADVERSE'
+LIBERO_IN = 'LIBERO_IN'
+LIBERO_OUT = 'LIBERO_OUT'
+LIBERO_AUTO_OUT = 'LIBERO_AUTO_OUT'
+LIBERO_SWAP_RESERVE = 'LIBERO_SWAP_RESERVE'
+SET_END = 'SET_END'
+MATCH_END = 'MATCH_END'
+
+EVENT_TYPES = (
+    SETUP, POINT, STAT, TIMEOUT, TIMER_END, SUB, SUB_ADVERSE,
+    LIBERO_IN, LIBERO_OUT, LIBERO_AUTO_OUT, LIBERO_SWAP_RESERVE,
+    SET_END, MATCH_END,
+)
+
+SNAPSHOT_INTERVAL = 50
+UNDO_DEPTH = 1000 # Nombre maximal d'actions annulables
+
+
+@dataclass(frozen=True)
+class MatchEvent:
+    """
+    Événement du journal. Le contexte (set, score) est celui de l'état AVANT
+    l'événement, pour que chaque entrée soit complète, y compris les sorties
+    automatiques du Libero.
+    """
+    seq: int
+    type: str
+    data: dict = field(default_factory=dict)
+    timestamp: float = 0.0
+    set: int = 1
+    score_veec: int = 0
+    score_adverse: int = 0
+
+    def to_dict(self):
+        return {
+            'seq': self.seq, 'type': self.type, 'data': self.data, 'timestamp': self.timestamp,
+            'set': self.set, 'score_veec': self.score_veec, 'score_adverse': self.score_adverse,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+
+# --- ROTATIONS ---
+
+# Une formation est un ordre de départ figé (6 emplacements) plus un décalage de
+# rotation. Les tables ci-dessous, calculées une fois pour toutes, donnent pour
+# chaque décalage l'emplacement occupant chaque position, et inversement.
+POSITIONS = (1, 2, 3, 4, 5, 6)
+NB_POSITIONS = len(POSITIONS)
+SLOT_DE_POSITION = tuple({pos: (pos - 1 + offset) % NB_POSITIONS for pos in POSITIONS} for offset in range(NB_POSITIONS))
+POSITION_DU_SLOT = tuple(tuple((slot - offset) % NB_POSITIONS + 1 for slot in range(NB_POSITIONS)) for offset in range(NB_POSITIONS))
+
+
+def numeros_du_banc(banc):
+    """Banc trié de numéros (tuple)."""
+    return tuple(sorted(banc))
+
+class Formation(Mapping):
+    """
+    Formation sur le terrain, lue comme un dictionnaire {position: numéro du joueur}.
+
+    Les numéros sont rangés dans l'ordre de départ (emplacement = position de
+    départ - 1) et `offset` compte les rotations : formation[pos] est une
+    lecture dans SLOT_DE_POSITION, et une rotation ne fait qu'incrémenter
+    l'offset (aucun dictionnaire reconstruit). Un index numéro -> emplacement
+    rend position_de() O(1). Noms et fiches sont dans le registre des
+    effectifs (effectifs.py).
+
+    Immuable : tourner() et remplacer() retournent une nouvelle formation.
+    """
+
+    __slots__ = ('joueurs', 'offset', '_slots_par_numero')
+
+    def __init__(self, joueurs, offset=0, _slots_par_numero=None):
+        self.joueurs = tuple(joueurs)
+        if len(self.joueurs) != NB_POSITIONS:
+            raise ValueError(f"Une formation compte {NB_POSITIONS} joueurs ({len(self.joueurs)} reçus)")
+        self.offset = offset % NB_POSITIONS
+        if _slots_par_numero is None:
+            _slots_par_numero = {numero: slot for slot, numero in enumerate(self.joueurs)}
+        self._slots_par_numero = _slots_par_numero
+
+    @classmethod
+    def from_positions(cls, formation):
+        """Formation à partir d'un dictionnaire {position: numéro}."""
+        if isinstance(formation, Formation):
+            return formation
+        return cls(formation[pos] for pos in POSITIONS)
+
+    def __getitem__(self, pos):
+        return self.joueurs[SLOT_DE_POSITION[self.offset][pos]]
+
+    def __iter__(self):
+        return iter(POSITIONS)
+
+    def __len__(self):
+        return NB_POSITIONS
+
+    def __repr__(self):
+        return f"Formation({dict(self.items())!r})"
+
+    def tourner(self):
+        """Rotation réglementaire (le joueur en P2 passe en P1, etc.) : O(1)."""
+        return Formation(self.joueurs, self.offset + 1, self._slots_par_numero)
+
+    def remplacer(self, pos, numero):
+        """Nouvelle formation où le joueur `numero` occupe la position `pos` (substitution, échange Libero)."""
+        joueurs = list(self.joueurs)
+        joueurs[SLOT_DE_POSITION[self.offset][pos]] = numero
+        return Formation(joueurs, self.offset)
+
+    def position_de(self, numero):
+        """Position actuelle du joueur `numero`, ou None s'il n'est pas sur le terrain : O(1)."""
+        slot = self._slots_par_numero.get(numero)
+        return None if slot is None else POSITION_DU_SLOT[self.offset][slot]
+
+    def to_dict(self):
+        return {pos: self[pos] for pos in POSITIONS}
+
+
+# --- ÉTAT DU MATCH ---
+
+@dataclass(slots=True)
+class EtatMatch(Mapping):
+    """
+    État réduit d'un match (sans état d'interface) : champs typés, sans
+    dictionnaire par instance. Les joueurs n'y figurent que par leur numéro :
+    formations en Formation (6 emplacements + décalage de rotation), bancs en
+    tuples triés. Les fiches (noms) sont dans le registre des équipes
+    (effectifs.py), désignées par (effectif, version_effectif) et
+    (effectif_adverse, version_effectif_adverse).
+
+    Lu comme un dictionnaire (état['score_veec']), comme Formation, pour que
+    l'interface, les vérifications et le simulateur restent inchangés. Seul
+    le réducteur écrit, par attribut (état.score_veec), sur sa propre copie.
+    """
+
+    formation_actuelle: Formation
+    formation_adverse_actuelle: Formation
+    joueurs_banc: tuple # Numéros, triés
+    joueurs_banc_adverse: tuple
+    liberos_veec: dict
+    effectif: str | None = None # Référence dans le registre des équipes (None : équipe par défaut)
+    version_effectif: str | None = None
+    effectif_adverse: str | None = None
+    version_effectif_adverse: str | None = None
+    match_setup_completed: bool = False
+    service_actuel: str = 'VEEC'
+    service_choisi: bool = True
+    score_veec: int = 0
+    score_adverse: int = 0
+    sets_veec: int = 0
+    sets_adverse: int = 0
+    current_set: int = 1
+    match_ended: bool = False
+    match_winner: str | None = None
+    timeouts_veec: int = 0
+    timeouts_adverse: int = 0
+    sub_veec: int = 0
+    sub_adverse: int = 0
+    rotation_count: int = 0
+    start_time: float = 0.0
+    timer_end_time: float = 0
+    timer_type: str | None = None
+    _vue: dict | None = field(default=None, init=False, repr=False, compare=False) # Cache de en_dict()
+
+    @classmethod
+    def depuis(cls, etat):
+        """
+        EtatMatch à partir d'un dictionnaire d'état (app.initial_state). Les
+        clés d'interface et inconnues sont ignorées.
+        """
+        if isinstance(etat, EtatMatch):
+            return etat
+        valeurs = {nom: etat[nom] for nom in CHAMPS_ETAT if nom in etat}
+        for nom in ('formation_actuelle', 'formation_adverse_actuelle'):
+            valeurs[nom] = Formation.from_positions(valeurs[nom])
+        for nom in ('joueurs_banc', 'joueurs_banc_adverse'):
+            valeurs[nom] = numeros_du_banc(valeurs.get(nom, ()))
+        return cls(**valeurs)
+
+    def copie(self):
+        """Copie superficielle (les branches restent partagées, voir reduce_event)."""
+        return EtatMatch(*_LIRE_CHAMPS(self))
+
+    def valeurs(self):
+        """Valeurs des champs, dans l'ordre de CHAMPS_ETAT (codec)."""
+        return _LIRE_CHAMPS(self)
+
+    def en_dict(self):
+        """
+        Dictionnaire {champ: valeur}, calculé une fois par état (les états
+        produits par le réducteur ne changent plus) : à copier avant modification.
+        """
+        if self._vue is None:
+            self._vue = dict(zip(CHAMPS_ETAT, _LIRE_CHAMPS(self)))
+        return self._vue
+
+    def __getitem__(self, cle):
+        if cle not in _INDEX_CHAMPS:
+            raise KeyError(cle)
+        return getattr(self, cle)
+
+    def __iter__(self):
+        return iter(CHAMPS_ETAT)
+
+    def __len__(self):
+        return len(CHAMPS_ETAT)
+
+
+CHAMPS_ETAT = tuple(f.name for f in fields(EtatMatch) if f.init)
+_INDEX_CHAMPS = frozenset(CHAMPS_ETAT)
+_LIRE_CHAMPS = operator.attrgetter(*CHAMPS_ETAT)
+
+
+def appliquer_rotation(formation):
+    """Rotation d'une formation (VEEC ou adverse) : simple incrément du décalage."""
+    return Formation.from_positions(formation).tourner()
+
+def is_libero(liberos_status, numero):
+    return numero == liberos_status['actif_numero'] or numero == liberos_status['reserve_numero']
+
+def position_du_libero(formation, liberos_status):
+    """Retourne la position actuelle du Libero sur le terrain (ou None)."""
+    formation = Formation.from_positions(formation)
+    pos = formation.position_de(liberos_status['actif_numero'])
+    return pos if pos is not None else formation.position_de(liberos_status['reserve_numero'])
+
+def gagnant_du_rallye(event):
+    """
+    Équipe qui gagne le rallye clos par `event` : POINT, ou stat gagnante
+    (KILL, ACE, GAIN) qui vaut un point VEEC. None pour les autres événements.
+    """
+    if event.type == POINT:
+        return event.data['gagnant']
+    if event.type == STAT and event.data['resultat'] in RESULTATS_GAGNANTS:
+        return 'VEEC'
+    return None
+
+def vainqueur_du_set(state):
+    """'VEEC', 'ADVERSAIRE' ou None selon le score (25 pts, 15 au 5e set, 2 pts d'écart)."""
+    seuil_points = 15 if state['current_set'] == 5 else 25
+    score_veec = state['score_veec']
+    score_adverse = state['score_adverse']
+    if score_veec >= seuil_points and (score_veec - score_adverse) >= 2:
+        return 'VEEC'
+    if score_adverse >= seuil_points and (score_adverse - score_veec) >= 2:
+        return 'ADVERSAIRE'
+    return None
+
+
+# --- RÉDUCTEUR ---
+
+def _branche(new_state, key):
+    """Copie (superficielle) la branche `key` avant modification ; le reste de l'état reste partagé."""
+    branche = dict(getattr(new_state, key))
+    setattr(new_state, key, branche)
+    return branche
+
+def _echange_banc(banc, entrant, sortant):
+    """Banc après l'entrée sur le terrain de `entrant` et la sortie de `sortant` (numéros)."""
+    if entrant not in banc:
+        raise KeyError(entrant)
+    return tuple(sorted([numero for numero in banc if numero != entrant] + [sortant]))
+
+def reduce_event(state, event):
+    """
+    Réducteur pur : retourne le nouvel état après `event` sans modifier `state`.
+    Toute valeur dépendant du temps est dérivée de event.timestamp.
+
+    Partage structurel : seules les branches touchées (compteurs, formation,
+    banc, bloc Libero) sont remplacées ; le reste est partagé avec l'état
+    précédent. Les états produits doivent donc être
+    traités en lecture seule. Le coût d'un événement ne dépend pas de la
+    longueur du match.
+    """
+    new_state = state.copie()
+    data = event.data
+    gagnant = gagnant_du_rallye(event)
+
+    if event.type == SETUP:
+        new_state.formation_actuelle = Formation.from_positions(data['formation'])
+        new_state.joueurs_banc = numeros_du_banc(data['banc'])
+        new_state.match_setup_completed = True
+
+    elif gagnant is not None:
+        # POINT ou stat gagnante : score, changement de service et rotation de l'équipe qui le reprend
+        service_avant = new_state.service_actuel
+        if gagnant == 'VEEC':
+            new_state.score_veec += 1
+            if service_avant == 'ADVERSAIRE':
+                # Rotation VEEC (point gagné en réception)
+                new_state.service_actuel = 'VEEC'
+                new_state.formation_actuelle = appliquer_rotation(new_state.formation_actuelle)
+                new_state.rotation_count += 1
+                if new_state.liberos_veec['is_on_court']:
+                    # La sortie forcée en P4 est un événement distinct (LIBERO_AUTO_OUT)
+                    liberos_status = _branche(new_state, 'liberos_veec')
+                    liberos_status['current_pos_on_court'] = position_du_libero(new_state.formation_actuelle, liberos_status)
+        else:
+            new_state.score_adverse += 1
+            if service_avant == 'VEEC':
+                new_state.service_actuel = 'ADVERSAIRE'
+                new_state.formation_adverse_actuelle = appliquer_rotation(new_state.formation_adverse_actuelle)
+                new_state.rotation_count += 1
+
+    elif event.type == STAT:
+        pass # Stat sans point : historique et statistiques seulement
+
+    elif event.type == TIMEOUT:
+        if data['team'] == 'VEEC':
+            new_state.timeouts_veec += 1
+        else:
+            new_state.timeouts_adverse += 1
+        new_state.timer_end_time = event.timestamp + TIMEOUT_DURATION_SECONDS
+        new_state.timer_type = 'TIMEOUT'
+
+    elif event.type == TIMER_END:
+        new_state.timer_end_time = 0
+        new_state.timer_type = None
+
+    elif event.type == SUB:
+        sortant_pos = data['position']
+        formation = Formation.from_positions(new_state.formation_actuelle)
+        new_state.joueurs_banc = _echange_banc(new_state.joueurs_banc, data['entrant'], formation[sortant_pos])
+        new_state.formation_actuelle = formation.remplacer(sortant_pos, data['entrant'])
+        new_state.sub_veec += 1
+
+    elif event.type == SUB_ADVERSE:
+        new_state.sub_adverse += 1
+
+    elif event.type == LIBERO_IN:
+        pos = data['position']
+        formation = Formation.from_positions(new_state.formation_actuelle)
+        liberos_status = _branche(new_state, 'liberos_veec')
+        titulaire = formation[pos]
+        new_state.joueurs_banc = _echange_banc(new_state.joueurs_banc, data['libero'], titulaire) # Titulaire sur le banc
+        new_state.formation_actuelle = formation.remplacer(pos, data['libero']) # Libero sur le terrain
+        liberos_status['is_on_court'] = True
+        liberos_status['starter_numero_replaced'] = titulaire
+        liberos_status['current_pos_on_court'] = pos
+
+    elif event.type in (LIBERO_OUT, LIBERO_AUTO_OUT):
+        pos = data['position']
+        formation = Formation.from_positions(new_state.formation_actuelle)
+        liberos_status = _branche(new_state, 'liberos_veec')
+        new_state.joueurs_banc = _echange_banc(new_state.joueurs_banc, data['starter'], formation[pos]) # Libero sur le banc
+        new_state.formation_actuelle = formation.remplacer(pos, data['starter']) # Titulaire sur le terrain
+        liberos_status['is_on_court'] = False
+        liberos_status['starter_numero_replaced'] = None
+        liberos_status['current_pos_on_court'] = None
+
+    elif event.type == LIBERO_SWAP_RESERVE:
+        liberos_status = _branche(new_state, 'liberos_veec')
+        liberos_status['actif_numero'], liberos_status['reserve_numero'] = liberos_status['reserve_numero'], liberos_status['actif_numero']
+        liberos_status['is_reserve_used'] = True
+
+    elif event.type == SET_END:
+        if data['vainqueur'] == 'VEEC':
+            new_state.sets_veec += 1
+        else:
+            new_state.sets_adverse += 1
+
+        # Le score final est conservé si le match est terminé (MATCH_END suit)
+        if new_state.sets_veec < SETS_GAGNANTS and new_state.sets_adverse < SETS_GAGNANTS:
+            new_state.score_veec, new_state.score_adverse = 0, 0
+            new_state.current_set += 1
+            new_state.timeouts_veec, new_state.timeouts_adverse = 0, 0
+            new_state.sub_veec, new_state.sub_adverse = 0, 0
+            duration = LONG_BREAK_DURATION_SECONDS if new_state.current_set == 5 else SHORT_BREAK_DURATION_SECONDS
+            new_state.timer_end_time = event.timestamp + duration
+            new_state.timer_type = 'SET_BREAK'
+
+    elif event.type == MATCH_END:
+        new_state.match_ended = True
+        new_state.match_winner = data['vainqueur']
+
+    else:
+        raise ValueError(f"Type d'événement inconnu : {event.type}")
+
+    return new_state
+
+def follow_up_events(state, event):
+    """
+    Événements imposés par le règlement après `event` (état déjà réduit) :
+    sortie forcée du Libero en P4 et fin de set après un rallye (point ou
+    stat gagnante), fin de match.
+    Retourne une liste de tuples (type, data).
+    """
+    suivants = []
+    if gagnant_du_rallye(event) is not None:
+        liberos_status = state.liberos_veec
+        starter_num = liberos_status['starter_numero_replaced']
+        if liberos_status['is_on_court'] and liberos_status['current_pos_on_court'] == 4 \
+                and starter_num in state.joueurs_banc:
+            suivants.append((LIBERO_AUTO_OUT, {
+                'position': 4, 'libero': state.formation_actuelle[4], 'starter': starter_num,
+            }))
+        vainqueur = vainqueur_du_set(state)
+        if vainqueur:
+            suivants.append((SET_END, {'vainqueur': vainqueur}))
+    elif event.type == SET_END:
+        if state.sets_veec >= SETS_GAGNANTS or state.sets_adverse >= SETS_GAGNANTS:
+            suivants.append((MATCH_END, {'vainqueur': event.data['vainqueur']}))
+    return suivants
+
+
+def action_automatique_applicable(state, event):
+    """
+    Une action automatique retirée par une annulation vaut-elle encore sur
+    `state` (état rétabli) ? Une fin de minuteur ne vaut que si le minuteur
+    rétabli était déjà échu à ce moment-là.
+    """
+    if event.type == TIMER_END:
+        return 0 < state.timer_end_time <= event.timestamp
+    return True
+
+
+# --- VÉRIFICATIONS (avant événement) ---
+# Chaque fonction retourne (données de l'événement ou None si refusé, message) ;
+# l'interface et le simulateur ne font qu'enregistrer les événements acceptés.
+
+def swap_liberos_on_bench(current_state):
+    """
+    Vérifie l'échange du statut de Libero Actif (N°8) avec le Libero de Réserve (N°9)
+    lorsque les deux sont sur le banc.
+    Si le N°9 est activé, le N°8 ne peut plus jouer du set/match.
+    Retourne (données de l'événement LIBERO_SWAP_RESERVE ou None si refusé, message).
+    """
+    liberos_status = current_state['liberos_veec']
+    
+    L8_num = liberos_status['actif_numero']  # 8
+    L9_num = liberos_status['reserve_numero'] # 9
+    
+    # Condition de sécurité : La substitution n'est possible que si AUCUN Libero n'est sur le terrain.
+    if liberos_status['is_on_court']:
+        # Le Libero (N°8 ou N°9) est sur le terrain, l'échange est impossible.
+        return None, "Échange Libero-Libero impossible : Un Libero est sur le terrain."
+
+    # L'échange de statut Libero n'est possible qu'une seule fois dans le set/match selon les règles standard
+    # et a des implications majeures : si L9 entre, L8 est définitivement out.
+    if liberos_status['is_reserve_used']:
+        return None, "Le Libero de réserve a déjà été utilisé. L'échange est terminé."
+
+    # L'échange lui-même (numéros actif/réserve, drapeau is_reserve_used) est appliqué par le réducteur.
+    return {'sortant': L8_num, 'entrant': L9_num}, f"L{L9_num} est désormais le Libero ACTIF. L{L8_num} ne peut plus rejouer."
+
+def handle_libero_out(current_state):
+    """
+    Vérifie la sortie (OUT) du Libero Actif (N°8 ou N°9) par son joueur titulaire initial.
+    Retourne (données de l'événement LIBERO_OUT ou None si refusé, message).
+    """
+    liberos_status = current_state['liberos_veec']
+    
+    # ----------------------------------------------------
+    # VÉRIFICATIONS PRÉ-ÉCHANGE
+    # ----------------------------------------------------
+    
+    # 1. Vérifier si un Libero est sur le terrain
+    if not liberos_status['is_on_court']:
+        return None, "Échec: Aucun Libero n'est sur le terrain."
+
+    # 2. Récupérer le numéro du joueur qui doit entrer (le titulaire initial)
+    starter_num_to_enter = liberos_status['starter_numero_replaced']
+    if starter_num_to_enter is None:
+        # Erreur si l'état est incohérent, car le Libero doit toujours avoir un titulaire à remplacer.
+        return None, "Erreur d'état: Le titulaire que le Libero remplaçait est inconnu."
+
+    # 3. Le Libero qui sort et sa position
+    libero_num_to_out = liberos_status['actif_numero']
+    pos_sortie = liberos_status['current_pos_on_court'] # La position où le Libero se trouve
+    
+    # 4. Le titulaire (joueur entrant) doit être sur le banc
+    if starter_num_to_enter not in current_state['joueurs_banc']:
+        return None, f"Échec: Le titulaire N°{starter_num_to_enter} n'est pas disponible sur le banc."
+
+    event_data = {'position': pos_sortie, 'libero': libero_num_to_out, 'starter': starter_num_to_enter}
+    return event_data, f"Libero N°{libero_num_to_out} sorti. Titulaire N°{starter_num_to_enter} entré en P{pos_sortie}."
+
+
+def verifier_libero_in(current_state, position):
+    """
+    Vérifie l'entrée du Libero Actif à la place du joueur en `position` (ligne arrière).
+    Retourne (données de l'événement LIBERO_IN ou None si refusé, message).
+    """
+    liberos_status = current_state['liberos_veec']
+    if liberos_status['is_on_court']:
+        return None, "Échec: Le Libero est déjà sur le terrain."
+    if position not in LIBERO_POSITIONS_AUTORISEES:
+        return None, f"Échec: Le Libero ne peut entrer qu'en ligne arrière (P{', P'.join(map(str, LIBERO_POSITIONS_AUTORISEES))})."
+
+    libero_num = liberos_status['actif_numero']
+    if libero_num not in current_state['joueurs_banc']:
+        return None, "Échec: Libero non trouvé sur le banc."
+
+    titulaire = current_state['formation_actuelle'][position]
+    event_data = {'position': position, 'libero': libero_num, 'starter': titulaire}
+    return event_data, f"Libero N°{libero_num} entré en P{position} à la place du N°{titulaire}."
+
+def verifier_substitution(current_state, position, entrant_numero, noms=None):
+    """
+    Vérifie une substitution régulière VEEC (joueur en `position` remplacé par
+    le joueur N°entrant_numero du banc) : quota du set et règles Libero.
+    `noms` ({numéro: nom}, voir effectifs.Effectif) : noms enregistrés dans
+    l'événement pour l'historique.
+    Retourne (données de l'événement SUB ou None si refusé, message).
+    """
+    if current_state['sub_veec'] >= MAX_SUBS_PER_SET:
+        return None, f"Échec: Les {MAX_SUBS_PER_SET} substitutions du set ont été utilisées."
+    sortant_numero = current_state['formation_actuelle'].get(position)
+    if sortant_numero is None or entrant_numero not in current_state['joueurs_banc']:
+        return None, "Échec: Données de substitution manquantes."
+
+    liberos_status = current_state['liberos_veec']
+    starter_bloque = liberos_status['starter_numero_replaced']
+
+    # Règle 1 : Aucun Libero (actif ou de réserve) ne participe à une substitution régulière
+    for numero in (sortant_numero, entrant_numero):
+        if is_libero(liberos_status, numero):
+            return None, f"ERREUR : Le Libero (L{numero}) ne peut pas être impliqué dans une substitution régulière."
+
+    # Règle 2 : Le titulaire remplacé par le Libero ne revient que par l'échange Libero
+    if liberos_status['is_on_court'] and entrant_numero == starter_bloque:
+        return None, f"ERREUR : Le joueur N°{starter_bloque} est bloqué et doit revenir via l'échange Libero."
+
+    noms = noms or {}
+    sortant_nom, entrant_nom = noms.get(sortant_numero, f"N°{sortant_numero}"), noms.get(entrant_numero, f"N°{entrant_numero}")
+    event_data = {
+        'position': position,
+        'sortant': sortant_numero, 'sortant_nom': sortant_nom,
+        'entrant': entrant_numero, 'entrant_nom': entrant_nom,
+    }
+    return event_data, f"{sortant_nom} sort de P{position}. {entrant_nom} entre."
+
+def verifier_timeout(current_state, team, maintenant):
+    """
+    Vérifie un temps mort de `team` ('VEEC' ou 'ADVERSAIRE') à l'instant `maintenant` :
+    aucune minuterie en cours et quota du set non atteint.
+    Retourne (données de l'événement TIMEOUT ou None si refusé, message).
+    """
+    if current_state.get('timer_end_time', 0) > maintenant:
+        return None, "Échec: Une minuterie est déjà en cours."
+    count = current_state['timeouts_veec' if team == 'VEEC' else 'timeouts_adverse']
+    if count >= MAX_TIMEOUTS_PER_SET:
+        return None, f"Échec: Les {MAX_TIMEOUTS_PER_SET} temps morts du set ont été utilisés."
+    return {'team': team}, f"Temps mort {team}."
+
+def verifier_point(current_state, gagnant):
+    """
+    Vérifie un point marqué par `gagnant` ('VEEC' ou 'ADVERSAIRE') : formation
+    confirmée et match non terminé (boutons Point et synchronisation hors ligne).
+    Retourne (données de l'événement POINT ou None si refusé, message).
+    """
+    if gagnant not in ('VEEC', 'ADVERSAIRE'):
+        return None, f"Échec: Équipe inconnue ({gagnant})."
+    if not current_state.get('match_setup_completed'):
+        return None, "Échec: La formation de départ n'est pas confirmée."
+    if current_state.get('match_ended'):
+        return None, "Échec: Le match est terminé."
+    return {'gagnant': gagnant}, f"Point {gagnant}."
+
+
+# --- JOURNAL ---
+
+class MatchLog:
+    """
+    Journal append-only des événements d'un match, avec un snapshot de l'état
+    dès que `snapshot_interval` événements se sont accumulés depuis le précédent.
+
+    Chaque action (dispatch) conserve une référence vers l'état qui la
+    précédait : annuler ou rétablir une action coûte O(1) (quelques événements
+    retirés/remis en fin de journal), sans rejouer le match.
+
+    Les actions automatiques (fin de minuteur) survenues après l'action
+    annulée ne sont pas annulées avec elle : elles sont rejouées, à la suite,
+    si elles valent encore (action_automatique_applicable). Toute nouvelle
+    action, automatique ou non, vide la pile de rétablissement.
+    """
+
+    def __init__(self, initial_state, snapshot_interval=SNAPSHOT_INTERVAL, undo_depth=UNDO_DEPTH):
+        self.snapshot_interval = snapshot_interval
+        self.events = []
+        self.snapshots = [(0, copy.deepcopy(EtatMatch.depuis(initial_state)))] # (nombre d'événements, état)
+        self.state = self.snapshots[0][1]
+        self._undo = deque(maxlen=undo_depth) # (nombre d'événements avant l'action, état avant l'action)
+        self._redo = [] # (nombre d'événements avant l'action, état avant, événements retirés, état après, automatiques)
+        self._automatiques = set() # seq des actions automatiques (premier événement de chaque dispatch non annulable)
+
+    def dispatch(self, event_type, data=None, timestamp=None, undoable=True):
+        """
+        Enregistre une action et les événements qu'elle entraîne selon le
+        règlement. Retourne la liste des événements ajoutés.
+        Les actions automatiques (undoable=False, ex. fin de minuteur) ne
+        créent pas d'étape d'annulation.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        nb_events_avant, state_avant = len(self.events), self.state
+        ajoutes = self._enchainer(event_type, data or {}, timestamp, undoable)
+        if undoable:
+            self._undo.append((nb_events_avant, state_avant))
+        # Les événements retirés ne peuvent plus être remis après une nouvelle action (numéros de séquence)
+        self._redo.clear()
+        self._maybe_snapshot()
+        return ajoutes
+
+    def _enchainer(self, event_type, data, timestamp, undoable):
+        # Ajoute un événement et ceux que le règlement impose à sa suite
+        file_attente = [(event_type, data)]
+        ajoutes = []
+        while file_attente:
+            type_evt, data_evt = file_attente.pop(0)
+            event = self.append(type_evt, data_evt, timestamp)
+            ajoutes.append(event)
+            file_attente.extend(follow_up_events(self.state, event))
+        if not undoable:
+            self._automatiques.add(ajoutes[0].seq)
+        return ajoutes
+
+    def append(self, event_type, data, timestamp):
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Type d'événement inconnu : {event_type}")
+        event = MatchEvent(
+            seq=len(self.events) + 1, type=event_type, data=data, timestamp=timestamp,
+            set=self.state.current_set, score_veec=self.state.score_veec, score_adverse=self.state.score_adverse,
+        )
+        self.state = reduce_event(self.state, event)
+        self.events.append(event)
+        return event
+
+    def _maybe_snapshot(self):
+        # Snapshots pris uniquement entre deux actions, pour que undo/redo restent cohérents.
+        if len(self.events) - self.snapshots[-1][0] >= self.snapshot_interval:
+            self.snapshots.append((len(self.events), self.state))
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def _tronquer(self, nb_events):
+        del self.events[nb_events:]
+        while self.snapshots[-1][0] > nb_events:
+            self.snapshots.pop()
+        automatiques = {seq for seq in self._automatiques if seq > nb_events}
+        self._automatiques -= automatiques
+        return automatiques
+
+    def undo(self):
+        """
+        Annule la dernière action. Retourne les événements retirés (liste vide si rien à annuler).
+        Les actions automatiques qui la suivaient sont rejouées à la fin du journal
+        (nouveaux événements à partir de la séquence du premier événement retiré).
+        """
+        if not self._undo:
+            return []
+        nb_events_avant, state_avant = self._undo.pop()
+        retires = self.events[nb_events_avant:]
+        state_apres = self.state
+        automatiques = self._tronquer(nb_events_avant)
+        self._redo.append((nb_events_avant, state_avant, retires, state_apres, automatiques))
+        self.state = state_avant
+        for event in retires:
+            if event.seq in automatiques and action_automatique_applicable(self.state, event):
+                self._enchainer(event.type, event.data, event.timestamp, undoable=False)
+        self._maybe_snapshot()
+        return retires
+
+    def redo(self):
+        """
+        Rétablit la dernière action annulée : les actions automatiques rejouées par
+        l'annulation sont remplacées par les événements d'origine. Retourne les
+        événements remis dans le journal.
+        """
+        if not self._redo:
+            return []
+        nb_events_avant, state_avant, remis, state_apres, automatiques = self._redo.pop()
+        self._tronquer(nb_events_avant)
+        self._undo.append((nb_events_avant, state_avant))
+        self.events.extend(remis)
+        self._automatiques |= automatiques
+        self.state = state_apres
+        self._maybe_snapshot()
+        return remis
+
+    def rebuild(self):
+        """Reconstruit l'état depuis le dernier snapshot (rejoue uniquement les événements suivants)."""
+        nb_events, state = self.snapshots[-1]
+        for event in self.events[nb_events:]:
+            state = reduce_event(state, event)
+        return state
+
+    @classmethod
+    def replay(cls, initial_state, events, snapshot_interval=SNAPSHOT_INTERVAL):
+        """Reconstruit un journal complet à partir d'une liste d'événements (sans historique d'annulation)."""
+        log = cls(initial_state, snapshot_interval)
+        for event in events:
+            log.state = reduce_event(log.state, event)
+            log.events.append(event)
+            log._maybe_snapshot()
+        return log
+
+
+# --- PROJECTION HISTORIQUE ---
+
+def event_record_fields(event):
+    """
+    Champs descriptifs d'une ligne d'historique : (position, joueur_nom, action_code, resultat).
+    Toutes les lignes ont la même forme, y compris LIBERO_AUTO_OUT.
+    """
+    data = event.data
+    position, joueur_nom, resultat = '', '', ''
+
+    if event.type == SETUP:
+        position, joueur_nom, action_code, resultat = 'SETUP', 'MATCH', 'START', 'Formation Confirmée'
+    elif event.type == POINT:
+        action_code, resultat = 'POINT', data['gagnant']
+    elif event.type == STAT:
+        position, joueur_nom, action_code, resultat = data['position'], data['nom'], data['action_code'], data['resultat']
+    elif event.type == TIMEOUT:
+        joueur_nom, action_code = data['team'], 'TIMEOUT'
+    elif event.type == SUB:
+        position, action_code = data['position'], 'SUB'
+        joueur_nom, resultat = f"{data['sortant_nom']} (SORT)", f"ENTRE: {data['entrant_nom']}"
+    elif event.type == SUB_ADVERSE:
+        position, joueur_nom, action_code, resultat = 'Adv Bench', 'Adversaire Sub', 'SUB', 'ADVERSE_CONFIRMED'
+    elif event.type == LIBERO_IN:
+        position, action_code = data['position'], LIBERO_IN
+        joueur_nom, resultat = f"N°{data['starter']} (SORT)", f"ENTRE: L{data['libero']}"
+    elif event.type in (LIBERO_OUT, LIBERO_AUTO_OUT):
+        position, action_code = data['position'], event.type
+        joueur_nom, resultat = f"L{data['libero']} (SORT)", f"ENTRE: N°{data['starter']}"
+    elif event.type == LIBERO_SWAP_RESERVE:
+        position, action_code = 'BANC', LIBERO_SWAP_RESERVE
+        joueur_nom, resultat = f"L{data['sortant']} OUT (Règle)", f"L{data['entrant']} devient ACTIF"
+    elif event.type in (SET_END, MATCH_END):
+        action_code, resultat = event.type, data['vainqueur']
+    else:
+        action_code = event.type
+
+    return position, joueur_nom, action_code, resultat
+
+def event_to_record(event):
+    """Ligne d'historique (format du tableau) pour un événement."""
+    position, joueur_nom, action_code, resultat = event_record_fields(event)
+    return {
+        'timestamp': datetime.fromtimestamp(event.timestamp).strftime("%H:%M:%S"),
+        'set': event.set,
+        'score': f"{event.score_veec}-{event.score_adverse}",
+        'position': position, 'joueur_nom': joueur_nom,
+        'action_code': action_code, 'resultat': resultat,
+    }
+
+def historique_records(events):
+    """Historique complet, du plus récent au plus ancien (les fins de minuteur sont omises)."""
+    return [event_to_record(e) for e in reversed(events) if e.type != TIMER_END]
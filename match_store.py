@@ -0,0 +1,404 @@
+"""
+Stockage côté serveur de l'état des matchs.
+
+Le navigateur ne garde plus l'état complet dans le dcc.Store 'match-state' :
+il ne conserve qu'une référence {'match_id': ..., 'version': ...}. Les
+callbacks chargent l'état sur le serveur puis enregistrent soit des
+événements de match (dispatch), soit des changements d'interface (update_ui) ;
+chaque écriture renvoie une nouvelle référence (version incrémentée) au
+navigateur. La taille des échanges par clic reste donc constante, quelle que
+soit la longueur du match.
+
+Si un journal durable est fourni (journal_sqlite.SQLiteJournal), chaque
+création de match, événement, annulation et rétablissement y est aussi
+enregistré, et restore() reconstruit un match depuis ce journal.
+
+Plusieurs matchs (un par terrain) peuvent être servis par le même processus.
+Avec un journal durable, la mémoire est bornée : au-delà de max_matchs, ou
+après inactivite_max secondes sans accès, un match est retiré de la mémoire
+(éviction) ; il est rechargé depuis le journal au prochain accès, sans son
+historique d'annulation ni son état d'interface.
+
+Plusieurs workers : chaque écriture est une commande enregistrée dans un
+backend d'état (etat_partage.py) avec contrôle de version optimiste ; le
+MatchStore de chaque worker n'est qu'un cache, rattrapé à chaque accès en
+rejouant les commandes écrites par les autres workers.
+
+Mode hors ligne : appliquer_lot() enregistre en une seule commande les
+points mis en file par un navigateur déconnecté. Chaque action porte un
+numéro de séquence propre au client ; une action déjà reçue (lot renvoyé
+après une réponse perdue) est ignorée. L'origine (client, séquence) est
+conservée dans les données de l'événement POINT : la déduplication survit
+à une éviction ou à une reprise depuis le journal durable.
+"""
+import copy
+import dataclasses
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from etat_partage import MemoireBackend
+from historique import HISTORIQUE_PAGE_SIZE, HistoriqueIndex
+from match_engine import POINT, EtatMatch, MatchEvent, MatchLog, verifier_point
+from stats_joueurs import StatsIndex
+
+# Clés d'état propres à l'interface (sélections en cours dans les modales).
+# Elles ne font pas partie du journal d'événements.
+UI_KEYS = ('temp_setup_formation_veec', 'temp_setup_selected_player_num', 'sub_en_cours_team', 'temp_sub_state')
+
+# État d'interface d'un match repris depuis le journal (aucune modale ouverte)
+UI_DEFAULTS = {'temp_setup_formation_veec': {}, 'temp_setup_selected_player_num': None,
+               'sub_en_cours_team': None, 'temp_sub_state': {}}
+
+
+def _sequences_clients(events):
+    """Dernière séquence de chaque client hors ligne, d'après l'origine des points du journal."""
+    sequences = {}
+    for event in events:
+        origine = event.data.get('origine') if event.type == POINT else None
+        if origine:
+            sequences[origine['client']] = max(sequences.get(origine['client'], 0), origine['seq'])
+    return sequences
+
+
+def _check_ui_keys(ui_changes):
+    unknown = set(ui_changes) - set(UI_KEYS)
+    if unknown:
+        raise KeyError(f"Clés d'interface inconnues : {sorted(unknown)}")
+
+
+class MatchStore:
+    """Registre en mémoire des matchs (journal d'événements + état d'interface), indexé par identifiant."""
+
+    # Intervalle minimal entre deux recherches de matchs inactifs
+    BALAYAGE_SECONDES = 30.0
+
+    def __init__(self, journal_durable=None, max_matchs=None, inactivite_max=None, backend=None):
+        self._lock = threading.Lock()
+        self._durable = journal_durable
+        self._backend = backend if backend is not None else MemoireBackend()
+        self.max_matchs = max_matchs
+        self.inactivite_max = inactivite_max
+        self._acces = OrderedDict() # match_id -> dernier accès (du plus ancien au plus récent)
+        self._prochain_balayage = 0.0
+        self._journaux = {}
+        self._ui = {}
+        self._versions = {} # Nombre de commandes du backend déjà appliquées localement
+        self._historiques = {}
+        self._stats = {}
+        self._clients = {} # match_id -> {client hors ligne: dernière séquence reçue}
+        self._observateurs = []
+
+    def observer(self, fonction):
+        """fonction(match_id) est appelée après chaque écriture de ce processus (hors verrou)."""
+        self._observateurs.append(fonction)
+
+    def create(self, state, match_id=None):
+        """Enregistre un nouveau match et retourne sa référence client."""
+        match_id = match_id or uuid.uuid4().hex
+        if not self._creer(match_id, state):
+            raise KeyError(f"Match déjà existant : {match_id}")
+        with self._lock:
+            self.journal(match_id)
+            return self.ref(match_id)
+
+    def ouvrir(self, match_id, state):
+        """
+        Référence du match match_id : en mémoire, rechargé depuis le journal
+        durable s'il a été évincé, ou créé depuis state s'il n'existe pas encore.
+        """
+        self._charger(match_id)
+        self._creer(match_id, state) # Sans effet si le match existe (ce worker ou un autre)
+        with self._lock:
+            self.journal(match_id)
+            return self.ref(match_id)
+
+    def _creer(self, match_id, state):
+        # Le match n'est écrit dans le journal durable qu'à son premier événement (_journaliser)
+        match_state = EtatMatch.depuis(state) # Sans les clés d'interface
+        ui_state = {k: copy.deepcopy(state[k]) for k in UI_KEYS if k in state}
+        return self._backend.creer(match_id, {'state': match_state, 'ui': ui_state})
+
+    def restore(self, match_id):
+        """
+        Reprend un match enregistré dans le journal durable en rejouant ses événements.
+        Sans effet si le match est déjà chargé. L'historique d'annulation n'est pas conservé.
+        """
+        if self._durable is None:
+            raise RuntimeError("Aucun journal durable configuré")
+        if match_id not in self._journaux and self._backend.initial(match_id) is None:
+            initial_state, events = self._durable.load_match(match_id)
+            if self._backend.creer(match_id, {'state': initial_state, 'ui': copy.deepcopy(UI_DEFAULTS)}):
+                self._backend.ajouter(match_id, 0, {'op': 'reprise', 'events': [dataclasses.asdict(e) for e in events]})
+        with self._lock:
+            self.journal(match_id)
+            return self.ref(match_id)
+
+    def _register(self, match_id, journal, ui_state):
+        # Appelé sous verrou
+        self._journaux[match_id] = journal
+        self._ui[match_id] = ui_state
+        self._versions[match_id] = 0
+        self._historiques[match_id] = HistoriqueIndex()
+        self._stats[match_id] = StatsIndex()
+        self._clients[match_id] = _sequences_clients(journal.events)
+        self._toucher(match_id)
+        self._evincer()
+
+    # --- Commandes (backend d'état) ---
+
+    def _synchroniser(self, match_id):
+        # Appelé sous verrou : charge le match depuis le backend si besoin, puis
+        # applique les commandes enregistrées depuis (par ce worker ou un autre)
+        if match_id not in self._journaux:
+            initial = self._backend.initial(match_id)
+            if initial is None:
+                raise KeyError(f"Match inconnu : {match_id}")
+            self._register(match_id, MatchLog(initial['state']), copy.deepcopy(initial['ui']))
+        elif not self._backend.partage:
+            return # Backend local : toutes les commandes ont été appliquées à l'écriture
+        for commande in self._backend.commandes(match_id, self._versions[match_id]):
+            self._appliquer(match_id, commande, ecrivain=False)
+            self._versions[match_id] += 1
+
+    def _appliquer(self, match_id, commande, ecrivain):
+        # Appelé sous verrou. Seul le worker qui a écrit la commande la reporte dans le journal durable.
+        journal = self._journaux[match_id]
+        durable = self._durable if ecrivain else None
+        op, resultat = commande['op'], []
+        if op == 'dispatch':
+            resultat = journal.dispatch(commande['type'], commande['data'], timestamp=commande['timestamp'],
+                                        undoable=commande['undoable'])
+            self._journaliser(match_id, journal, durable, resultat)
+        elif op in ('undo', 'redo'):
+            resultat = journal.undo() if op == 'undo' else journal.redo()
+            if resultat:
+                # Fin du journal réécrite à partir du premier événement retiré ou remis
+                # (actions automatiques rejouées après une annulation, remplacées par le rétablissement)
+                debut = resultat[0].seq - 1
+                self._historiques[match_id].truncate(debut)
+                self._stats[match_id].truncate(debut)
+                if durable is not None:
+                    durable.truncate(match_id, debut)
+                    self._journaliser(match_id, journal, durable, journal.events[debut:])
+        elif op == 'reprise':
+            events = [MatchEvent(**e) for e in commande['events']]
+            self._journaux[match_id] = MatchLog.replay(journal.snapshots[0][1], events)
+            self._clients[match_id] = _sequences_clients(events)
+        elif op == 'lot':
+            resultat = self._appliquer_lot(match_id, commande, durable)
+        self._ui[match_id].update(commande.get('ui') or {})
+        return resultat
+
+    def _appliquer_lot(self, match_id, commande, durable):
+        # Appelé sous verrou : chaque point est vérifié sur l'état courant, comme un clic sur les boutons Point
+        journal = self._journaux[match_id]
+        sequences = self._clients[match_id]
+        client = commande['client']
+        resultats = []
+        for action in commande['actions']:
+            seq = action['seq']
+            if seq <= sequences.get(client, 0):
+                resultats.append({'seq': seq, 'statut': 'doublon'})
+                continue
+            sequences[client] = seq
+            event_data, message = verifier_point(journal.state, action['gagnant'])
+            if event_data is None:
+                resultats.append({'seq': seq, 'statut': 'refusee', 'message': message})
+                continue
+            event_data['origine'] = {'client': client, 'seq': seq}
+            events = journal.dispatch(POINT, event_data, timestamp=action['timestamp'])
+            self._journaliser(match_id, journal, durable, events)
+            resultats.append({'seq': seq, 'statut': 'appliquee'})
+        return resultats
+
+    @staticmethod
+    def _journaliser(match_id, journal, durable, events):
+        # Appelé sous verrou. Un match n'entre dans le journal durable qu'avec son premier
+        # événement : ouvrir une page ou démarrer un worker n'y laisse pas de match vide.
+        if durable is None or not events:
+            return
+        if events[0].seq == 1:
+            durable.create_match(match_id, journal.snapshots[0][1])
+        durable.append(match_id, events)
+
+    def _ecrire(self, match_id, commande, condition=None):
+        """
+        Enregistre une commande à la version courante du match (compare-and-set) et l'applique.
+        En cas de conflit (écriture d'un autre worker), rattrape le match et recommence.
+        Retourne (nouvelle référence, résultat) ou (None, []) si condition(journal) est fausse.
+        """
+        self._charger(match_id)
+        while True:
+            with self._lock:
+                journal = self.journal(match_id)
+                if condition is not None and not condition(journal):
+                    return None, []
+                if self._backend.ajouter(match_id, self._versions[match_id], commande):
+                    resultat = self._appliquer(match_id, commande, ecrivain=True)
+                    self._versions[match_id] += 1
+                    self._evincer()
+                    ref = self.ref(match_id)
+                    break
+        for fonction in self._observateurs:
+            fonction(match_id)
+        return ref, resultat
+
+    # --- Mémoire bornée (éviction) ---
+
+    def _toucher(self, match_id):
+        self._acces[match_id] = time.monotonic()
+        self._acces.move_to_end(match_id)
+
+    def _evincer(self):
+        # Appelé sous verrou. Sans backend partagé ni journal durable, rien n'est retiré (l'état serait perdu).
+        if not self._backend.partage and self._durable is None:
+            return []
+        maintenant = time.monotonic()
+        evinces = []
+        while self.max_matchs is not None and len(self._journaux) > self.max_matchs:
+            evinces.append(next(iter(self._acces)))
+            self._retirer(evinces[-1])
+        if self.inactivite_max is not None and maintenant >= self._prochain_balayage:
+            self._prochain_balayage = maintenant + self.BALAYAGE_SECONDES
+            for match_id, acces in list(self._acces.items()):
+                if maintenant - acces < self.inactivite_max:
+                    break # Ordre d'accès : les suivants sont plus récents
+                evinces.append(match_id)
+                self._retirer(match_id)
+        return evinces
+
+    def _retirer(self, match_id):
+        # Backend partagé : seul le cache local est vidé. Backend local : le match sera repris du journal
+        # durable, sauf s'il n'a encore aucun événement (absent du journal) : il reste alors dans le backend.
+        journal = self._journaux.get(match_id)
+        for registre in (self._journaux, self._ui, self._versions, self._historiques, self._stats, self._clients, self._acces):
+            registre.pop(match_id, None)
+        if not self._backend.partage and (journal is None or journal.events):
+            self._backend.oublier(match_id)
+
+    def _charger(self, match_id):
+        # Recharge hors verrou un match évincé du backend local (la lecture du journal peut prendre quelques ms)
+        if match_id in self._journaux or self._durable is None or self._backend.initial(match_id) is not None:
+            return
+        if self._durable.has_match(match_id):
+            self.restore(match_id)
+
+    def ref(self, match_id):
+        """Référence envoyée au navigateur (seul contenu du dcc.Store)."""
+        return {'match_id': match_id, 'version': self._versions[match_id]}
+
+    def journal(self, match_id):
+        # Appelé sous verrou
+        self._synchroniser(match_id)
+        self._toucher(match_id)
+        return self._journaux[match_id]
+
+    def version(self, match_id):
+        """Version courante du match (rattrape les écritures des autres workers)."""
+        self._charger(match_id)
+        with self._lock:
+            self.journal(match_id)
+            return self._versions[match_id]
+
+    def load(self, match_id):
+        """
+        Retourne l'état du match (état réduit + état d'interface).
+        Seul le dictionnaire de premier niveau est neuf : les branches sont
+        partagées avec le journal et doivent être traitées en lecture seule
+        (toute écriture passe par dispatch() ou update_ui()).
+        """
+        self._charger(match_id)
+        with self._lock:
+            journal = self.journal(match_id)
+            return {**journal.state.en_dict(), **self._ui[match_id]}
+
+    def dispatch(self, match_id, event_type, data=None, undoable=True, **ui_changes):
+        """
+        Enregistre une action de match (et ses conséquences réglementaires),
+        applique d'éventuels changements d'interface, puis retourne la nouvelle référence.
+        """
+        _check_ui_keys(ui_changes)
+        ref, _ = self._ecrire(match_id, {'op': 'dispatch', 'type': event_type, 'data': data, 'timestamp': time.time(),
+                                         'undoable': undoable, 'ui': ui_changes})
+        return ref
+
+    def undo(self, match_id):
+        """Annule la dernière action du match. Retourne (nouvelle référence ou None si rien à annuler, événements retirés)."""
+        return self._ecrire(match_id, {'op': 'undo'}, condition=MatchLog.can_undo)
+
+    def redo(self, match_id):
+        """Rétablit la dernière action annulée. Retourne (nouvelle référence ou None si rien à rétablir, événements remis)."""
+        return self._ecrire(match_id, {'op': 'redo'}, condition=MatchLog.can_redo)
+
+    def update_ui(self, match_id, **ui_changes):
+        """Modifie uniquement l'état d'interface et retourne la nouvelle référence."""
+        _check_ui_keys(ui_changes)
+        ref, _ = self._ecrire(match_id, {'op': 'ui', 'ui': ui_changes})
+        return ref
+
+    def appliquer_lot(self, match_id, client, actions):
+        """
+        Applique les points mis en file hors ligne par `client`, dans l'ordre :
+        actions = [{'seq', 'gagnant', 'timestamp'}], seq croissant par client.
+        Retourne (référence, [{'seq', 'statut': 'appliquee'|'refusee'|'doublon', ...}]) ;
+        la référence est None si toutes les actions avaient déjà été reçues.
+        """
+        ref, resultats = self._ecrire(
+            match_id, {'op': 'lot', 'client': client, 'actions': actions},
+            condition=lambda journal: actions[-1]['seq'] > self._clients[match_id].get(client, 0))
+        return ref, resultats
+
+    def derniere_sequence(self, match_id, client):
+        """Dernière séquence reçue du client hors ligne (0 si aucune)."""
+        self._charger(match_id)
+        with self._lock:
+            self.journal(match_id)
+            return self._clients[match_id].get(client, 0)
+
+    def events(self, match_id):
+        """Copie de la liste des événements du match (export)."""
+        self._charger(match_id)
+        with self._lock:
+            return list(self.journal(match_id).events)
+
+    def _historique_index(self, match_id):
+        # Appelé sous verrou : indexe les événements ajoutés depuis la dernière lecture
+        index = self._historiques[match_id]
+        index.sync(self.journal(match_id).events)
+        return index
+
+    def historique(self, match_id):
+        """Historique complet des actions (du plus récent au plus ancien) dérivé du journal."""
+        self._charger(match_id)
+        with self._lock:
+            return self._historique_index(match_id).records()
+
+    def historique_page(self, match_id, page_current=0, page_size=HISTORIQUE_PAGE_SIZE, sort_by=None, filter_query=''):
+        """Une page de l'historique (tri et filtre du DataTable). Retourne (lignes, nombre total de lignes)."""
+        self._charger(match_id)
+        with self._lock:
+            return self._historique_index(match_id).query(page_current, page_size, sort_by, filter_query)
+
+    def _stats_index(self, match_id):
+        # Appelé sous verrou : compte les stats ajoutées depuis la dernière lecture
+        index = self._stats[match_id]
+        index.sync(self.journal(match_id).events)
+        return index
+
+    def stats_joueurs(self, match_id, set_num=None):
+        """Lignes de statistiques par joueur, pour un set ou pour tout le match. Retourne (lignes, sets disponibles)."""
+        self._charger(match_id)
+        with self._lock:
+            index = self._stats_index(match_id)
+            return index.lignes(set_num), index.sets()
+
+    def stats_joueur(self, match_id, numero, set_num=None):
+        """Ligne de statistiques d'un joueur."""
+        self._charger(match_id)
+        with self._lock:
+            return self._stats_index(match_id).ligne(numero, set_num)
+
+    def __contains__(self, match_id):
+        return match_id in self._journaux
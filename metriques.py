@@ -0,0 +1,210 @@
+"""
+Instrumentation des callbacks Dash (latence, taille des échanges, déclencheur).
+
+Tous les callbacks serveur passent par la même route HTTP
+(/_dash-update-component) : la mesure se fait donc une seule fois, par des
+hooks Flask, sans toucher aux callbacks. Pour chaque appel sont enregistrés :
+  - le callback (nom de la fonction Python, retrouvé depuis ses sorties),
+  - le déclencheur (changedPropIds, ex. 'btn-point-veec.n_clicks'),
+  - la durée côté serveur, la taille des entrées (corps de la requête)
+    et celle des sorties (corps de la réponse), le code HTTP.
+
+Les mesures alimentent des histogrammes par callback, exposés sur
+GET /metrics (format texte Prometheus, ou ?format=json), et un journal
+tournant (une ligne JSON par appel, RotatingFileHandler).
+
+Désactivée, l'instrumentation ne coûte qu'un test de booléen par requête.
+Activation au démarrage par VEEC_METRICS=1, ou à chaud par
+POST /metrics/activer et POST /metrics/desactiver.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+import flask
+
+ROUTE_CALLBACKS = '/_dash-update-component'
+
+# Bornes supérieures des classes d'histogramme (la dernière classe est +Inf)
+BORNES_LATENCE_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+BORNES_TAILLE_OCTETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+LOG_MAX_OCTETS = 1_000_000
+LOG_NB_FICHIERS = 3
+
+
+class Histogramme:
+    """Histogramme cumulable à classes fixes (compte, somme, maximum)."""
+
+    __slots__ = ('bornes', 'classes', 'compte', 'somme', 'maximum')
+
+    def __init__(self, bornes):
+        self.bornes = bornes
+        self.classes = [0] * (len(bornes) + 1)
+        self.compte = 0
+        self.somme = 0.0
+        self.maximum = 0.0
+
+    def ajouter(self, valeur):
+        self.classes[bisect_left(self.bornes, valeur)] += 1
+        self.compte += 1
+        self.somme += valeur
+        self.maximum = max(self.maximum, valeur)
+
+    def quantile(self, q):
+        """Borne supérieure de la classe contenant le quantile q (approximation)."""
+        if not self.compte:
+            return None
+        cible, cumul = q * self.compte, 0
+        for i, n in enumerate(self.classes):
+            cumul += n
+            if cumul >= cible:
+                return self.bornes[i] if i < len(self.bornes) else self.maximum
+        return self.maximum
+
+    def to_dict(self):
+        return {
+            'compte': self.compte, 'somme': round(self.somme, 3), 'maximum': round(self.maximum, 3),
+            'moyenne': round(self.somme / self.compte, 3) if self.compte else None,
+            'p50': self.quantile(0.5), 'p95': self.quantile(0.95),
+            'classes': dict(zip([*map(str, self.bornes), '+Inf'], self.classes)),
+        }
+
+
+class _MetriquesCallback:
+    __slots__ = ('latence_ms', 'entrees_octets', 'sorties_octets', 'declencheurs', 'erreurs')
+
+    def __init__(self):
+        self.latence_ms = Histogramme(BORNES_LATENCE_MS)
+        self.entrees_octets = Histogramme(BORNES_TAILLE_OCTETS)
+        self.sorties_octets = Histogramme(BORNES_TAILLE_OCTETS)
+        self.declencheurs = Counter()
+        self.erreurs = 0
+
+
+class MetriquesCallbacks:
+    """Collecte des mesures par callback, à installer sur le serveur Flask de l'application Dash."""
+
+    def __init__(self, actif=False, log_path=None):
+        self.actif = actif
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._callback_map = {}
+        self._noms = {}
+        self._logger = None
+        if log_path:
+            self._logger = logging.getLogger(f"veec.metriques.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_OCTETS, backupCount=LOG_NB_FICHIERS,
+                                          encoding='utf-8', delay=True) # Fichier ouvert à la première mesure
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    # --- Installation ---
+
+    def installer(self, dash_app):
+        self._callback_map = dash_app.callback_map
+        server = dash_app.server
+        server.before_request(self._avant)
+        server.after_request(self._apres)
+        server.add_url_rule('/metrics', 'veec_metrics', self._exposer, methods=['GET'])
+        server.add_url_rule('/metrics/activer', 'veec_metrics_activer', lambda: self._basculer(True), methods=['POST'])
+        server.add_url_rule('/metrics/desactiver', 'veec_metrics_desactiver', lambda: self._basculer(False), methods=['POST'])
+
+    def _basculer(self, actif):
+        self.actif = actif
+        return flask.jsonify({'actif': self.actif})
+
+    # --- Mesure ---
+
+    def _avant(self):
+        if self.actif and flask.request.path == ROUTE_CALLBACKS:
+            flask.g.veec_debut = time.perf_counter()
+
+    def _apres(self, response):
+        debut = flask.g.pop('veec_debut', None) if self.actif else None
+        if debut is None:
+            return response
+        duree_ms = (time.perf_counter() - debut) * 1000
+        corps = flask.request.get_json(silent=True) or {}
+        callback = self._nom_callback(corps.get('output', '?'))
+        declencheur = ','.join(p for p in corps.get('changedPropIds') or [] if p) or '(initial)'
+        entrees = flask.request.content_length or 0
+        sorties = response.calculate_content_length() or 0
+        self.enregistrer(callback, declencheur, duree_ms, entrees, sorties, response.status_code)
+        return response
+
+    def _nom_callback(self, output):
+        # Les sorties identifient le callback ; le nom de sa fonction est plus lisible
+        nom = self._noms.get(output)
+        if nom is None:
+            entree = self._callback_map.get(output)
+            nom = self._noms[output] = getattr(entree['callback'], '__name__', output) if entree else output
+        return nom
+
+    def enregistrer(self, callback, declencheur, duree_ms, entrees_octets, sorties_octets, statut=200):
+        with self._lock:
+            m = self._callbacks.get(callback)
+            if m is None:
+                m = self._callbacks[callback] = _MetriquesCallback()
+            m.latence_ms.ajouter(duree_ms)
+            m.entrees_octets.ajouter(entrees_octets)
+            m.sorties_octets.ajouter(sorties_octets)
+            m.declencheurs[declencheur] += 1
+            if statut >= 400:
+                m.erreurs += 1
+        if self._logger is not None:
+            self._logger.info(json.dumps({
+                't': round(time.time(), 3), 'callback': callback, 'declencheur': declencheur,
+                'ms': round(duree_ms, 3), 'entrees': entrees_octets, 'sorties': sorties_octets, 'statut': statut,
+            }, ensure_ascii=False))
+
+    # --- Export ---
+
+    def resume(self):
+        """Mesures par callback, du plus coûteux (temps total) au moins coûteux."""
+        with self._lock:
+            lignes = [{
+                'callback': callback,
+                'latence_ms': m.latence_ms.to_dict(),
+                'entrees_octets': m.entrees_octets.to_dict(),
+                'sorties_octets': m.sorties_octets.to_dict(),
+                'declencheurs': dict(m.declencheurs.most_common()),
+                'erreurs': m.erreurs,
+            } for callback, m in self._callbacks.items()]
+        return sorted(lignes, key=lambda l: -l['latence_ms']['somme'])
+
+    def reinitialiser(self):
+        with self._lock:
+            self._callbacks.clear()
+
+    def prometheus(self):
+        """Histogrammes au format d'exposition texte Prometheus."""
+        lignes = []
+        with self._lock:
+            for nom, aide, attribut in (
+                ('veec_callback_latence_ms', "Durée serveur d'un callback Dash (ms)", 'latence_ms'),
+                ('veec_callback_entrees_octets', "Taille des entrées sérialisées (octets)", 'entrees_octets'),
+                ('veec_callback_sorties_octets', "Taille des sorties sérialisées (octets)", 'sorties_octets'),
+            ):
+                lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} histogram"]
+                for callback, m in self._callbacks.items():
+                    h = getattr(m, attribut)
+                    etiquette = callback.replace('\\', '\\\\').replace('"', '\\"')
+                    cumul = 0
+                    for borne, n in zip([*map(str, h.bornes), '+Inf'], h.classes):
+                        cumul += n
+                        lignes.append(f'{nom}_bucket{{callback="{etiquette}",le="{borne}"}} {cumul}')
+                    lignes.append(f'{nom}_sum{{callback="{etiquette}"}} {h.somme:.3f}')
+                    lignes.append(f'{nom}_count{{callback="{etiquette}"}} {h.compte}')
+        return '\n'.join(lignes) + '\n'
+
+    def _exposer(self):
+        if flask.request.args.get('format') == 'json':
+            return flask.jsonify({'actif': self.actif, 'callbacks': self.resume()})
+        return flask.Response(self.prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,252 @@
+"""
+Simulateur de matchs sans interface.
+
+Joue des matchs aléatoires directement sur le moteur (match_engine.MatchLog),
+sans Dash : rallyes avec stats (service, réception, attaque, bloc) et points,
+temps morts et fins de minuterie, substitutions VEEC et adverses, entrées,
+sorties et échange de réserve du Libero, annulations et rétablissements.
+Chaque action passe par les mêmes vérifications que l'interface
+(verifier_substitution, verifier_libero_in, handle_libero_out...) ; les
+conséquences réglementaires (rotation, sortie du Libero en P4, fins de set
+et de match) sont produites par le moteur.
+
+L'horloge est virtuelle (DUREE_RALLYE_SECONDES par rallye) : un match se joue
+en quelques millisecondes, minuteries comprises.
+
+Avec verifier=True, les invariants de l'état (verifier_invariants) sont
+contrôlés après chaque action et le match est rejoué depuis son journal à la
+fin : toute divergence lève une AssertionError avec la graine du match.
+
+Usage :
+    python simulateur.py [--matchs N] [--graine G] [--verifier]
+"""
+import argparse
+import random
+import sys
+import time
+
+import match_engine as engine
+from match_engine import (
+    LIBERO_POSITIONS_AUTORISEES, MAX_SUBS_PER_SET, POSITIONS, RESULTATS_GAGNANTS,
+    handle_libero_out, swap_liberos_on_bench, verifier_libero_in, verifier_substitution, verifier_timeout,
+)
+from stats_joueurs import GESTES
+
+DUREE_RALLYE_SECONDES = 20.0
+
+# Probabilités par rallye (actions de jeu hors points/stats)
+PROBAS = {
+    'timeout': 0.02,
+    'sub_veec': 0.03,
+    'sub_adverse': 0.02,
+    'libero': 0.08,
+    'libero_reserve': 0.003,
+    'undo': 0.02,
+    'redo': 0.5, # après une annulation
+}
+# Nombre de stats saisies par rallye (0 à 3) et pondération
+STATS_PAR_RALLYE = ((0, 1, 2, 3), (20, 35, 30, 15))
+# Pondération des résultats par geste (ordre de stats_joueurs.GESTES)
+POIDS_RESULTATS = {'SVC': (8, 80, 12), 'REC': (35, 55, 10), 'ATK': (45, 40, 15), 'BLK': (20, 60, 20)}
+
+JOUEURS = [{'numero': n, 'nom': f"Joueur {n}"} for n in (1, 3, 6, 11, 12, 13, 7, 9, 8, 15, 16, 17)]
+NOMS = {j['numero']: j['nom'] for j in JOUEURS} # L'état ne garde que les numéros (voir effectifs.py)
+LIBERO_NUM, LIBERO_RESERVE_NUM = 7, 9
+
+
+def etat_de_depart(maintenant=0.0):
+    """État initial d'un match simulé (même forme que app.initial_state, sans état d'interface)."""
+    return {
+        'formation_actuelle': {pos: JOUEURS[pos - 1]['numero'] for pos in POSITIONS},
+        'joueurs_banc': [j['numero'] for j in JOUEURS[6:]],
+        'formation_adverse_actuelle': {pos: pos for pos in POSITIONS},
+        'joueurs_banc_adverse': [],
+        'match_setup_completed': False,
+        'service_actuel': 'VEEC',
+        'score_veec': 0, 'score_adverse': 0, 'sets_veec': 0, 'sets_adverse': 0,
+        'current_set': 1, 'match_ended': False, 'match_winner': None,
+        'timeouts_veec': 0, 'timeouts_adverse': 0, 'sub_veec': 0, 'sub_adverse': 0,
+        'rotation_count': 0, 'service_choisi': True,
+        'start_time': maintenant, 'timer_end_time': 0, 'timer_type': None,
+        'liberos_veec': {
+            'actif_numero': LIBERO_NUM, 'is_on_court': False, 'starter_numero_replaced': None, 'current_pos_on_court': None,
+            'reserve_numero': LIBERO_RESERVE_NUM, 'is_reserve_used': False, 'reserve_can_swap_in': False,
+            'libero_spot_starter_numero': 6,
+        },
+    }
+
+
+def verifier_invariants(state, gagnant_rallye=None):
+    """
+    Contrôle la cohérence d'un état (formations, banc, Libero, score, service). Lève AssertionError.
+    gagnant_rallye : équipe qui vient de gagner un rallye (POINT ou stat gagnante), qui doit servir.
+    """
+    formation, banc = state['formation_actuelle'], state['joueurs_banc']
+    numeros = [formation[pos] for pos in POSITIONS]
+    assert len(set(numeros)) == 6, f"Joueur en double sur le terrain : {numeros}"
+    assert not set(numeros) & set(banc), f"Joueur à la fois sur le terrain et sur le banc : {set(numeros) & set(banc)}"
+    assert len(numeros) + len(banc) == len(JOUEURS), "Joueur perdu ou dupliqué entre terrain et banc"
+
+    liberos = state['liberos_veec']
+    pos_libero = engine.position_du_libero(formation, liberos)
+    if liberos['is_on_court']:
+        assert pos_libero == liberos['current_pos_on_court'], f"Libero en P{pos_libero}, statut P{liberos['current_pos_on_court']}"
+        assert pos_libero in LIBERO_POSITIONS_AUTORISEES, f"Libero en ligne avant (P{pos_libero})"
+        assert liberos['starter_numero_replaced'] in banc, "Titulaire remplacé par le Libero absent du banc"
+    else:
+        assert pos_libero is None, f"Libero sur le terrain (P{pos_libero}) alors qu'il est noté sur le banc"
+
+    assert 0 <= state['sub_veec'] <= MAX_SUBS_PER_SET and 0 <= state['sub_adverse'] <= MAX_SUBS_PER_SET
+    assert state['sets_veec'] + state['sets_adverse'] == state['current_set'] - 1 or state['match_ended']
+    if not state['match_ended']:
+        assert engine.vainqueur_du_set(state) is None, "Set gagné mais non terminé"
+    if gagnant_rallye is not None:
+        assert state['service_actuel'] == gagnant_rallye, f"Rallye gagné par {gagnant_rallye}, service {state['service_actuel']}"
+
+
+def compter_rallyes(events):
+    """Nombre de rallyes joués : points et stats gagnantes (chacun clôt un rallye)."""
+    return sum(1 for e in events
+               if engine.gagnant_du_rallye(e) is not None)
+
+
+class _Partie:
+    """Un match simulé : journal, générateur aléatoire et horloge virtuelle."""
+
+    def __init__(self, graine, probas, verifier):
+        self.rng = random.Random(graine)
+        self.graine = graine
+        self.probas = probas
+        self.verifier = verifier
+        self.horloge = 0.0
+        self.journal = engine.MatchLog(etat_de_depart(self.horloge))
+
+    @property
+    def state(self):
+        return self.journal.state
+
+    def dispatch(self, event_type, data=None, undoable=True):
+        events = self.journal.dispatch(event_type, data, timestamp=self.horloge, undoable=undoable)
+        if self.verifier:
+            self._controler(engine.gagnant_du_rallye(events[0]))
+
+    def _controler(self, gagnant_rallye=None):
+        try:
+            verifier_invariants(self.state, gagnant_rallye)
+        except AssertionError as e:
+            raise AssertionError(f"[graine {self.graine}, événement {len(self.journal.events)}] {e}") from None
+
+    def chance(self, cle):
+        return self.rng.random() < self.probas[cle]
+
+    # --- Actions ---
+
+    def attendre_minuterie(self):
+        # Fin de minuterie automatique, comme handle_timer_expiration (non annulable)
+        fin = self.state['timer_end_time']
+        if fin and fin > 0:
+            self.horloge = max(self.horloge, fin)
+            self.dispatch(engine.TIMER_END, {'end_time': fin}, undoable=False)
+
+    def temps_mort(self):
+        event_data, _ = verifier_timeout(self.state, self.rng.choice(('VEEC', 'ADVERSAIRE')), self.horloge)
+        if event_data is not None:
+            self.dispatch(engine.TIMEOUT, event_data)
+            self.attendre_minuterie()
+
+    def substitution_veec(self):
+        position = self.rng.choice(POSITIONS)
+        entrant = self.rng.choice(sorted(self.state['joueurs_banc']))
+        event_data, _ = verifier_substitution(self.state, position, entrant, NOMS)
+        if event_data is not None:
+            self.dispatch(engine.SUB, event_data)
+
+    def substitution_adverse(self):
+        if self.state['sub_adverse'] < MAX_SUBS_PER_SET:
+            self.dispatch(engine.SUB_ADVERSE)
+
+    def libero(self):
+        if self.state['liberos_veec']['is_on_court']:
+            event_data, _ = handle_libero_out(self.state)
+            if event_data is not None:
+                self.dispatch(engine.LIBERO_OUT, event_data)
+        else:
+            event_data, _ = verifier_libero_in(self.state, self.rng.choice(LIBERO_POSITIONS_AUTORISEES))
+            if event_data is not None:
+                self.dispatch(engine.LIBERO_IN, event_data)
+
+    def libero_reserve(self):
+        event_data, _ = swap_liberos_on_bench(self.state)
+        if event_data is not None:
+            self.dispatch(engine.LIBERO_SWAP_RESERVE, event_data)
+
+    def rallye(self):
+        """Stats éventuelles puis point ; une stat gagnante (ou une faute, point adverse) clôt le rallye."""
+        self.horloge += DUREE_RALLYE_SECONDES
+        nb_stats = self.rng.choices(*STATS_PAR_RALLYE)[0]
+        for _ in range(nb_stats):
+            pos = self.rng.choice(POSITIONS)
+            numero = self.state['formation_actuelle'][pos]
+            geste = self.rng.choice(tuple(GESTES))
+            resultat = self.rng.choices(GESTES[geste], POIDS_RESULTATS[geste])[0]
+            self.dispatch(engine.STAT, {'position': pos, 'numero': numero, 'nom': NOMS[numero],
+                                        'action_code': geste, 'resultat': resultat})
+            if resultat in RESULTATS_GAGNANTS:
+                return
+            if resultat == 'FAUTE':
+                return self.dispatch(engine.POINT, {'gagnant': 'ADVERSAIRE'})
+        self.dispatch(engine.POINT, {'gagnant': self.rng.choice(('VEEC', 'ADVERSAIRE'))})
+
+    def annuler(self):
+        if self.journal.undo() and self.chance('redo'):
+            self.journal.redo()
+        if self.verifier:
+            self._controler()
+
+    def jouer(self):
+        state = self.state
+        self.dispatch(engine.SETUP, {'formation': state['formation_actuelle'], 'banc': state['joueurs_banc']}, undoable=False)
+        while not self.state['match_ended']:
+            if self.state['timer_end_time']:
+                self.attendre_minuterie() # Pause entre les sets
+            for cle, action in (('timeout', self.temps_mort), ('sub_veec', self.substitution_veec),
+                                ('sub_adverse', self.substitution_adverse), ('libero', self.libero),
+                                ('libero_reserve', self.libero_reserve)):
+                if self.chance(cle):
+                    action()
+            self.rallye()
+            if not self.state['match_ended'] and self.chance('undo'):
+                self.annuler()
+        if self.verifier:
+            rejoue = engine.MatchLog.replay(self.journal.snapshots[0][1], self.journal.events)
+            assert rejoue.state == self.state, f"[graine {self.graine}] Le rejeu du journal diverge de l'état courant"
+        return self.journal
+
+
+def simuler_match(graine=None, probas=None, verifier=False):
+    """Joue un match aléatoire complet et retourne son MatchLog."""
+    return _Partie(graine, {**PROBAS, **(probas or {})}, verifier).jouer()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulation de matchs VEEC sans interface.")
+    parser.add_argument('--matchs', type=int, default=10)
+    parser.add_argument('--graine', type=int, default=0, help="Graine du premier match (les suivants : graine + i)")
+    parser.add_argument('--verifier', action='store_true', help="Contrôle les invariants après chaque action")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    nb_rallyes = nb_events = 0
+    victoires = {'VEEC': 0, 'ADVERSAIRE': 0}
+    for i in range(args.matchs):
+        journal = simuler_match(args.graine + i, verifier=args.verifier)
+        nb_rallyes += compter_rallyes(journal.events)
+        nb_events += len(journal.events)
+        victoires[journal.state['match_winner']] += 1
+    duree = time.perf_counter() - t0
+    print(f"{args.matchs} matchs, {nb_rallyes} rallyes, {nb_events} événements en {duree:.2f} s "
+          f"({nb_rallyes / duree:,.0f} rallyes/s) - victoires : {victoires}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Statistiques par joueur, tenues à jour événement par événement.
+
+Chaque événement STAT (bouton 'stat-btn' de la modale de saisie) incrémente
+un seul compteur pour le couple (joueur, set) et un pour le total du match
+du joueur : O(1) par clic, sans jamais reparcourir l'historique. Une
+annulation décrémente les compteurs des événements retirés
+(StatsIndex.truncate), comme HistoriqueIndex retire ses lignes.
+
+La ligne d'un joueur (compteurs bruts + indicateurs : % d'aces, % de
+réceptions parfaites, % de kills, points de bloc...) se lit directement
+depuis ses compteurs.
+"""
+from array import array
+from bisect import bisect_left
+
+from match_engine import STAT
+
+# Gestes saisis dans la modale de stat et leurs résultats possibles (ordre des boutons)
+GESTES = {
+    'SVC': ('ACE', 'OK', 'FAUTE'),
+    'REC': ('PERF', 'OK', 'FAUTE'),
+    'ATK': ('KILL', 'MANU', 'FAUTE'),
+    'BLK': ('GAIN', 'TOUCH', 'FAUTE'),
+}
+
+# Cellule de compteur de chaque (geste, résultat) : indice dans le tableau d'un joueur
+CELLULES = {(geste, resultat): i for i, (geste, resultat) in
+            enumerate((g, r) for g, resultats in GESTES.items() for r in resultats)}
+NB_CELLULES = len(CELLULES)
+
+# Indicateurs : (colonne, geste, résultat compté) -> pourcentage des tentatives du geste
+INDICATEURS = (
+    ('svc_ace_pct', 'SVC', 'ACE'),
+    ('svc_faute_pct', 'SVC', 'FAUTE'),
+    ('rec_perf_pct', 'REC', 'PERF'),
+    ('rec_faute_pct', 'REC', 'FAUTE'),
+    ('atk_kill_pct', 'ATK', 'KILL'),
+    ('atk_faute_pct', 'ATK', 'FAUTE'),
+)
+
+# Résultats qui rapportent directement un point
+_CELLULES_POINTS = (CELLULES[('SVC', 'ACE')], CELLULES[('ATK', 'KILL')], CELLULES[('BLK', 'GAIN')])
+
+STATS_COLUMNS = (
+    ('numero', 'N°'), ('nom', 'Joueur'), ('points', 'Pts'),
+    ('svc_total', 'Services'), ('svc_ace', 'Aces'), ('svc_ace_pct', '% Ace'), ('svc_faute_pct', '% Faute serv.'),
+    ('rec_total', 'Réceptions'), ('rec_perf_pct', '% Parfaite'), ('rec_faute_pct', '% Manquée'),
+    ('atk_total', 'Attaques'), ('atk_kill', 'Kills'), ('atk_kill_pct', '% Kill'), ('atk_eff_pct', 'Eff. att.'),
+    ('blk_gain', 'Pts bloc'), ('blk_touch', 'Blocs touchés'), ('blk_faute', 'Fautes bloc'),
+)
+
+
+def _pct(n, total):
+    return round(100 * n / total, 1) if total else None
+
+
+def ligne_de_compteurs(compteurs):
+    """Compteurs bruts, totaux par geste et indicateurs d'un tableau de compteurs."""
+    ligne = {f"{geste.lower()}_{resultat.lower()}": compteurs[i] for (geste, resultat), i in CELLULES.items()}
+    for geste, resultats in GESTES.items():
+        ligne[f"{geste.lower()}_total"] = sum(compteurs[CELLULES[(geste, r)]] for r in resultats)
+    for colonne, geste, resultat in INDICATEURS:
+        ligne[colonne] = _pct(compteurs[CELLULES[(geste, resultat)]], ligne[f"{geste.lower()}_total"])
+    # Efficacité d'attaque : (kills - fautes) / tentatives
+    ligne['atk_eff_pct'] = _pct(ligne['atk_kill'] - ligne['atk_faute'], ligne['atk_total'])
+    ligne['points'] = sum(compteurs[i] for i in _CELLULES_POINTS)
+    return ligne
+
+
+class StatsIndex:
+    """
+    Compteurs de statistiques d'un match, alignés sur son journal d'événements :
+    un tableau de NB_CELLULES entiers par (numéro, set) et un par numéro pour le
+    match entier. Chaque stat indexée est mémorisée (position dans le journal,
+    numéro, set, cellule) pour pouvoir être décomptée lors d'une annulation.
+    """
+
+    def __init__(self):
+        self._par_set = {}   # (numero, set) -> array('I')
+        self._par_match = {} # numero -> array('I')
+        self._noms = {}
+        self._event_pos = array('I')
+        self._numeros = array('H')
+        self._sets = array('B')
+        self._cellules = array('B')
+        self._n_events = 0
+
+    def sync(self, events):
+        """Compte les événements ajoutés au journal depuis le dernier appel."""
+        for i in range(self._n_events, len(events)):
+            if events[i].type == STAT:
+                self.append(events[i], i)
+        self._n_events = len(events)
+
+    def append(self, event, event_pos):
+        """Compte une stat (O(1)). Les gestes ou résultats inconnus sont ignorés."""
+        d = event.data
+        cellule = CELLULES.get((d['action_code'], d['resultat']))
+        if cellule is None:
+            return
+        numero = d['numero']
+        self._noms[numero] = d['nom']
+        self._compteurs(numero, event.set)[cellule] += 1
+        self._par_match[numero][cellule] += 1
+        self._event_pos.append(event_pos)
+        self._numeros.append(numero)
+        self._sets.append(event.set)
+        self._cellules.append(cellule)
+
+    def _compteurs(self, numero, set_num):
+        compteurs = self._par_set.get((numero, set_num))
+        if compteurs is None:
+            compteurs = self._par_set[(numero, set_num)] = array('I', bytes(4 * NB_CELLULES))
+            if numero not in self._par_match:
+                self._par_match[numero] = array('I', bytes(4 * NB_CELLULES))
+        return compteurs
+
+    def truncate(self, n_events):
+        """Décompte les stats des événements retirés du journal (annulation)."""
+        debut = bisect_left(self._event_pos, n_events)
+        for k in range(debut, len(self._event_pos)):
+            numero, cellule = self._numeros[k], self._cellules[k]
+            self._par_set[(numero, self._sets[k])][cellule] -= 1
+            self._par_match[numero][cellule] -= 1
+        for colonne in (self._event_pos, self._numeros, self._sets, self._cellules):
+            del colonne[debut:]
+        self._n_events = min(self._n_events, n_events)
+
+    def ligne(self, numero, set_num=None):
+        """Ligne d'un joueur, pour un set ou (set_num=None) pour tout le match."""
+        if set_num is None:
+            compteurs = self._par_match.get(numero)
+        else:
+            compteurs = self._par_set.get((numero, set_num))
+        ligne = ligne_de_compteurs(compteurs or bytes(NB_CELLULES))
+        ligne['numero'], ligne['nom'] = numero, self._noms.get(numero, '')
+        return ligne
+
+    def lignes(self, set_num=None):
+        """Lignes de tous les joueurs ayant au moins une stat (dans le set demandé), par numéro."""
+        if set_num is None:
+            numeros = [n for n, c in self._par_match.items() if any(c)]
+        else:
+            numeros = [n for (n, s), c in self._par_set.items() if s == set_num and any(c)]
+        return [self.ligne(numero, set_num) for numero in sorted(numeros)]
+
+    def sets(self):
+        """Sets ayant au moins une stat enregistrée."""
+        return sorted({s for (_, s), c in self._par_set.items() if any(c)})
+
+    def __len__(self):
+        return len(self._event_pos)